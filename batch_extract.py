@@ -0,0 +1,145 @@
+"""
+Headless frame extraction over many videos, without starting napari.
+
+    python batch_extract.py "data/raw/*.avi" --output-dir data/frames --n-clusters 20 --every-n 30 --workers 8
+
+Each video's selected frames are written to <output-dir>/<video name>/, with a manifest.json listing the frame indices,
+the settings used and how long each stage took (including extract_frames' own stages: decode, downsample, PCA, KMeans...).
+Videos whose manifest already exists with the same settings are skipped, so an interrupted run can just be started again.
+A video rerun with different settings has the files listed in its old manifest deleted first, so its manifest only lists this run's frames.
+Downsampled frames are cached in <output-dir>/.feature_cache, so reruns that only change the clustering settings don't decode the videos again.
+A summary of all videos is written to <output-dir>/manifest.json. Set the FRAME_EXTRACTION_PROFILE_DIR environment variable
+to also get a JSON run report and a cProfile dump of every video's extraction in that directory.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+import json
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from core.video_processing import FEATURE_METHODS, SELECTION_METHODS
+from readers import BACKENDS
+from gui.models import AppState
+from workflows import CODECS, FeatureCache, frame_filename
+
+
+MANIFEST_NAME = 'manifest.json'
+CACHE_DIR_NAME = '.feature_cache'
+DEFAULT_SETTINGS = {'crop': None, 'n_clusters': 20, 'every_n': 30, 'downsample_level': 3, 'selection': 'centroid', 'frames_per_cluster': 1, 'keep_fraction': 1.0, 'budget': None, 'features': 'pca', 'kmeans_time_budget': None, 'codec': 'png', 'backend': None}
+
+
+def read_manifest(directory: Path) -> Optional[Dict[str, Any]]:
+    path = directory / MANIFEST_NAME
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def extract_video(video_path: str, output_dir: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs frame extraction and export for one video (in a worker process), returning its manifest."""
+    settings = {**DEFAULT_SETTINGS, **settings}
+    directory = Path(output_dir) / Path(video_path).stem
+    manifest = read_manifest(directory)
+    if manifest is not None and manifest['settings'] == settings:
+        return {**manifest, 'skipped': True}
+    if manifest is not None:  # extracted before with other settings: remove that run's outputs
+        (directory / MANIFEST_NAME).unlink()
+        for filename in manifest['files']:
+            (directory / filename).unlink(missing_ok=True)
+
+    timings = {}
+    t0 = perf_counter()
+    app = AppState(feature_cache=FeatureCache(directory=Path(output_dir) / CACHE_DIR_NAME), reader_backend=settings['backend'])
+    app.load_video(filename=video_path)
+    crop = settings['crop']
+    if crop is not None:
+        with app.hold_trait_notifications():
+            app.x0, app.x1, app.y0, app.y1 = crop
+    timings['load'] = perf_counter() - t0
+
+    t0 = perf_counter()
+    extract_settings = {key: settings[key] for key in ('n_clusters', 'every_n', 'downsample_level', 'selection', 'frames_per_cluster', 'keep_fraction', 'budget', 'features', 'kmeans_time_budget')}
+    for _ in app.extract_frames(**extract_settings):
+        pass
+    timings['extract'] = perf_counter() - t0
+
+    t0 = perf_counter()
+    app.export_frames_to_directory(directory=directory, codec=settings['codec'])
+    timings['export'] = perf_counter() - t0
+
+    manifest = {
+        'video': str(Path(video_path).resolve()),
+        'settings': settings,
+        'frame_indices': app.selected_frame_indices,
+        'files': [frame_filename(Path(video_path).stem, idx, codec=settings['codec']) for idx in app.selected_frame_indices],
+        'timings': timings,
+        'extract_stages': [timing._asdict() for timing in app.stage_timings],
+    }
+    (directory / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))  # written last, so it only exists for finished videos
+    return {**manifest, 'skipped': False}
+
+
+def batch_extract(video_paths: List[str], output_dir: Path, settings: Dict[str, Any], workers: int = 1) -> List[Dict[str, Any]]:
+    stems = [Path(path).stem for path in video_paths]
+    duplicates = sorted({stem for stem in stems if stems.count(stem) > 1})
+    if duplicates:
+        raise ValueError(f"Videos would be exported to the same directory, since they have the same names: {duplicates}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifests = []
+    t_start = perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(extract_video, path, str(output_dir), settings): path for path in video_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                manifest = future.result()
+            except Exception as err:
+                print(f"FAILED   {path}: {err!r}")
+                continue
+            manifests.append(manifest)
+            if manifest['skipped']:
+                print(f"skipped  {path} (already extracted)")
+            else:
+                timings = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in manifest['timings'].items())
+                print(f"done     {path}: {len(manifest['frame_indices'])} frames ({timings})")
+
+    print(f"{len(manifests)}/{len(video_paths)} videos finished in {perf_counter() - t_start:.1f}s")
+    summary = {'settings': settings, 'videos': sorted(manifests, key=lambda manifest: manifest['video'])}
+    (output_dir / MANIFEST_NAME).write_text(json.dumps(summary, indent=2))
+    return manifests
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('videos', nargs='+', help="Video files or glob patterns (quote them so the shell doesn't expand them).")
+    parser.add_argument('--output-dir', type=Path, required=True)
+    parser.add_argument('--config', type=Path, help="A YAML/JSON file with any of the settings below; command-line flags take precedence.")
+    parser.add_argument('--crop', type=int, nargs=4, metavar=('X0', 'X1', 'Y0', 'Y1'), default=None, help="Defaults to the full frame.")
+    parser.add_argument('--n-clusters', type=int, default=None)
+    parser.add_argument('--every-n', type=int, default=None)
+    parser.add_argument('--budget', type=int, default=None, help="Sample this many frames where the video changes most, instead of every N frames.")
+    parser.add_argument('--downsample-level', type=int, default=None)
+    parser.add_argument('--features', choices=FEATURE_METHODS, default=None, help="How frames are reduced before clustering; random_projection is faster for large frames.")
+    parser.add_argument('--selection', choices=SELECTION_METHODS, default=None, help="Which frame to take from each cluster.")
+    parser.add_argument('--frames-per-cluster', type=int, default=None)
+    parser.add_argument('--keep-fraction', type=float, default=None, help="Only cluster this fraction of the sampled frames, the ones that differ most from the background.")
+    parser.add_argument('--kmeans-time-budget', type=float, default=None, help="Stop clustering after this many seconds, keeping the clusters found so far.")
+    parser.add_argument('--backend', choices=BACKENDS, default=None, help="The video reader; defaults to one chosen by file type. 'pyav' seeks frame-accurately.")
+    parser.add_argument('--codec', choices=list(CODECS), default=None, help="The image format the frames are exported in.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of videos processed at the same time.")
+    args = parser.parse_args()
+
+    settings = dict(DEFAULT_SETTINGS)
+    if args.config is not None:
+        settings.update(yaml.safe_load(args.config.read_text()) or {})
+    settings.update({key: getattr(args, key) for key in settings if getattr(args, key) is not None})
+
+    video_paths = sorted({path for pattern in args.videos for path in (glob(pattern) or [pattern])})
+    batch_extract(video_paths=video_paths, output_dir=args.output_dir, settings=settings, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares fixed-stride sampling (every_n) with adaptive sampling (workflows.extract_frames.sample_frames_adaptively)
+on a synthetic video that holds still most of the time and only moves in short bursts.
+
+Coverage is measured against every frame of the video: for each frame, the distance (mean absolute pixel difference,
+downsampled and grayscale) to the nearest sampled frame. Lower is better; the 95th percentile shows how badly
+the least-covered moments, usually the bursts of motion, are represented. 'decoded' counts the coarse pass too,
+and 'seconds' is the time spent choosing the frames (i.e. the coarse pass).
+
+    python -m benchmarks.bench_adaptive_sampling
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import numpy as np
+
+from benchmarks.synthetic import write_synthetic_video
+from readers import VideoReader
+from workflows.extract_frames import Crop, crop_and_downsample, sample_frames_adaptively
+
+
+def nearest_sample_distances(all_frames: np.ndarray, sample_indices: np.ndarray) -> np.ndarray:
+    flat = all_frames.reshape(len(all_frames), -1).astype(np.float32)
+    samples = flat[sample_indices]
+    return np.array([np.abs(samples - frame).mean(axis=1).min() for frame in flat])
+
+
+def main(n_frames: int, width: int, height: int, still_fraction: float, budgets: list, downsample_level: int) -> None:
+    with TemporaryDirectory() as tmpdir:
+        filename = write_synthetic_video(Path(tmpdir) / 'video.mp4', n_frames=n_frames, width=width, height=height, still_fraction=still_fraction)
+        video = VideoReader(filename=filename)
+        crop = Crop(x0=0, x1=video.frame_width, y0=0, y1=video.frame_height)
+        all_frames = np.stack([crop_and_downsample(frame, crop=crop, downsample_level=downsample_level, grayscale=True) for frame in video.read_frames(0, len(video))])
+
+        print(f"{'sampling':>9} {'budget':>7} {'decoded':>8} {'seconds':>8} {'mean dist':>10} {'p95 dist':>9}")
+        for budget in budgets:
+            t0 = perf_counter()
+            fixed = np.arange(0, len(video), max(1, len(video) // budget))
+            fixed_seconds = perf_counter() - t0  # no decoding needed to choose them
+
+            t0 = perf_counter()
+            adaptive = sample_frames_adaptively(video, budget=budget, crop=crop, downsample_level=downsample_level)
+            adaptive_seconds = perf_counter() - t0
+            n_coarse = int(np.clip(budget * 0.25, 2, len(video)))
+
+            for name, indices, decoded, seconds in [('every_n', fixed, len(fixed), fixed_seconds), ('adaptive', adaptive, n_coarse + len(adaptive), adaptive_seconds)]:
+                distances = nearest_sample_distances(all_frames, indices)
+                print(f"{name:>9} {budget:>7} {decoded:>8} {seconds:>8.2f} {distances.mean():>10.2f} {np.percentile(distances, 95):>9.2f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=3000)
+    parser.add_argument('--width', type=int, default=160)
+    parser.add_argument('--height', type=int, default=120)
+    parser.add_argument('--still-fraction', type=float, default=0.8)
+    parser.add_argument('--budgets', type=int, nargs='+', default=[50, 100, 200, 400])
+    parser.add_argument('--downsample-level', type=int, default=4)
+    args = parser.parse_args()
+    main(n_frames=args.n_frames, width=args.width, height=args.height, still_fraction=args.still_fraction, budgets=args.budgets, downsample_level=args.downsample_level)
@@ -0,0 +1,52 @@
+"""
+Measures how long the viewer takes to respond to each step of a sustained crop-slider drag, at several frame sizes,
+with the Video Loader and Frame Extraction views attached to a hidden napari viewer (the reference frame is random noise).
+Each step moves the 'Crop X Max' slider like a drag would, then lets Qt process the resulting redraws.
+Since a crop change only moves the crop rectangle drawn over the reference image, the latency shouldn't grow with the frame size.
+
+    python -m benchmarks.bench_crop_drag
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+
+import napari
+import numpy as np
+from qtpy.QtWidgets import QApplication
+
+from gui.models import AppState
+from gui.views import MultiFrameExtractionControlsViewNapari, ViewNapari
+
+
+def main(sizes: list, n_steps: int) -> None:
+    viewer = napari.Viewer(show=False)
+    app = AppState(feature_cache=None)
+    loader_view = ViewNapari(model=app)
+    loader_view.register_napari(viewer=viewer)
+    extract_view = MultiFrameExtractionControlsViewNapari(model=app)
+    extract_view.register_napari(viewer=viewer)
+    extract_view.register_appmodel(model=app)
+    qt_app = QApplication.instance()
+
+    print(f"{'frame size':>11} {'steps':>6} {'median ms':>10} {'p95 ms':>8} {'max ms':>8}")
+    rng = np.random.default_rng(0)
+    for width, height in sizes:
+        app.reference_frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)  # also resets the crop to the full frame
+        qt_app.processEvents()
+        loader_view._crop_x1.max = width
+        latencies = []
+        for x1 in np.linspace(width, width // 2, n_steps).astype(int):
+            t0 = perf_counter()
+            loader_view._crop_x1.value = int(x1)
+            qt_app.processEvents()
+            latencies.append(perf_counter() - t0)
+        latencies_ms = np.array(latencies) * 1000
+        print(f"{f'{width}x{height}':>11} {n_steps:>6} {np.median(latencies_ms):>10.2f} {np.percentile(latencies_ms, 95):>8.2f} {latencies_ms.max():>8.2f}")
+    viewer.close()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[640, 480, 1920, 1080, 4096, 3000], help="Width and height pairs.")
+    parser.add_argument('--n-steps', type=int, default=200)
+    args = parser.parse_args()
+    main(sizes=list(zip(args.sizes[::2], args.sizes[1::2])), n_steps=args.n_steps)
@@ -0,0 +1,72 @@
+"""
+Compares reading cropped, downsampled frames the old way (full RGB frames from read_frames_at, cropped into a batch buffer that is downsampled when full)
+with VideoReader.read_frames_at_into (only the crop is converted and downsampled, into a reused buffer), for a crop covering
+about 20% of a large frame: frames/s, and the peak memory allocated through NumPy while reading (tracemalloc).
+
+    python -m benchmarks.bench_cropped_decoding
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic import write_synthetic_video
+from core.video_processing import downsample_batch, downsampled_shape
+from readers import VideoReader
+
+
+def read_full_frames_then_crop(video: VideoReader, indices: range, roi: tuple, scale: int, grayscale: bool, batch_size: int) -> int:
+    x0, x1, y0, y1 = roi
+    batch = np.empty((batch_size, y1 - y0, x1 - x0, 3), dtype=np.uint8)
+    out = np.empty((batch_size, *downsampled_shape(batch.shape[1:], level=scale, grayscale=grayscale)), dtype=np.uint8)
+    n_frames = n_filled = 0
+    for frame in video.read_frames_at(indices):
+        batch[n_filled] = frame[y0:y1, x0:x1]
+        n_filled += 1
+        if n_filled == batch_size:
+            n_frames += len(downsample_batch(batch, level=scale, grayscale=grayscale, out=out))
+            n_filled = 0
+    if n_filled:
+        n_frames += len(downsample_batch(batch[:n_filled], level=scale, grayscale=grayscale, out=out[:n_filled]))
+    return n_frames
+
+
+def read_crops_into_buffer(video: VideoReader, indices: range, roi: tuple, scale: int, grayscale: bool, batch_size: int) -> int:
+    color = 'gray' if grayscale else 'rgb'
+    out = np.empty((batch_size, *video.converted_shape(roi=roi, scale=scale, color=color)), dtype=np.uint8)
+    return sum(len(batch) for batch in video.read_frames_at_into(indices, out=out, roi=roi, scale=scale, color=color))
+
+
+def main(n_frames: int, width: int, height: int, every_n: int, scale: int, batch_size: int) -> None:
+    roi_width, roi_height = int(width * 0.45), int(height * 0.45)  # ~20% of the frame's area
+    roi = ((width - roi_width) // 2, (width + roi_width) // 2, (height - roi_height) // 2, (height + roi_height) // 2)
+    print(f"{width}x{height} frames, crop {roi_width}x{roi_height}, every_n={every_n}, downsampled {scale}x")
+    print(f"{'method':>26} {'color':>5} {'frames/s':>9} {'peak alloc (MB)':>16}")
+    with TemporaryDirectory() as tmpdir:
+        video_path = write_synthetic_video(Path(tmpdir) / 'video.mp4', n_frames=n_frames, width=width, height=height)
+        indices = range(0, n_frames, every_n)
+        for grayscale in [False, True]:
+            for method in [read_full_frames_then_crop, read_crops_into_buffer]:
+                video = VideoReader(filename=video_path)
+                tracemalloc.start()
+                t0 = perf_counter()
+                n_read = method(video, indices, roi=roi, scale=scale, grayscale=grayscale, batch_size=batch_size)
+                duration = perf_counter() - t0
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{method.__name__:>26} {'gray' if grayscale else 'rgb':>5} {n_read / duration:>9.1f} {peak / 1024 ** 2:>16.1f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=120)
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--every-n', type=int, default=1)
+    parser.add_argument('--scale', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+    main(n_frames=args.n_frames, width=args.width, height=args.height, every_n=args.every_n, scale=args.scale, batch_size=args.batch_size)
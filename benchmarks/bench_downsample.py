@@ -0,0 +1,81 @@
+"""
+Compares frames/sec of the old per-frame downsample() against downsample_batch() writing into a preallocated buffer,
+and against an integer-factor block mean in NumPy (kept here for comparison; it was slower than cv2's INTER_AREA),
+in colour and grayscale, for several batch sizes and downsample levels.
+
+    python -m benchmarks.bench_downsample
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Optional
+
+import numpy as np
+
+from core.video_processing import downsample, downsample_batch, downsampled_shape
+
+
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)  # ITU-R BT.601 luma, for RGB frames
+
+
+def block_mean_downsample(frames: np.ndarray, level: int, grayscale: bool = False, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Like downsample_batch, but averaging each level x level block of the whole batch at once in NumPy; edge pixels that don't fill a block are dropped."""
+    n, h, w, c = frames.shape
+    out_h, out_w, out_c = downsampled_shape((h, w, c), level=level, grayscale=grayscale)
+    if out is None:
+        out = np.empty((n, out_h, out_w, out_c), dtype=np.uint8)
+    # Block sums in two passes of strided adds (rows, then columns), which is much faster in NumPy than summing over reshaped block axes.
+    sum_dtype = np.uint16 if level <= 16 else np.uint32
+    row_sums = np.zeros((n, out_h, out_w * level, c), dtype=sum_dtype)
+    for i in range(level):
+        row_sums += frames[:, i:out_h * level:level, :out_w * level]
+    block_sums = np.zeros((n, out_h, out_w, c), dtype=np.uint32)
+    for j in range(level):
+        block_sums += row_sums[:, :, j::level]
+    n_pixels = level * level
+    if grayscale:
+        np.add(block_sums @ (GRAY_WEIGHTS / n_pixels), .5, out=out[..., 0], casting='unsafe')
+    else:
+        block_sums += n_pixels // 2  # round to nearest
+        np.floor_divide(block_sums, n_pixels, out=out, casting='unsafe')
+    return out
+
+
+DOWNSAMPLE_METHODS = {'area': downsample_batch, 'block_mean': block_mean_downsample}
+
+
+def time_per_frame_resize(frames: np.ndarray, level: int) -> float:
+    t0 = perf_counter()
+    for frame in frames:
+        downsample(frame, level=level)
+    return len(frames) / (perf_counter() - t0)
+
+
+def time_batched(frames: np.ndarray, level: int, batch_size: int, grayscale: bool, method: str) -> float:
+    out = np.empty((batch_size, *downsampled_shape(frames.shape[1:], level=level, grayscale=grayscale)), dtype=np.uint8)
+    t0 = perf_counter()
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+        DOWNSAMPLE_METHODS[method](batch, level=level, grayscale=grayscale, out=out[:len(batch)])
+    return len(frames) / (perf_counter() - t0)
+
+
+def main(n_frames: int, width: int, height: int, levels: list, batch_sizes: list) -> None:
+    frames = np.random.default_rng(0).integers(0, 256, size=(n_frames, height, width, 3), dtype=np.uint8)
+    columns = [(method, grayscale) for method in DOWNSAMPLE_METHODS for grayscale in [False, True]]
+    print(f"{'level':>6} {'batch':>6} {'per-frame':>10} " + ' '.join(f"{method + (' gray' if gray else ''):>16}" for method, gray in columns) + "   (frames/sec)")
+    for level in levels:
+        resize_fps = time_per_frame_resize(frames, level=level)
+        for batch_size in batch_sizes:
+            fps = [time_batched(frames, level=level, batch_size=batch_size, grayscale=gray, method=method) for method, gray in columns]
+            print(f"{level:>6} {batch_size:>6} {resize_fps:>10.1f} " + ' '.join(f"{val:>16.1f}" for val in fps))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=128)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--levels', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+    main(n_frames=args.n_frames, width=args.width, height=args.height, levels=args.levels, batch_sizes=args.batch_sizes)
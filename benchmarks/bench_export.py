@@ -0,0 +1,41 @@
+"""
+Measures export throughput (MB/s of raw frame data and files/s) of workflows.export_frames for each codec and thread count.
+
+    python -m benchmarks.bench_export
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import numpy as np
+
+from benchmarks.synthetic import write_synthetic_video
+from readers import VideoReader
+from workflows import CODECS, export_frames
+
+
+def main(n_frames: int, width: int, height: int, threads: list) -> None:
+    print(f"{'codec':>6} {'threads':>8} {'MB/s':>8} {'files/s':>8} {'MB on disk':>11}")
+    with TemporaryDirectory() as tmpdir:
+        video_path = write_synthetic_video(Path(tmpdir) / 'video.mp4', n_frames=n_frames, width=width, height=height)
+        frames = np.array(list(VideoReader(filename=video_path).read_frames()))
+        for codec in CODECS:
+            for n_threads in threads:
+                directory = Path(tmpdir) / f"{codec}_{n_threads}"
+                t0 = perf_counter()
+                for _ in export_frames(frames=frames, frame_indices=range(n_frames), directory=directory, name='video', codec=codec, n_threads=n_threads):
+                    pass
+                duration = perf_counter() - t0
+                disk_mb = sum(path.stat().st_size for path in directory.iterdir()) / 1024 ** 2
+                print(f"{codec:>6} {n_threads:>8} {frames.nbytes / 1024 ** 2 / duration:>8.1f} {n_frames / duration:>8.1f} {disk_mb:>11.1f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=60)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+    main(n_frames=args.n_frames, width=args.width, height=args.height, threads=args.threads)
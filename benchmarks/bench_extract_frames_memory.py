@@ -0,0 +1,51 @@
+"""
+Measures peak traced memory of workflows.extract_frames on synthetic videos of growing resolution,
+next to the size of all the sampled raw frames and of their downsampled versions.
+
+    python -m benchmarks.bench_extract_frames_memory
+"""
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import tracemalloc
+
+from benchmarks.synthetic import write_synthetic_video
+from workflows import extract_frames, Crop
+
+
+MB = 1024 ** 2
+
+
+def peak_memory_mb(filename: Path, width: int, height: int, every_n: int, downsample_level: int, n_clusters: int) -> float:
+    tracemalloc.start()
+    with redirect_stdout(StringIO()):  # MiniBatchKMeans is verbose
+        for _ in extract_frames(video_path=filename, crop=Crop(x0=0, x1=width, y0=0, y1=height), n_clusters=n_clusters, every_n=every_n, downsample_level=downsample_level):
+            pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / MB
+
+
+def main(n_frames: int, sizes: list, every_n: int, downsample_level: int, n_clusters: int) -> None:
+    print(f"{'size':>10} {'raw sampled MB':>15} {'downsampled MB':>15} {'peak MB':>10}")
+    with TemporaryDirectory() as tmpdir:
+        for width, height in sizes:
+            filename = write_synthetic_video(Path(tmpdir) / f"{width}x{height}.mp4", n_frames=n_frames, width=width, height=height)
+            n_sampled = len(range(0, n_frames, every_n))
+            raw_mb = n_sampled * width * height * 3 / MB
+            downsampled_mb = n_sampled * (width // downsample_level) * (height // downsample_level) * 3 / MB
+            peak_mb = peak_memory_mb(filename, width=width, height=height, every_n=every_n, downsample_level=downsample_level, n_clusters=n_clusters)
+            print(f"{f'{width}x{height}':>10} {raw_mb:>15.1f} {downsampled_mb:>15.1f} {peak_mb:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=600)
+    parser.add_argument('--every-n', type=int, default=2)
+    parser.add_argument('--downsample-level', type=int, default=8)
+    parser.add_argument('--n-clusters', type=int, default=10)
+    args = parser.parse_args()
+    sizes = [(320, 240), (640, 480), (1280, 720), (1920, 1080)]
+    main(n_frames=args.n_frames, sizes=sizes, every_n=args.every_n, downsample_level=args.downsample_level, n_clusters=args.n_clusters)
@@ -0,0 +1,44 @@
+"""
+Measures per-click latency of adding one label through AppState, as the number of labels grows to 100k:
+incrementally (add_labels, what the labelling view does on each new point) against re-sending all points (update_labels).
+
+    python -m benchmarks.bench_labels
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+
+from gui.models import AppState
+
+
+def click_latency_us(app: AppState, incremental: bool, all_points: np.ndarray, n_clicks: int) -> float:
+    n = len(app.label_store)
+    t0 = perf_counter()
+    for click in range(n_clicks):
+        if incremental:
+            app.add_labels(frame_indices=[0], points=[[1., 2.]], labels=['head'])
+        else:
+            points = all_points[:n + click + 1]
+            app.update_labels(frame_indices=np.zeros(len(points)), points=points, labels=['head'] * len(points))
+    return (perf_counter() - t0) / n_clicks * 1e6
+
+
+def main(sizes: list, n_clicks: int) -> None:
+    all_points = np.random.default_rng(0).uniform(0, 500, size=(max(sizes) + n_clicks, 2))
+    print(f"{'labels':>8} {'add_labels us':>14} {'update_labels us':>17}")
+    for size in sizes:
+        latencies = []
+        for incremental in [True, False]:
+            app = AppState(feature_cache=None)
+            app.add_labels(frame_indices=np.zeros(size), points=all_points[:size], labels=['head'] * size)
+            latencies.append(click_latency_us(app, incremental=incremental, all_points=all_points, n_clicks=n_clicks))
+        print(f"{size:>8} {latencies[0]:>14.1f} {latencies[1]:>17.1f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10_000, 100_000])
+    parser.add_argument('--n-clicks', type=int, default=20)
+    args = parser.parse_args()
+    main(sizes=args.sizes, n_clicks=args.n_clicks)
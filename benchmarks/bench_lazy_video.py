@@ -0,0 +1,53 @@
+"""
+Measures per-frame latency of scrubbing through a LazyVideoArray (the 'Full Video' layer's data), 
+with and without prefetching, for forward scrubbing and for random jumps.
+
+    python -m benchmarks.bench_lazy_video
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+
+import numpy as np
+
+from benchmarks.synthetic import write_synthetic_video
+from readers import LazyVideoArray
+
+
+def scrub_latencies_ms(video: LazyVideoArray, frame_indices, frame_interval: float) -> np.ndarray:
+    """Times video[idx] for each index, waiting *frame_interval* seconds in between, like a viewer redrawing at a fixed rate."""
+    latencies = []
+    for idx in frame_indices:
+        t0 = perf_counter()
+        video[int(idx)]
+        latencies.append((perf_counter() - t0) * 1000)
+        sleep(frame_interval)
+    return np.array(latencies)
+
+
+def main(n_frames: int, width: int, height: int, chunk_size: int, fps: float) -> None:
+    rng = np.random.default_rng(0)
+    patterns = {
+        'forward': np.arange(n_frames),
+        'random': rng.integers(0, n_frames, size=n_frames // 4),
+    }
+    print(f"{'pattern':>8} {'prefetch':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    with TemporaryDirectory() as tmpdir:
+        filename = write_synthetic_video(Path(tmpdir) / 'video.mp4', n_frames=n_frames, width=width, height=height)
+        for name, frame_indices in patterns.items():
+            for prefetch in [False, True]:
+                video = LazyVideoArray(filename=filename, chunk_size=chunk_size, prefetch=prefetch)
+                latencies = scrub_latencies_ms(video, frame_indices, frame_interval=1 / fps)
+                print(f"{name:>8} {str(prefetch):>9} {np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f} {latencies.max():>8.2f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=400)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--chunk-size', type=int, default=16)
+    parser.add_argument('--fps', type=float, default=30., help="Rate at which the simulated viewer asks for frames.")
+    args = parser.parse_args()
+    main(n_frames=args.n_frames, width=args.width, height=args.height, chunk_size=args.chunk_size, fps=args.fps)
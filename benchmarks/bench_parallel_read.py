@@ -0,0 +1,45 @@
+"""
+Compares frames/sec of decoding (and cropping/downsampling) sampled frames in one process against read_frames_parallel with several worker counts.
+
+    python -m benchmarks.bench_parallel_read
+"""
+from argparse import ArgumentParser
+from functools import partial
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import numpy as np
+
+from benchmarks.synthetic import write_synthetic_video
+from readers import VideoReader
+from workflows import read_frames_parallel, Crop
+from workflows.extract_frames import crop_and_downsample
+
+
+def main(n_frames: int, width: int, height: int, every_n: int, workers: list) -> None:
+    transform = partial(crop_and_downsample, crop=Crop(x0=0, x1=width, y0=0, y1=height), downsample_level=4)
+    frame_indices = range(0, n_frames, every_n)
+    with TemporaryDirectory() as tmpdir:
+        filename = write_synthetic_video(Path(tmpdir) / 'video.mp4', n_frames=n_frames, width=width, height=height)
+        
+        t0 = perf_counter()
+        for frame in VideoReader(filename=filename).read_frames_at(frame_indices):
+            transform(frame)
+        print(f"{'1 (in process)':>16} {len(frame_indices) / (perf_counter() - t0):>10.1f} fps")
+
+        for n_workers in workers:
+            t0 = perf_counter()
+            n_read = sum(len(step) for step in read_frames_parallel(filename, frame_indices, transform=transform, n_workers=n_workers) if isinstance(step, np.ndarray))
+            print(f"{n_workers:>16} {n_read / (perf_counter() - t0):>10.1f} fps")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=2000)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--every-n', type=int, default=2)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    main(n_frames=args.n_frames, width=args.width, height=args.height, every_n=args.every_n, workers=args.workers)
@@ -0,0 +1,65 @@
+"""
+Compares the two feature modes of core.video_processing.StreamingFrameSelector on large synthetic frames:
+exact (incremental) PCA and sparse random projection. For each, reports the time and peak traced memory of
+computing the features and clustering them, and how well the clusters agree (adjusted Rand index) with the true
+clusters the frames were generated from and with the clusters found via PCA.
+
+    python -m benchmarks.bench_random_projection
+"""
+from argparse import ArgumentParser
+from time import perf_counter
+import tracemalloc
+
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+
+from core.video_processing import StreamingFrameSelector
+
+
+MB = 1024 ** 2
+
+
+def make_clustered_frames(n_frames: int, n_clusters: int, shape: tuple, noise: float, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    centers = rng.integers(0, 256, size=(n_clusters, *shape), dtype=np.uint8)
+    true_labels = rng.integers(0, n_clusters, size=n_frames)
+    frames = np.empty((n_frames, *shape), dtype=np.uint8)
+    for idx, label in enumerate(true_labels):
+        frames[idx] = np.clip(centers[label] + rng.normal(0, noise, size=shape), 0, 255)
+    return frames, true_labels
+
+
+def run(frames: np.ndarray, n_clusters: int, features: str, n_components: int) -> tuple:
+    selector = StreamingFrameSelector(n_clusters=n_clusters, n_components=n_components, features=features)
+    tracemalloc.start()
+    t0 = perf_counter()
+    selector.add_frames(frames)
+    selector.fit_features()
+    labels = selector.fit_kmeans()
+    duration = perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return labels, duration, peak / MB - frames.nbytes / MB  # not counting the frames the selector keeps a copy of
+
+
+def main(n_frames: int, n_clusters: int, width: int, height: int, noise: float, components: list) -> None:
+    frames, true_labels = make_clustered_frames(n_frames=n_frames, n_clusters=n_clusters, shape=(height, width, 3), noise=noise)
+    print(f"{n_frames} frames of {height}x{width}x3 = {frames[0].size} features, {n_clusters} clusters")
+    print(f"{'features':>18} {'dims':>5} {'seconds':>8} {'peak MB':>8} {'ARI true':>9} {'ARI pca':>8}")
+    pca_labels, duration, peak = run(frames, n_clusters=n_clusters, features='pca', n_components=50)
+    print(f"{'pca':>18} {50:>5} {duration:>8.2f} {peak:>8.1f} {adjusted_rand_score(true_labels, pca_labels):>9.3f} {1.:>8.3f}")
+    for n_components in components:
+        labels, duration, peak = run(frames, n_clusters=n_clusters, features='random_projection', n_components=n_components)
+        print(f"{'random_projection':>18} {n_components:>5} {duration:>8.2f} {peak:>8.1f} {adjusted_rand_score(true_labels, labels):>9.3f} {adjusted_rand_score(pca_labels, labels):>8.3f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=1000)
+    parser.add_argument('--n-clusters', type=int, default=20)
+    parser.add_argument('--width', type=int, default=240)
+    parser.add_argument('--height', type=int, default=180)
+    parser.add_argument('--noise', type=float, default=60., help="Standard deviation of the per-pixel noise around each cluster's centre.")
+    parser.add_argument('--components', type=int, nargs='+', default=[64, 256, 512])
+    args = parser.parse_args()
+    main(n_frames=args.n_frames, n_clusters=args.n_clusters, width=args.width, height=args.height, noise=args.noise, components=args.components)
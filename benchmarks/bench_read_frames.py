@@ -0,0 +1,49 @@
+"""
+Compares frames/sec of seeking to every frame against sequential decoding (grab() over skipped frames)
+in VideoReader.read_frames, on synthetic videos written with different keyframe intervals.
+
+    python -m benchmarks.bench_read_frames
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from benchmarks.synthetic import write_synthetic_video
+from readers import VideoReader
+from readers.video_reader import MAX_GRAB
+
+
+STRATEGIES = {
+    'seek': 0,
+    'sequential': MAX_GRAB,
+}
+
+
+def time_read_frames(filename: Path, step: int, max_grab: int) -> float:
+    video = VideoReader(filename=filename)
+    t0 = perf_counter()
+    n_read = sum(1 for _ in video.read_frames(step=step, max_grab=max_grab))
+    return n_read / (perf_counter() - t0)
+
+
+def main(n_frames: int, width: int, height: int, gops: list, steps: list) -> None:
+    print(f"{'gop':>5} {'step':>5} " + ' '.join(f"{name + ' fps':>16}" for name in STRATEGIES) + f" {'speedup':>8}")
+    with TemporaryDirectory() as tmpdir:
+        for gop in gops:
+            filename = write_synthetic_video(Path(tmpdir) / f"gop{gop}.mp4", n_frames=n_frames, width=width, height=height, gop=gop)
+            for step in steps:
+                fps = {name: time_read_frames(filename, step=step, max_grab=max_grab) for name, max_grab in STRATEGIES.items()}
+                speedup = fps['sequential'] / fps['seek']
+                print(f"{gop:>5} {step:>5} " + ' '.join(f"{val:>16.1f}" for val in fps.values()) + f" {speedup:>7.2f}x")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=600)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--gops', type=int, nargs='+', default=[1, 12, 60, 250])
+    parser.add_argument('--steps', type=int, nargs='+', default=[1, 5, 30])
+    args = parser.parse_args()
+    main(n_frames=args.n_frames, width=args.width, height=args.height, gops=args.gops, steps=args.steps)
@@ -0,0 +1,65 @@
+"""
+Measures sequential and random-access throughput (frames per second) of every VideoReader backend,
+on the same synthetic frames saved as a video, a folder of PNGs, a .npy stack and (if tifffile is installed) a TIFF stack.
+Random access reads frames at random indices, in random order; backends without cheap random access seek for each one.
+Backends whose optional package isn't installed are skipped.
+
+    python -m benchmarks.bench_readers
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import write_synthetic_video
+from readers import VideoReader
+
+
+def frames_per_second(filename: Path, backend: str, indices: np.ndarray) -> float:
+    video = VideoReader(filename=filename, backend=backend)
+    t0 = perf_counter()
+    for _ in video.read_frames_at(indices):
+        pass
+    return len(indices) / (perf_counter() - t0)
+
+
+def main(n_frames: int, width: int, height: int, n_random: int) -> None:
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        video_path = write_synthetic_video(tmpdir / 'video.mp4', n_frames=n_frames, width=width, height=height)
+        frames = np.stack(list(VideoReader(filename=video_path).read_frames()))
+        (tmpdir / 'frames').mkdir()
+        for idx, frame in enumerate(frames):
+            cv2.imwrite(str(tmpdir / 'frames' / f"frame_{idx:05d}.png"), frame[..., ::-1])
+        np.save(tmpdir / 'frames.npy', frames)
+        sources = [('opencv', video_path), ('pyav', video_path), ('images', tmpdir / 'frames'), ('stack', tmpdir / 'frames.npy')]
+        try:
+            import tifffile
+            tifffile.imwrite(tmpdir / 'frames.tif', frames)
+            sources.append(('stack', tmpdir / 'frames.tif'))
+        except ImportError:
+            pass
+
+        random_indices = np.random.default_rng(0).permutation(len(frames))[:n_random]
+        print(f"{'backend':>8} {'source':>12} {'sequential fps':>15} {'random fps':>11}")
+        for backend, filename in sources:
+            try:
+                sequential = frames_per_second(filename, backend, np.arange(len(frames)))
+            except ImportError as err:
+                print(f"{backend:>8} {filename.name:>12}  skipped: {err}")
+                continue
+            random_access = frames_per_second(filename, backend, random_indices)
+            print(f"{backend:>8} {filename.name:>12} {sequential:>15.0f} {random_access:>11.0f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=600)
+    parser.add_argument('--width', type=int, default=320)
+    parser.add_argument('--height', type=int, default=240)
+    parser.add_argument('--n-random', type=int, default=60)
+    args = parser.parse_args()
+    main(n_frames=args.n_frames, width=args.width, height=args.height, n_random=args.n_random)
@@ -0,0 +1,40 @@
+"""
+Times VideoReader.read_reference_frame and measures its peak traced memory, for each method and number of frames used.
+
+    python -m benchmarks.bench_reference_frame
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import tracemalloc
+
+from benchmarks.synthetic import write_synthetic_video
+from core.video_processing import ReferenceFrameAccumulator
+from readers import VideoReader
+
+
+def main(n_frames: int, width: int, height: int, nframes_to_use: list) -> None:
+    print(f"{'method':>8} {'frames':>7} {'seconds':>8} {'peak MB':>8}")
+    with TemporaryDirectory() as tmpdir:
+        filename = write_synthetic_video(Path(tmpdir) / 'video.mp4', n_frames=n_frames, width=width, height=height)
+        for method in ReferenceFrameAccumulator.methods:
+            for n in nframes_to_use:
+                video = VideoReader(filename=filename)
+                tracemalloc.start()
+                t0 = perf_counter()
+                video.read_reference_frame(nframes_to_use=n, method=method)
+                duration = perf_counter() - t0
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f"{method:>8} {n:>7} {duration:>8.2f} {peak / 1024 ** 2:>8.1f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--n-frames', type=int, default=2000)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--nframes-to-use', type=int, nargs='+', default=[10, 50, 200])
+    args = parser.parse_args()
+    main(n_frames=args.n_frames, width=args.width, height=args.height, nframes_to_use=args.nframes_to_use)
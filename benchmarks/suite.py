@@ -0,0 +1,217 @@
+"""
+Times every stage of the pipeline, from decoding to export, on synthetic videos of several sizes, codecs and keyframe intervals,
+and saves the throughput and peak memory of each (video, benchmark) pair as JSON, so that runs can be compared:
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json --compare before.json
+
+Each benchmark runs in a fresh process, so its peak RSS is its own (setup included, e.g. the frames a benchmark works on).
+With --compare, every benchmark whose throughput dropped, or whose peak RSS grew, by more than --tolerance is listed
+as a regression, and the exit status is 1, so the suite can gate a release.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+from multiprocessing import get_context
+from pathlib import Path
+import platform
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import cv2
+import numpy as np
+import sklearn
+
+from benchmarks.synthetic import write_synthetic_video
+from core.video_processing import downsample, pca, select_subset_frames_kmeans
+from gui.models import AppState
+from readers import VideoReader
+from workflows import Crop, extract_frames
+from workflows.instrumentation import peak_rss_bytes
+
+
+class SyntheticVideo(NamedTuple):
+    name: str
+    width: int
+    height: int
+    n_frames: int
+    fourcc: str = 'mp4v'
+    gop: int = 12
+    extension: str = '.mp4'
+
+
+VIDEOS = [
+    SyntheticVideo('sd-mp4v-gop12', width=640, height=480, n_frames=300),
+    SyntheticVideo('sd-mp4v-gop250', width=640, height=480, n_frames=300, gop=250),
+    SyntheticVideo('sd-mjpg', width=640, height=480, n_frames=300, fourcc='MJPG', gop=1, extension='.avi'),
+    SyntheticVideo('hd-mp4v-gop60', width=1280, height=720, n_frames=150, gop=60),
+]
+
+
+EXTRACT_SETTINGS = {'every_n': 5, 'downsample_level': 3}
+
+
+def n_clusters_for(n_samples: int) -> int:
+    return min(20, n_samples)  # so that short --n-frames runs still work
+
+
+def bench_read_frames(video_path: Path) -> Tuple[float, int]:
+    video = VideoReader(filename=video_path)
+    t0 = perf_counter()
+    n_frames = sum(1 for _ in video.read_frames())
+    return perf_counter() - t0, n_frames
+
+
+def bench_read_average_frame(video_path: Path, nframes_to_use: int = 10) -> Tuple[float, int]:
+    video = VideoReader(filename=video_path)
+    t0 = perf_counter()
+    video.read_average_frame(nframes_to_use=nframes_to_use)
+    return perf_counter() - t0, nframes_to_use
+
+
+def bench_downsample(video_path: Path, level: int = 3) -> Tuple[float, int]:
+    frames = list(VideoReader(filename=video_path).read_frames())
+    t0 = perf_counter()
+    for frame in frames:
+        downsample(frame, level=level)
+    return perf_counter() - t0, len(frames)
+
+
+def read_downsampled_frames(video_path: Path, level: int = 3) -> np.ndarray:
+    return np.array([downsample(frame, level=level) for frame in VideoReader(filename=video_path).read_frames()])
+
+
+def bench_pca(video_path: Path) -> Tuple[float, int]:
+    frames = read_downsampled_frames(video_path)
+    t0 = perf_counter()
+    pca(frames, n_components=50)
+    return perf_counter() - t0, len(frames)
+
+
+def bench_select_subset_frames_kmeans(video_path: Path) -> Tuple[float, int]:
+    components = pca(read_downsampled_frames(video_path), n_components=50)
+    t0 = perf_counter()
+    select_subset_frames_kmeans(components, n_clusters=n_clusters_for(len(components)))
+    return perf_counter() - t0, len(components)
+
+
+def bench_extract_frames(video_path: Path) -> Tuple[float, int]:
+    video = VideoReader(filename=video_path)
+    crop = Crop(x0=0, x1=video.frame_width, y0=0, y1=video.frame_height)
+    t0 = perf_counter()
+    for _ in extract_frames(video_path=video_path, crop=crop, n_clusters=n_clusters_for(len(range(0, len(video), EXTRACT_SETTINGS['every_n']))), **EXTRACT_SETTINGS):
+        pass
+    return perf_counter() - t0, len(video)
+
+
+def bench_export_frames_to_directory(video_path: Path) -> Tuple[float, int]:
+    app = AppState(feature_cache=None)
+    app.load_video(filename=str(video_path))
+    for _ in app.extract_frames(n_clusters=n_clusters_for(len(range(0, len(VideoReader(filename=video_path)), EXTRACT_SETTINGS['every_n']))), **EXTRACT_SETTINGS):
+        pass
+    with TemporaryDirectory() as directory:
+        t0 = perf_counter()
+        app.export_frames_to_directory(directory=Path(directory))
+        return perf_counter() - t0, len(app.selected_frame_indices)
+
+
+BENCHMARKS: Dict[str, Callable[[Path], Tuple[float, int]]] = {
+    'read_frames': bench_read_frames,
+    'read_average_frame': bench_read_average_frame,
+    'downsample': bench_downsample,
+    'pca': bench_pca,
+    'select_subset_frames_kmeans': bench_select_subset_frames_kmeans,
+    'extract_frames': bench_extract_frames,
+    'export_frames_to_directory': bench_export_frames_to_directory,
+}
+
+
+def run_benchmark(benchmark: str, video_path: Path, repeat: int) -> Dict[str, Any]:
+    """Runs in a fresh worker process: the best of *repeat* runs, and the process's peak RSS."""
+    seconds, n_frames = min(BENCHMARKS[benchmark](video_path) for _ in range(repeat))
+    return {'seconds': seconds, 'frames': n_frames, 'frames_per_second': n_frames / seconds, 'peak_rss_bytes': peak_rss_bytes()}
+
+
+def run_suite(videos: List[SyntheticVideo], benchmarks: List[str], repeat: int = 1) -> Dict[str, Any]:
+    results = []
+    print(f"{'video':>16} {'benchmark':>28} {'frames/s':>10} {'peak RSS (MB)':>14}")
+    with TemporaryDirectory() as tmpdir:
+        for video in videos:
+            video_path = write_synthetic_video(
+                Path(tmpdir) / f"{video.name}{video.extension}", n_frames=video.n_frames, width=video.width, height=video.height,
+                gop=video.gop, fourcc=video.fourcc,
+            )
+            for benchmark in benchmarks:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                    result = pool.submit(run_benchmark, benchmark, video_path, repeat).result()
+                results.append({'video': video._asdict(), 'benchmark': benchmark, **result})
+                rss_mb = result['peak_rss_bytes'] / 1024 ** 2 if result['peak_rss_bytes'] is not None else float('nan')
+                print(f"{video.name:>16} {benchmark:>28} {result['frames_per_second']:>10.1f} {rss_mb:>14.0f}")
+    return {
+        'finished': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'versions': {'numpy': np.__version__, 'opencv': cv2.__version__, 'scikit-learn': sklearn.__version__},
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def find_regressions(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Lists the benchmarks that got slower, or used more memory, than in *baseline* by more than *tolerance* (a fraction).
+
+    Example
+    -------
+    >>> result = lambda fps, rss: {'results': [{'video': {'name': 'sd'}, 'benchmark': 'pca', 'frames_per_second': fps, 'peak_rss_bytes': rss}]}
+    >>> find_regressions(result(100., 1000), result(95., 1000), tolerance=0.1)
+    []
+    >>> find_regressions(result(100., 1000), result(50., 1500), tolerance=0.1)
+    ['sd pca: 100.0 -> 50.0 frames/s (-50%)', 'sd pca: peak RSS 1000 -> 1500 bytes (+50%)']
+    """
+    previous = {(result['video']['name'], result['benchmark']): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = (result['video']['name'], result['benchmark'])
+        if key not in previous:
+            continue
+        old, new = previous[key]['frames_per_second'], result['frames_per_second']
+        if new < old * (1 - tolerance):
+            regressions.append(f"{' '.join(key)}: {old:.1f} -> {new:.1f} frames/s ({new / old - 1:+.0%})")
+        old, new = previous[key]['peak_rss_bytes'], result['peak_rss_bytes']
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"{' '.join(key)}: peak RSS {old} -> {new} bytes ({new / old - 1:+.0%})")
+    return regressions
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', type=Path, help="Where to save the results, as JSON.")
+    parser.add_argument('--compare', type=Path, help="Results of an earlier run to check this one against.")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="How much slower (or bigger) a benchmark may get before it counts as a regression.")
+    parser.add_argument('--videos', nargs='+', choices=[video.name for video in VIDEOS], default=[video.name for video in VIDEOS])
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--n-frames', type=int, help="Overrides every video's length, e.g. for a quick run.")
+    parser.add_argument('--repeat', type=int, default=1, help="Keep the best of this many runs of each benchmark.")
+    args = parser.parse_args()
+
+    videos = [video for video in VIDEOS if video.name in args.videos]
+    if args.n_frames is not None:
+        videos = [video._replace(n_frames=args.n_frames) for video in videos]
+    results = run_suite(videos=videos, benchmarks=args.benchmarks, repeat=args.repeat)
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.compare is None:
+        return 0
+    regressions = find_regressions(json.loads(args.compare.read_text()), results, tolerance=args.tolerance)
+    print(f"\n{len(regressions)} regression(s) against {args.compare}" + ''.join(f"\n  {regression}" for regression in regressions))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
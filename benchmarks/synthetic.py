@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def write_synthetic_video(
+    filename: Path, 
+    n_frames: int = 300, 
+    width: int = 320, 
+    height: int = 240, 
+    gop: int = 12, 
+    fourcc: str = 'mp4v', 
+    fps: float = 30., 
+    seed: int = 0,
+    still_fraction: float = 0.,
+) -> Path:
+    """
+    Writes a video of a few bright blobs wandering over a noisy background, with a keyframe every *gop* frames.
+    The blobs give the frames real variety to cluster on; the noise keeps the encoder from making every frame trivially small.
+    With *still_fraction* > 0, the blobs only move in a few short bursts and hold still for that fraction of the video,
+    like an animal that mostly sits in one place.
+    """
+    writer = cv2.VideoWriter(
+        str(filename), 
+        cv2.CAP_FFMPEG, 
+        cv2.VideoWriter_fourcc(*fourcc), 
+        fps, 
+        (width, height),
+        [cv2.VIDEOWRITER_PROP_KEY_INTERVAL, gop],
+    )
+    if not writer.isOpened():
+        raise IOError(f"Couldn't open a '{fourcc}' VideoWriter for '{filename}'.")
+    
+    rng = np.random.default_rng(seed)
+    n_blobs = 3
+    positions = rng.uniform((0, 0), (width, height), size=(n_blobs, 2))
+    velocities = rng.normal(0, 4, size=(n_blobs, 2))
+    colors = rng.integers(100, 256, size=(n_blobs, 3))
+    moving = np.ones(n_frames, dtype=bool)
+    if still_fraction > 0:
+        n_bursts = 5
+        burst_starts = np.linspace(0, n_frames, n_bursts, endpoint=False).astype(int) + int(rng.integers(0, n_frames // n_bursts))
+        burst_length = int(round(n_frames * (1 - still_fraction) / n_bursts))
+        moving[:] = False
+        for start in burst_starts:
+            moving[start:start + burst_length] = True
+    for frame_idx in range(n_frames):
+        frame = rng.integers(0, 30, size=(height, width, 3), dtype=np.uint8)
+        for (x, y), color in zip(positions, colors):
+            cv2.circle(frame, (int(x), int(y)), max(height // 12, 2), [int(c) for c in color], -1)
+        writer.write(frame)
+
+        if moving[frame_idx]:
+            velocities += rng.normal(0, 1, size=velocities.shape)
+            positions = (positions + velocities) % (width, height)
+
+    writer.release()
+    return Path(filename)
@@ -1,9 +1,15 @@
-from typing import List
+from pathlib import Path
+import shutil
+from tempfile import mkdtemp
+from time import perf_counter
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import weakref
 
 import numpy as np
 import cv2
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
 from sklearn.cluster import MiniBatchKMeans
+from sklearn.random_projection import SparseRandomProjection
 
 
 def downsample(frame: np.ndarray, level: float) -> np.ndarray:
@@ -12,27 +18,560 @@ def downsample(frame: np.ndarray, level: float) -> np.ndarray:
     return new_frame
 
 
-def pca(frames: np.ndarray) -> np.ndarray:
-    flat_frames = frames.reshape(frames.shape[0], -1)
-    do_pca = PCA(n_components=min(flat_frames.shape))
+def downsampled_shape(frame_shape: Tuple[int, int, int], level: int, grayscale: bool = False) -> Tuple[int, int, int]:
+    h, w, c = frame_shape
+    return (h // level, w // level, 1 if grayscale else c)
+
+
+def downsample_batch(frames: np.ndarray, level: int, grayscale: bool = False, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Downsamples a batch of (n, h, w, c) uint8 frames by the integer factor *level* (cv2.resize with INTER_AREA, one frame at a time),
+    optionally converting to grayscale (c=1) afterwards.
+    The result is written into *out* if given, which must have shape (n, *downsampled_shape(...)).
+
+    Examples:
+
+    >>> frames = np.arange(16, dtype=np.uint8).reshape(1, 4, 4, 1).repeat(3, axis=3)
+    >>> downsample_batch(frames, level=2)[0, ..., 0]
+    array([[ 3,  5],
+           [11, 13]], dtype=uint8)
+    """
+    n, h, w, c = frames.shape
+    out_h, out_w, out_c = downsampled_shape((h, w, c), level=level, grayscale=grayscale)
+    if out is None:
+        out = np.empty((n, out_h, out_w, out_c), dtype=np.uint8)
+
+    resized = out if not grayscale else np.empty((out_h, out_w, c), dtype=np.uint8)
+    for idx, frame in enumerate(frames):
+        dst = resized[idx] if not grayscale else resized
+        cv2.resize(frame, (out_w, out_h), dst=dst, interpolation=cv2.INTER_AREA)
+        if grayscale:
+            cv2.cvtColor(resized, cv2.COLOR_RGB2GRAY, dst=out[idx, ..., 0])
+    return out
+
+
+class ReferenceFrameAccumulator:
+    """
+    Builds a reference image (the per-pixel mean, median or max) from frames added one at a time, 
+    in memory that doesn't grow with the number of frames.
+    The mean is kept as a uint32 running sum and the max as a uint8 running max. 
+    The median is exact over the first *median_buffer_size* frames, then refined by a stochastic-approximation 
+    update (each pixel steps toward every new frame's value, with a shrinking step size), so more frames make it more accurate.
+
+    Example
+    -------
+    >>> acc = ReferenceFrameAccumulator(method='max')
+    >>> for value in [3, 9, 5]:
+    ...     acc.add(np.full((2, 2, 3), value, dtype=np.uint8))
+    >>> acc.result()[0, 0]
+    array([9, 9, 9], dtype=uint8)
+    """
+    methods = ('mean', 'median', 'max')
+
+    def __init__(self, method: str = 'mean', median_buffer_size: int = 15, median_step_size: float = 2.) -> None:
+        if method not in self.methods:
+            raise ValueError(f"method must be one of {self.methods}, not '{method}'")
+        self.method = method
+        self.median_buffer_size = median_buffer_size
+        self.median_step_size = median_step_size
+        self.n_frames = 0
+        self._state: Optional[np.ndarray] = None
+    
+    def add(self, frame: np.ndarray) -> None:
+        if self.method == 'mean':
+            if self._state is None:
+                self._state = np.zeros(frame.shape, dtype=np.uint32)
+            self._state += frame
+        elif self.method == 'max':
+            if self._state is None:
+                self._state = np.zeros(frame.shape, dtype=np.uint8)
+            np.maximum(self._state, frame, out=self._state)
+        elif self.n_frames < self.median_buffer_size:
+            if self._state is None:
+                self._state = np.empty((self.median_buffer_size, *frame.shape), dtype=np.uint8)
+            self._state[self.n_frames] = frame
+            if self.n_frames + 1 == self.median_buffer_size:
+                self._state = np.median(self._state, axis=0).astype(np.float32)
+        else:
+            step = self.median_step_size * np.sqrt(self.median_buffer_size / self.n_frames)
+            self._state += step * np.sign(frame - self._state)
+        self.n_frames += 1
+
+    def result(self) -> np.ndarray:
+        if self._state is None:
+            raise ValueError("No frames were added.")
+        if self.method == 'mean':
+            return (self._state / self.n_frames).astype(np.uint8)
+        if self.method == 'median' and self.n_frames < self.median_buffer_size:
+            return np.median(self._state[:self.n_frames], axis=0).astype(np.uint8)
+        return np.clip(self._state, 0, 255).astype(np.uint8)
+
+
+def pca(frames: np.ndarray, n_components: int = 50) -> np.ndarray:
+    """Projects the frames onto their first *n_components* principal components, using a randomized SVD."""
+    flat_frames = frames.reshape(frames.shape[0], -1).astype(np.float32)
+    do_pca = PCA(n_components=min(n_components, *flat_frames.shape), svd_solver='randomized', random_state=0)
     component_frames = do_pca.fit_transform(flat_frames)
     return component_frames
 
 
-def select_subset_frames_kmeans(frames: np.ndarray, n_clusters: int = 20) -> List[int]:
+def select_subset_frames_kmeans(frames: np.ndarray, n_clusters: int = 20, random_state: Optional[int] = 0) -> List[int]:
     """
-    Returns indices of a subset of frames, selected via clustering using KMeans
+    Returns indices of a subset of frames, selected via clustering using KMeans (the frame closest to each cluster's centre)
     """
 
     flat_frames = frames.reshape(frames.shape[0], -1)
-    kmeans = MiniBatchKMeans(n_clusters=n_clusters, tol=1e-5, batch_size=100, max_iter=50, verbose=1)
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, tol=1e-5, batch_size=100, max_iter=50, random_state=random_state)
     kmeans.fit(flat_frames)
+    return pick_frames_closest_to_centroids(kmeans.transform(flat_frames), kmeans.labels_)
     
+
+def motion_energy(frames: np.ndarray, background: np.ndarray) -> np.ndarray:
+    """
+    Returns the mean absolute difference of each frame from *background* (e.g. the reference frame, downsampled the same way,
+    or an array of one background per frame, such as the previous frames): a cheap measure of how much is going on in each frame.
+
+    Example
+    -------
+    >>> background = np.zeros((2, 2, 1), dtype=np.uint8)
+    >>> frames = np.array([background, background + 4, background + 10])
+    >>> motion_energy(frames, background)
+    array([ 0.,  4., 10.], dtype=float32)
+    """
+    diffs = np.abs(frames.astype(np.int16) - background.astype(np.int16))
+    return diffs.reshape(len(frames), -1).mean(axis=1, dtype=np.float32)
+
+
+def select_moving_frames(energies: np.ndarray, keep_fraction: float, min_frames: int = 1) -> np.ndarray:
+    """
+    Returns the (ascending) indices of the *keep_fraction* of frames with the highest motion energy, but at least *min_frames* of them.
+
+    Example
+    -------
+    >>> select_moving_frames(np.array([5., 0., 1., 9., 0.]), keep_fraction=0.4)
+    array([0, 3])
+    """
+    n_keep = min(len(energies), max(min_frames, int(round(keep_fraction * len(energies)))))
+    if n_keep >= len(energies):
+        return np.arange(len(energies))
+    return np.sort(np.argpartition(-energies, n_keep - 1)[:n_keep])
+
+
+def allocate_samples(coarse_indices: np.ndarray, change: np.ndarray, budget: int, floor: float = 0.1) -> np.ndarray:
+    """
+    Spreads *budget* frame indices over the intervals between consecutive *coarse_indices*, in proportion to how much
+    the content *change*s over each interval (e.g. the motion energy between its two ends), sampling evenly within an interval.
+    Every interval gets a weight of at least *floor* times the mean change, so static stretches are thinned out, not dropped.
+    Returns at most *budget* sorted, unique indices (fewer if the busy intervals are shorter than their share).
+
+    Example
+    -------
+    >>> allocate_samples(np.array([0, 100, 110, 210]), change=np.array([1., 10., 1.]), budget=20).tolist()
+    [0, 50, 100, 101, 102, 103, 104, 105, 106, 107, 108, 109, 110, 160]
+    """
+    if budget < 1:
+        raise ValueError(f"budget must be at least 1 frame, not {budget}")
+    coarse_indices = np.asarray(coarse_indices)
+    if len(coarse_indices) < 2:  # no intervals to spread samples over, e.g. a one-frame video
+        return np.unique(coarse_indices)[:budget]
+    lengths = np.diff(coarse_indices)
+    weights = np.asarray(change, dtype=np.float64) + floor * max(float(np.mean(change)), 1e-12)
+    shares = budget * weights / weights.sum()
+    counts = np.floor(shares).astype(int)
+    counts[np.argsort(counts - shares)[:budget - counts.sum()]] += 1  # largest remainders get the leftover samples
+    counts = np.minimum(counts, lengths)
+    samples = [start + (np.arange(count) * length) // count for start, length, count in zip(coarse_indices[:-1], lengths, counts) if count]
+    return np.unique(np.concatenate(samples))
+
+
+SELECTION_METHODS = ('centroid', 'medoid', 'random')
+
+
+def pick_frame_per_cluster(labels: np.ndarray, random_state: Optional[int] = 0) -> List[int]:
+    """Returns the index of one randomly-chosen frame from each cluster (reproducibly, unless *random_state* is None)."""
+    rng = np.random.default_rng(random_state)
     selected_frame_indices = []
-    for cluster_id in np.unique(kmeans.labels_):
-        frame_indices_in_cluster = np.where(cluster_id == kmeans.labels_)[0]
-        idx = np.random.choice(frame_indices_in_cluster)
-        selected_frame_indices.append(idx)
+    for cluster_id in np.unique(labels):
+        frame_indices_in_cluster = np.where(cluster_id == labels)[0]
+        idx = rng.choice(frame_indices_in_cluster)
+        selected_frame_indices.append(int(idx))
+
+    return selected_frame_indices
+
+
+def pick_frames_closest_to_centroids(centroid_distances: np.ndarray, labels: np.ndarray) -> List[int]:
+    """
+    Returns the index of the frame closest to its cluster's centroid, for each cluster,
+    given the (n_frames, n_clusters) distances from KMeans.transform() and each frame's cluster label.
+
+    Example
+    -------
+    >>> distances = np.array([[0.5, 9.], [0.1, 9.], [9., 2.], [9., 1.]])
+    >>> pick_frames_closest_to_centroids(distances, labels=np.array([0, 0, 1, 1]))
+    [1, 3]
+    """
+    own_distances = centroid_distances[np.arange(len(labels)), labels]
+    order = np.lexsort((own_distances, labels))  # by cluster, then nearest first
+    is_first_in_cluster = np.r_[True, labels[order][1:] != labels[order][:-1]]
+    return [int(idx) for idx in order[is_first_in_cluster]]
+
+
+def pick_cluster_medoids(features: np.ndarray, labels: np.ndarray, max_cluster_size: int = 2000, block_size: int = 512, random_state: Optional[int] = 0) -> List[int]:
+    """
+    Returns the index of each cluster's medoid: the frame with the smallest summed distance to the other frames in its cluster.
+    Clusters with more than *max_cluster_size* frames are (reproducibly) subsampled to that many first, so each cluster costs at most
+    max_cluster_size^2 distances, and distances are summed *block_size* rows at a time rather than building the whole distance matrix.
+    """
+    rng = np.random.default_rng(random_state)
+    selected_frame_indices = []
+    for cluster_id in np.unique(labels):
+        members = np.where(cluster_id == labels)[0]
+        if len(members) > max_cluster_size:
+            members = np.sort(rng.choice(members, size=max_cluster_size, replace=False))
+        cluster = features[members].astype(np.float32)
+        squared_norms = np.einsum('ij,ij->i', cluster, cluster)
+        summed_distances = np.empty(len(members), dtype=np.float64)
+        for start in range(0, len(members), block_size):
+            block = slice(start, start + block_size)
+            squared_distances = squared_norms[block, np.newaxis] - 2 * (cluster[block] @ cluster.T) + squared_norms[np.newaxis, :]
+            summed_distances[block] = np.sqrt(np.maximum(squared_distances, 0)).sum(axis=1)
+        selected_frame_indices.append(int(members[np.argmin(summed_distances)]))
+    return selected_frame_indices
+
 
+def spread_within_clusters(features: np.ndarray, labels: np.ndarray, seeds: Sequence[int], k_per_cluster: int) -> List[int]:
+    """
+    Grows each cluster's seed frame into up to *k_per_cluster* frames by farthest-point sampling within the cluster,
+    so that the extra frames cover the cluster rather than crowding around its centre. Returns them grouped by cluster.
+    """
+    selected_frame_indices = []
+    for seed in seeds:
+        members = np.where(labels == labels[seed])[0]
+        cluster = features[members].astype(np.float32)
+        chosen = [int(np.where(members == seed)[0][0])]
+        min_distances = np.sum((cluster - cluster[chosen[0]]) ** 2, axis=1)
+        for _ in range(min(k_per_cluster, len(members)) - 1):
+            farthest = int(np.argmax(min_distances))
+            chosen.append(farthest)
+            min_distances = np.minimum(min_distances, np.sum((cluster - cluster[farthest]) ** 2, axis=1))
+        selected_frame_indices.extend(int(members[idx]) for idx in chosen)
     return selected_frame_indices
 
+
+def iter_chunks(frames: np.ndarray, chunk_size: int) -> Iterator[np.ndarray]:
+    """Yields consecutive chunks of flattened, float32 frames, so that only one chunk is ever converted at a time."""
+    for start in range(0, len(frames), chunk_size):
+        yield frames[start:start + chunk_size].reshape(-1, np.prod(frames.shape[1:], dtype=int)).astype(np.float32)
+
+
+def make_random_projection(n_features: int, n_components: int = 256, random_state: Optional[int] = 0) -> SparseRandomProjection:
+    """
+    Returns a sparse random projection (Achlioptas/Li) from *n_features* down to *n_components* dimensions, which roughly preserves distances.
+    Its matrix has about sqrt(n_features) nonzeros per component, so it stays small even for full-resolution frames.
+    """
+    projection = SparseRandomProjection(n_components=min(n_components, n_features), dense_output=True, random_state=random_state)
+    projection.fit(np.zeros((1, n_features), dtype=np.float32))  # only the number of features is used
+    return projection
+
+
+def random_projection(frames: np.ndarray, n_components: int = 256, random_state: Optional[int] = 0, projection: Optional[SparseRandomProjection] = None) -> np.ndarray:
+    """
+    Projects the frames onto *n_components* sparse random directions (or with the given *projection*).
+    Unlike PCA it needs no fitting pass over the data, so frames can be projected one chunk at a time as they are read.
+    Frames are converted to float a few at a time, never the whole batch at once.
+    """
+    n_features = int(np.prod(frames.shape[1:]))
+    if projection is None:
+        projection = make_random_projection(n_features, n_components=n_components, random_state=random_state)
+    rows_per_batch = max(1, 2 ** 22 // n_features)  # ~16 MB of float32 at a time
+    return np.concatenate([projection.transform(flat_frames).astype(np.float32) for flat_frames in iter_chunks(frames, rows_per_batch)])
+
+
+FEATURE_METHODS = ('pca', 'random_projection')
+DEFAULT_N_COMPONENTS = {'pca': 50, 'random_projection': 256}
+
+
+class KMeansStep(NamedTuple):
+    """The state of a mini-batch KMeans fit after one mini-batch."""
+    iteration: int  # mini-batches done so far
+    n_iterations: int  # the most there will be (n_epochs * batches per epoch)
+    inertia: float  # mean squared distance of the mini-batch's frames to their nearest centre
+    smoothed_inertia: float  # an exponentially weighted average of *inertia* over recent mini-batches, as convergence is judged on
+    converged: bool = False  # the last step, because *smoothed_inertia* stopped improving
+    out_of_time: bool = False  # the last step, because the time budget ran out
+
+
+class StreamingFrameSelector:
+    """
+    Out-of-core frame selection: fits an IncrementalPCA on chunks of (downsampled) frames as they are streamed in,
+    then clusters the low-dimensional components with MiniBatchKMeans.partial_fit.
+    The full float matrix of all frames is never built, but the uint8 frames themselves are kept until the features are fitted,
+    since PCA needs a second pass over them to compute each frame's components once it has seen them all:
+    memory grows with the number of frames added (one byte per downsampled pixel), plus an (n_frames, n_components) float32 matrix.
+    With a *spill_directory*, each full chunk is written to a temporary folder there and memory-mapped back instead,
+    so only one chunk of frames is held in memory at a time; the folder is deleted with the selector.
+    With *features*='random_projection', each chunk is instead projected with a sparse random projection as it comes in,
+    which is much cheaper than PCA for frames with very many pixels (e.g. little downsampling), at some cost in cluster quality.
+
+    Example
+    -------
+    >>> selector = StreamingFrameSelector(n_clusters=3, n_components=4, chunk_size=8)
+    >>> for frame in np.random.randint(0, 255, size=(30, 6, 5, 3), dtype=np.uint8):
+    ...     selector.add_frame(frame)
+    >>> components = selector.fit_features()
+    >>> components.shape
+    (30, 4)
+    >>> len(selector.select(n_epochs=2))
+    3
+
+    iter_fit_features() and iter_fit_kmeans() do the same work as fit_features() and fit_kmeans(), but one chunk or mini-batch at a time,
+    yielding after each so the caller can report progress, or cancel by simply not asking for the next step.
+    """
+
+    def __init__(self, n_clusters: int = 20, n_components: Optional[int] = None, chunk_size: int = 256, random_state: Optional[int] = 0, fit_while_adding: bool = True, features: str = 'pca', spill_directory: Optional[Path] = None) -> None:
+        if features not in FEATURE_METHODS:
+            raise ValueError(f"features must be one of {FEATURE_METHODS}, not {features!r}")
+        self.n_clusters = n_clusters
+        self.features = features
+        self.n_components = n_components if n_components is not None else DEFAULT_N_COMPONENTS[features]
+        self.chunk_size = max(chunk_size, self.n_components) if features == 'pca' else chunk_size
+        self.fit_while_adding = fit_while_adding  # False if the frames will be filtered before clustering, so there's no point fitting them yet
+        self.random_state = random_state  # seeds the KMeans initialization and mini-batch shuffling, so runs are reproducible
+        self.ipca: Optional[IncrementalPCA] = None
+        self.projection: Optional[SparseRandomProjection] = None
+        self._projected: List[np.ndarray] = []
+        self.kmeans: Optional[MiniBatchKMeans] = None
+        self.components: Optional[np.ndarray] = None
+        self.labels: Optional[np.ndarray] = None
+        self.spill_directory = spill_directory
+        self._spilled_to: Optional[Path] = None
+        self._chunks: List[np.ndarray] = []
+        self._pending: Optional[np.ndarray] = None
+        self._n_pending = 0
+    
+    @property
+    def chunks(self) -> List[np.ndarray]:
+        """The frames added so far, in the chunks the features were computed on."""
+        self._flush()
+        return self._chunks
+
+    def __len__(self) -> int:
+        return sum(len(chunk) for chunk in self._chunks) + self._n_pending
+
+    def add_frame(self, frame: np.ndarray) -> None:
+        self.add_frames(frame[np.newaxis])
+
+    def add_frames(self, frames: np.ndarray) -> None:
+        """Copies the frames into the current chunk, fitting the PCA on (or projecting) each chunk as it fills up."""
+        start = 0
+        while start < len(frames):
+            if self._pending is None:
+                self._pending = np.empty((self.chunk_size, *frames.shape[1:]), dtype=frames.dtype)
+            n = min(len(frames) - start, self.chunk_size - self._n_pending)
+            self._pending[self._n_pending:self._n_pending + n] = frames[start:start + n]
+            self._n_pending += n
+            start += n
+            if self._n_pending == self.chunk_size:
+                self._flush()
+    
+    def _flush(self) -> None:
+        if not self._n_pending:
+            return
+        chunk = self._pending[:self._n_pending]
+        self._pending = None
+        self._n_pending = 0
+        if self.fit_while_adding:
+            self._partial_fit(chunk)
+        self._chunks.append(self._store(chunk))
+
+    def _store(self, chunk: np.ndarray) -> np.ndarray:
+        """Returns the chunk as it is, or with a spill_directory, saves it there and returns it memory-mapped (read-only)."""
+        if self.spill_directory is None:
+            return chunk
+        if self._spilled_to is None:
+            Path(self.spill_directory).mkdir(parents=True, exist_ok=True)
+            self._spilled_to = Path(mkdtemp(prefix='frame_selector_', dir=self.spill_directory))
+            weakref.finalize(self, shutil.rmtree, self._spilled_to, ignore_errors=True)  # ignore_errors: Windows can't delete files that are still mapped
+        path = self._spilled_to / f"{len(self._chunks):06d}.npy"
+        np.save(path, chunk)
+        return np.load(path, mmap_mode='r')
+
+    def _partial_fit(self, chunk: np.ndarray) -> None:
+        if self.features == 'pca':
+            self._partial_fit_pca(chunk)
+        else:
+            self._project(chunk)
+
+    def _project(self, chunk: np.ndarray) -> None:
+        if self.projection is None:
+            self.projection = make_random_projection(int(np.prod(chunk.shape[1:])), n_components=self.n_components, random_state=self.random_state)
+        self._projected.append(random_projection(chunk, projection=self.projection))
+    
+    def _partial_fit_pca(self, chunk: np.ndarray) -> None:
+        flat_chunk = next(iter_chunks(chunk, chunk_size=len(chunk)))
+        if self.ipca is None:
+            self.ipca = IncrementalPCA(n_components=min(self.n_components, *flat_chunk.shape))
+        if len(flat_chunk) >= self.ipca.n_components:  # IncrementalPCA can't fit batches smaller than its component count.
+            self.ipca.partial_fit(flat_chunk)
+
+    def frames_at(self, indices: Sequence[int]) -> np.ndarray:
+        """Returns a copy of the frames at *indices* (positions in the order they were added), read from their chunks without joining them."""
+        chunk_starts = np.cumsum([0] + [len(chunk) for chunk in self.chunks])
+        indices = np.asarray(indices)
+        chunk_ids = np.searchsorted(chunk_starts, indices, side='right') - 1
+        return np.stack([self._chunks[chunk_id][idx - chunk_starts[chunk_id]] for chunk_id, idx in zip(chunk_ids, indices)])
+
+    def subset(self, indices: Sequence[int]) -> 'StreamingFrameSelector':
+        """Returns a new selector with the same settings, holding only the frames at *indices* (e.g. those that pass a motion filter)."""
+        selector = StreamingFrameSelector(n_clusters=self.n_clusters, n_components=self.n_components, chunk_size=self.chunk_size, random_state=self.random_state, features=self.features, spill_directory=self.spill_directory)
+        chunk_starts = np.cumsum([0] + [len(chunk) for chunk in self.chunks])
+        indices = np.asarray(indices)
+        for chunk, start, stop in zip(self._chunks, chunk_starts[:-1], chunk_starts[1:]):
+            in_chunk = indices[(indices >= start) & (indices < stop)]
+            if len(in_chunk):
+                selector.add_frames(chunk[in_chunk - start])
+        return selector
+
+    def iter_fit_features(self) -> Iterator[Tuple[int, int]]:
+        """
+        Finishes fitting the PCA on (or projecting) any frames still pending, then computes the components of every frame,
+        yielding (chunks done, total chunks) after each chunk of each pass. self.components is only set once it's finished.
+        """
+        self._flush()
+        if not self._chunks:
+            raise ValueError("No frames were added.")
+        needs_fit = self.ipca is None and not self._projected
+        needs_transform = self.features == 'pca'
+        n_steps = len(self._chunks) * (needs_fit + needs_transform)
+        n_done = 0
+        if needs_fit:
+            for chunk in self._chunks:
+                self._partial_fit(chunk)
+                n_done += 1
+                yield n_done, n_steps
+        if self.features == 'random_projection':
+            self.components = np.concatenate(self._projected)
+            return
+        components = []
+        for chunk in self._chunks:
+            components.extend(self.ipca.transform(flat_chunk).astype(np.float32) for flat_chunk in iter_chunks(chunk, self.chunk_size))
+            n_done += 1
+            yield n_done, n_steps
+        self.components = np.concatenate(components)
+
+    def fit_features(self) -> np.ndarray:
+        """Finishes fitting the PCA on (or projecting) any frames still pending, and returns the components of every frame."""
+        for _ in self.iter_fit_features():
+            pass
+        return self.components
+
+    def iter_fit_kmeans(self, n_epochs: int = 10, batch_size: int = 256, time_budget: Optional[float] = None, max_no_improvement: Optional[int] = None) -> Iterator[KMeansStep]:
+        """
+        Clusters the PCA (or projected) components by feeding shuffled mini-batches to MiniBatchKMeans.partial_fit, yielding a KMeansStep after each.
+        Runs all *n_epochs* unless early stopping is asked for: after the smoothed inertia hasn't improved for *max_no_improvement* mini-batches,
+        or once *time_budget* seconds have passed, keeping the clusters found so far. self.labels is only set once it's finished.
+        """
+        components = self.fit_features() if self.components is None else self.components
+        batch_size = max(batch_size, self.n_clusters)  # the first batch has to be big enough to initialize every cluster
+        self.kmeans = MiniBatchKMeans(n_clusters=self.n_clusters, batch_size=batch_size, random_state=self.random_state)
+        rng = np.random.default_rng(self.random_state)
+        n_iterations = n_epochs * -(-len(components) // batch_size)
+        # MiniBatchKMeans.fit's smoothing, but always averaging over a few mini-batches, even when one batch holds every frame
+        alpha = min(0.5, 2 * batch_size / (len(components) + 1))
+        smoothed_inertia, best_inertia, n_no_improvement = None, np.inf, 0
+        deadline = perf_counter() + time_budget if time_budget is not None else np.inf
+        batches = (
+            components[order[start:start + batch_size]]
+            for order in (rng.permutation(len(components)) for _ in range(n_epochs))
+            for start in range(0, len(order), batch_size)
+        )
+        for iteration, batch in enumerate(batches, start=1):
+            self.kmeans.partial_fit(batch)
+            inertia = float(self.kmeans.inertia_) / len(batch)
+            smoothed_inertia = inertia if smoothed_inertia is None else (1 - alpha) * smoothed_inertia + alpha * inertia
+            if smoothed_inertia < best_inertia:
+                best_inertia, n_no_improvement = smoothed_inertia, 0
+            else:
+                n_no_improvement += 1
+            converged = max_no_improvement is not None and n_no_improvement >= max_no_improvement
+            out_of_time = perf_counter() > deadline
+            yield KMeansStep(iteration=iteration, n_iterations=n_iterations, inertia=inertia, smoothed_inertia=smoothed_inertia, converged=converged, out_of_time=out_of_time)
+            if converged or out_of_time:
+                break
+        self.labels = self.kmeans.predict(components)
+
+    def fit_kmeans(self, n_epochs: int = 10, batch_size: int = 256, time_budget: Optional[float] = None, max_no_improvement: Optional[int] = None) -> np.ndarray:
+        """Runs iter_fit_kmeans() to the end, returning each frame's cluster label."""
+        for _ in self.iter_fit_kmeans(n_epochs=n_epochs, batch_size=batch_size, time_budget=time_budget, max_no_improvement=max_no_improvement):
+            pass
+        return self.labels
+
+    def select(self, n_epochs: int = 10, batch_size: int = 256, method: str = 'centroid', k_per_cluster: int = 1, time_budget: Optional[float] = None, max_no_improvement: Optional[int] = None) -> List[int]:
+        """
+        Returns indices of *k_per_cluster* frames per cluster. Each cluster's first frame is chosen by *method*:
+        'centroid' (the frame closest to the cluster centre), 'medoid', or 'random'.
+        Any further frames are spread across the cluster, from the same fit (see iter_fit_kmeans() for *time_budget* and *max_no_improvement*).
+        """
+        self.fit_kmeans(n_epochs=n_epochs, batch_size=batch_size, time_budget=time_budget, max_no_improvement=max_no_improvement)
+        return self.pick_frames(method=method, k_per_cluster=k_per_cluster)
+
+    def pick_frames(self, method: str = 'centroid', k_per_cluster: int = 1) -> List[int]:
+        """The frame-picking half of select(), for after the clusters have been fitted (e.g. with iter_fit_kmeans())."""
+        if method not in SELECTION_METHODS:
+            raise ValueError(f"method must be one of {SELECTION_METHODS}, not {method!r}")
+        if self.labels is None:
+            raise ValueError("The clusters haven't been fitted yet.")
+        labels = self.labels
+        if method == 'centroid':
+            selected = pick_frames_closest_to_centroids(self.kmeans.transform(self.components), labels)
+        elif method == 'medoid':
+            selected = pick_cluster_medoids(self.components, labels, random_state=self.random_state)
+        else:
+            selected = pick_frame_per_cluster(labels, random_state=self.random_state)
+        if k_per_cluster > 1:
+            selected = spread_within_clusters(self.components, labels, seeds=selected, k_per_cluster=k_per_cluster)
+        return selected
+
+
+class FrameSimilarityIndex:
+    """
+    Brute-force nearest-neighbour search over per-frame feature vectors (e.g. the PCA components from frame selection), in float32.
+    Squared distances are computed for all frames at once as |a|^2 - 2 a.b + |b|^2, with the |b|^2 terms computed once up front.
+
+    Example
+    -------
+    >>> index = FrameSimilarityIndex(features=np.array([[0., 0.], [1., 0.], [5., 5.], [0.5, 0.]]), frame_indices=[0, 10, 20, 30])
+    >>> index.query(frame_index=0, k=2)
+    [30, 10]
+    >>> index.query(frame_index=0, k=2, exclude=[30])
+    [10, 20]
+    """
+
+    def __init__(self, features: np.ndarray, frame_indices: Sequence[int]) -> None:
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        self.frame_indices = np.asarray(frame_indices)
+        self.squared_norms = np.einsum('ij,ij->i', self.features, self.features)
+        self._rows = {int(idx): row for row, idx in enumerate(self.frame_indices)}
+
+    def __len__(self) -> int:
+        return len(self.frame_indices)
+
+    def __contains__(self, frame_index: int) -> bool:
+        return int(frame_index) in self._rows
+
+    def distances_to(self, frame_index: int) -> np.ndarray:
+        """Returns the squared distance from the frame at video index *frame_index* to every indexed frame."""
+        query = self.features[self._rows[int(frame_index)]]
+        return self.squared_norms - 2 * (self.features @ query) + query @ query
+
+    def query(self, frame_index: int, k: int = 5, exclude: Sequence[int] = ()) -> List[int]:
+        """Returns the video indices of the *k* frames most similar to *frame_index*, nearest first, leaving out itself and *exclude*."""
+        distances = self.distances_to(frame_index)
+        excluded_rows = [self._rows[int(idx)] for idx in [frame_index, *exclude] if int(idx) in self._rows]
+        distances[excluded_rows] = np.inf
+        k = min(k, len(distances) - len(set(excluded_rows)))
+        if k <= 0:
+            return []
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return [int(idx) for idx in self.frame_indices[nearest]]
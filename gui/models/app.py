@@ -1,14 +1,17 @@
+from copy import deepcopy
 from pathlib import Path
+from tempfile import gettempdir
 from typing import Any, Iterable, Optional, Union
 
 import numpy as np
 import pandas as pd
-from traitlets import HasTraits, observe, validate, Instance, Tuple, List, Unicode, Dict, Int, All, TraitError
+from traitlets import HasTraits, observe, validate, Instance, Tuple, List, Unicode, Dict, Int, Bool, All, TraitError
 import typing as tp
-from workflows import ExtractFramesResult, Progress, extract_frames, Crop
-from readers import VideoReader
-import cv2
+from workflows import ExtractFramesResult, Progress, StageTiming, extract_frames, extract_frames_from_project, export_frames, export_labeled_frames_hdf5, Crop, FeatureCache, Project
+from readers import VideoReader, LazyVideoArray
+from core.video_processing import FrameSimilarityIndex
 
+from .label_store import LabelStore
 from .utils import PrintableTraits, cycle_next_item, cycle_prev_item
 
 
@@ -17,19 +20,30 @@ from .utils import PrintableTraits, cycle_next_item, cycle_prev_item
 
 class AppState(HasTraits, PrintableTraits):
     video_path = Unicode(allow_none=True)
+    reader_backend = Unicode(default_value=None, allow_none=True)  # the VideoReader backend for every video read, e.g. 'pyav'; None picks one by file type
     reference_frame = Instance(np.ndarray, allow_none=True)
     reference_frame_cropped = Instance(np.ndarray, allow_none=True)
+    browse_video = Bool(default_value=False)
+    video_frames = Instance(LazyVideoArray, allow_none=True)  # the loaded video, for browsing; only open while browse_video is on
     selected_frame_indices = List(Int())
+    selected_frame_videos = List(Unicode())  # the video each selected frame is from
     selected_frames = Instance(np.ndarray, allow_none=True)
     body_parts = List(Unicode(), default_value=[])
     current_body_part = Unicode(allow_none=True)
-    labels = Instance(pd.DataFrame, default_value=pd.DataFrame())
+    label_store = Instance(LabelStore, args=())
+    label_event = Tuple()  # (counter, action, rows) of the last edit to label_store; action is 'added', 'moved', 'removed' or 'replaced'
     x0 = Int(default_value=0)
     x1 = Int(default_value=50)
     x_max = Int(default_value=100)
     y0 = Int(default_value=0)
     y1 = Int(default_value=60)
     y_max = Int(default_value=80)
+    feature_cache = Instance(FeatureCache, allow_none=True)  # no caching unless one is given; main.py gives the GUI the on-disk cache
+    spill_directory = Unicode(default_value=gettempdir(), allow_none=True)  # where extractions keep their downsampled frames (see StreamingFrameSelector); None keeps them in memory
+    similarity_index = Instance(FrameSimilarityIndex, allow_none=True)
+    project = Instance(Project, args=())
+    stage_timings = List(Instance(StageTiming))  # the time spent in each stage of the last extract_frames() run
+    _keep_crop = False  # set while update_reference_frame() replaces the reference frame
 
     @validate('x0')
     def _check_x0(self, proposal):
@@ -61,14 +75,41 @@ class AppState(HasTraits, PrintableTraits):
 
         
     #### Commands ####
-    def load_video(self, filename: str):
-        video = VideoReader(filename=filename)
-        average_frame = video.read_average_frame(nframes_to_use=10)
+    def load_video(self, filename: str, nframes_to_use: int = 10, method: str = 'mean'):
+        video = VideoReader(filename=filename, backend=self.reader_backend)
+        reference_frame = video.read_reference_frame(nframes_to_use=nframes_to_use, method=method)
         self.video_path = str(filename)
-        self.reference_frame = average_frame
+        self.reference_frame = reference_frame
+
+    def update_reference_frame(self, nframes_to_use: int = 10, method: str = 'mean') -> None:
+        """Recomputes the reference frame of the loaded video, e.g. with more frames or another method ('mean', 'median' or 'max')."""
+        if self.video_path is None:
+            return
+        video = VideoReader(filename=self.video_path, backend=self.reader_backend)
+        reference_frame = video.read_reference_frame(nframes_to_use=nframes_to_use, method=method)
+        self._keep_crop = True  # same video, just a recomputed reference frame: keep the user's crop
+        try:
+            self.reference_frame = reference_frame
+        finally:
+            self._keep_crop = False
+
+    @observe('video_path')
+    def clear_similarity_index(self, change):
+        """The similarity index holds frames of the video it was built from, so similar frames can't be added from another one."""
+        self.similarity_index = None
+
+    @observe('video_path', 'browse_video', 'reader_backend')
+    def open_video_frames_for_browsing(self, change):
+        """Opens the video for browsing while browse_video is on, closing the one it replaces (and its prefetching thread)."""
+        old_frames = self.video_frames
+        self.video_frames = LazyVideoArray(filename=self.video_path, backend=self.reader_backend) if self.browse_video and self.video_path else None
+        if old_frames is not None:
+            old_frames.close()
 
     @observe('reference_frame')
     def default_crop_with_new_reference_frame(self, change):
+        if self._keep_crop:
+            return
         shape = self.reference_frame.shape
         with self.hold_trait_notifications():
             self.x0 = 0
@@ -78,32 +119,146 @@ class AppState(HasTraits, PrintableTraits):
             self.y1 = shape[0]
             self.y_max = shape[0]
         
+    @property
+    def labels(self) -> pd.DataFrame:
+        """The labels as a table (FrameIndex, i, j, label) of integer pixel coordinates, built on demand from the label store."""
+        return self.label_store.to_dataframe()
+
+    def _notify_labels_changed(self, action: str, rows: tp.Sequence[int] = ()) -> None:
+        counter = self.label_event[0] + 1 if self.label_event else 1
+        self.label_event = (counter, action, tuple(int(row) for row in rows))
+
     def update_labels(self, frame_indices: tp.List[int], points: tp.List[tp.Tuple[int, int]], labels: tp.List[str]):
-        df = pd.DataFrame().assign(
-            FrameIndex=np.array(frame_indices, dtype=int),
-            i=np.array(points[:, 0], dtype=int),
-            j=np.array(points[:, 1], dtype=int),
-            label=np.array(labels, dtype=str),
-        )
-        self.labels = df
+        """Replaces all labels."""
+        self.label_store.clear()
+        self.label_store.append(frame_indices=np.asarray(frame_indices, dtype=int), points=np.asarray(points)[:, :2], labels=list(labels))
+        self._notify_labels_changed('replaced')
 
+    def add_labels(self, frame_indices: tp.List[int], points: tp.List[tp.Tuple[float, float]], labels: tp.List[str]) -> None:
+        rows = self.label_store.append(frame_indices=np.asarray(frame_indices, dtype=int), points=points, labels=list(labels))
+        self._notify_labels_changed('added', rows)
 
-    def extract_frames(self, n_clusters: int, every_n: int, downsample_level: int) -> Iterable[Progress]:
-        workflow = extract_frames(
+    def move_labels(self, rows: tp.List[int], points: tp.List[tp.Tuple[float, float]]) -> None:
+        self.label_store.move(rows=rows, points=points)
+        self._notify_labels_changed('moved', rows)
+
+    def remove_labels(self, rows: tp.List[int]) -> None:
+        self.label_store.delete(rows=rows)
+        self._notify_labels_changed('removed', rows)
+
+
+    def make_extract_frames_workflow(self, n_clusters: int, every_n: int, downsample_level: int, n_workers: int = 1, grayscale: bool = False, selection: str = 'centroid', frames_per_cluster: int = 1, keep_fraction: float = 1.0, budget: Optional[int] = None, features: str = 'pca', kmeans_time_budget: Optional[float] = None) -> Iterable[Union[Progress, StageTiming, ExtractFramesResult]]:
+        """
+        Returns the extract_frames workflow for the current video and crop, without running it.
+        It doesn't touch the model, so it can be run on another thread; pass its result to apply_extract_frames_result().
+        """
+        return extract_frames(
             video_path=self.video_path,
             crop=Crop(x0=self.x0, x1=self.x1, y0=self.y0, y1=self.y1),
             every_n=every_n,
             n_clusters=n_clusters,
-            downsample_level=downsample_level
+            downsample_level=downsample_level,
+            n_workers=n_workers,
+            cache=self.feature_cache,
+            grayscale=grayscale,
+            selection=selection,
+            frames_per_cluster=frames_per_cluster,
+            keep_fraction=keep_fraction,
+            reference_frame=self.reference_frame,
+            budget=budget,
+            features=features,
+            kmeans_time_budget=kmeans_time_budget,
+            spill_directory=self.spill_directory,
+            backend=self.reader_backend,
+        )
+
+    def make_extract_project_frames_workflow(self, n_clusters: int, every_n: int, downsample_level: int, n_workers: int = 1, grayscale: bool = False, selection: str = 'centroid', frames_per_cluster: int = 1, features: str = 'pca', kmeans_time_budget: Optional[float] = None) -> Iterable[Union[Progress, StageTiming, ExtractFramesResult]]:
+        """Like make_extract_frames_workflow, but selects frames jointly across all the videos in the project, each with its own crop."""
+        return extract_frames_from_project(
+            project=self.project,
+            n_clusters=n_clusters,
+            every_n=every_n,
+            downsample_level=downsample_level,
+            n_workers=n_workers,
+            cache=self.feature_cache,
+            grayscale=grayscale,
+            selection=selection,
+            frames_per_cluster=frames_per_cluster,
+            features=features,
+            kmeans_time_budget=kmeans_time_budget,
+            spill_directory=self.spill_directory,
+            backend=self.reader_backend,
         )
+
+    def add_video_to_project(self) -> None:
+        """Adds the current video with its current crop to the project (or updates its crop)."""
+        if self.video_path is None:
+            return
+        project = deepcopy(self.project)  # a new object, so observers are notified
+        project.add_video(self.video_path, crop=Crop(x0=self.x0, x1=self.x1, y0=self.y0, y1=self.y1))
+        self.project = project
+
+    def apply_extract_frames_result(self, result: ExtractFramesResult) -> None:
+        with self.hold_trait_notifications():
+            self.selected_frame_indices = [int(ind) for ind in result.extracted_frame_indices]
+            self.selected_frame_videos = result.extracted_video_paths or [self.video_path] * len(result.extracted_frame_indices)
+        self.selected_frames = result.extracted_frames
+        has_features = result.sampled_features is not None
+        self.similarity_index = FrameSimilarityIndex(features=result.sampled_features, frame_indices=result.sampled_frame_indices) if has_features else None
+
+    def extract_frames(self, n_clusters: int, every_n: int, downsample_level: int, n_workers: int = 1, grayscale: bool = False, selection: str = 'centroid', frames_per_cluster: int = 1, keep_fraction: float = 1.0, budget: Optional[int] = None, features: str = 'pca', kmeans_time_budget: Optional[float] = None) -> Iterable[Progress]:
+        """Runs make_extract_frames_workflow(), yielding its progress and applying its result; the stage timings end up in stage_timings."""
+        workflow = self.make_extract_frames_workflow(n_clusters=n_clusters, every_n=every_n, downsample_level=downsample_level, n_workers=n_workers, grayscale=grayscale, selection=selection, frames_per_cluster=frames_per_cluster, keep_fraction=keep_fraction, budget=budget, features=features, kmeans_time_budget=kmeans_time_budget)
+        stage_timings = []
         for step in workflow:
             if isinstance(step, Progress):
                 yield step
+            elif isinstance(step, StageTiming):
+                stage_timings.append(step)
             else:
                 assert isinstance(step, ExtractFramesResult)
-                self.selected_frame_indices = [int(ind) for ind in step.extracted_frame_indices]
-                self.selected_frames = step.extracted_frames
+                self.apply_extract_frames_result(step)
+        self.stage_timings = stage_timings
+
+
+    def find_similar_frames(self, frame_position: int, k: int = 5) -> tp.List[int]:
+        """
+        Returns the video indices of the *k* sampled frames most like the selected frame at *frame_position*, leaving out frames that are already selected.
+        Needs the features from the last frame extraction, so returns an empty list if there hasn't been one (or there's no such selected frame).
+        """
+        if self.similarity_index is None or not 0 <= frame_position < len(self.selected_frame_indices):
+            return []
+        frame_index = self.selected_frame_indices[frame_position]
+        if frame_index not in self.similarity_index:
+            return []
+        return self.similarity_index.query(frame_index=frame_index, k=k, exclude=self.selected_frame_indices)
+
+    def add_selected_frames(self, frame_indices: tp.List[int]) -> None:
+        """
+        Reads the given video frames and appends them to the selected frames.
+        They go at the end, rather than in video order, so the existing labels (which refer to positions in the selected frames) stay put.
+        """
+        already_selected = set(self.selected_frame_indices)
+        frame_indices = [int(idx) for idx in frame_indices if int(idx) not in already_selected]
+        if not frame_indices:
+            return
+        video = VideoReader(filename=self.video_path, backend=self.reader_backend)
+        order = np.argsort(frame_indices)  # read forwards through the video, then put them back in the requested order
+        frames = np.stack(list(video.read_frames_at([frame_indices[i] for i in order])))[np.argsort(order)]
+        with self.hold_trait_notifications():
+            self.selected_frame_indices = self.selected_frame_indices + frame_indices
+            self.selected_frame_videos = self.selected_frame_videos + [self.video_path] * len(frame_indices)
+            self.selected_frames = frames if self.selected_frames is None else np.concatenate([self.selected_frames, frames])
+
+    def add_similar_frames(self, frame_position: int, k: int = 5) -> tp.List[int]:
+        """Finds up to *k* frames like the selected frame at *frame_position* and adds them to the selection, returning their video indices."""
+        frame_indices = self.find_similar_frames(frame_position=frame_position, k=k)
+        self.add_selected_frames(frame_indices)
+        return frame_indices
 
+    def clear_feature_cache(self) -> None:
+        if self.feature_cache is not None:
+            self.feature_cache.invalidate()
 
     def get_cropped_reference_frame(self) -> Optional[np.ndarray]:
         frame = self.reference_frame
@@ -136,11 +291,52 @@ class AppState(HasTraits, PrintableTraits):
         self.current_body_part = cycle_prev_item(items=self.body_parts, item=self.current_body_part)
 
 
-    def export_frames_to_directory(self, directory: Path) -> None:
-        directory.mkdir(parents=True, exist_ok=True)
+    def selected_frames_are_from_other_videos(self) -> bool:
+        """Whether any selected frame isn't from the loaded video (e.g. after selecting across the project), so exports need each frame's own video and size."""
+        return self.selected_frame_videos != [self.video_path] * len(self.selected_frame_indices)
+
+    def get_selected_frame_sizes(self) -> tp.List[tp.Tuple[int, int]]:
+        """The (height, width) of each selected frame's own video; frames selected across videos of different sizes are zero-padded beyond it."""
+        sizes = {}
+        for path in set(self.selected_frame_videos):
+            video = VideoReader(filename=path, backend=self.reader_backend)
+            sizes[path] = (video.frame_height, video.frame_width)
+            video.close()
+        return [sizes[path] for path in self.selected_frame_videos]
+
+    def get_unpadded_selected_frames(self) -> tp.List[np.ndarray]:
+        """The selected frames, each cut back to its own video's size."""
+        return [frame[:height, :width] for (height, width), frame in zip(self.get_selected_frame_sizes(), self.selected_frames)]
 
-        filename_template = Path(self.video_path).stem + "__{frame_idx}.png"
-        for idx, frame in zip(self.selected_frame_indices, self.selected_frames):
-            filename = filename_template.format(frame_idx=idx)
-            full_filename = directory.joinpath(filename)
-            cv2.imwrite(filename=str(full_filename), img=frame)
+    def export_frames(self, directory: Path, codec: str = 'png', quality: Optional[int] = None) -> Iterable[Progress]:
+        """Writes the selected frames to image files in *directory*, named after their videos, on a thread pool, yielding Progress as they're written."""
+        other_videos = self.selected_frames_are_from_other_videos()
+        return export_frames(
+            frames=self.get_unpadded_selected_frames() if other_videos else self.selected_frames, 
+            frame_indices=self.selected_frame_indices, 
+            directory=directory, 
+            name=[Path(path).stem for path in self.selected_frame_videos] if other_videos else Path(self.video_path).stem, 
+            codec=codec, 
+            quality=quality,
+        )
+
+    def export_frames_to_directory(self, directory: Path, codec: str = 'png', quality: Optional[int] = None) -> None:
+        for _ in self.export_frames(directory=directory, codec=codec, quality=quality):
+            pass
+
+    def export_labeled_frames(self, filename: Path, compression: Optional[str] = 'lzf') -> Iterable[Progress]:
+        """
+        Writes the selected frames and the labels to a single HDF5 file, yielding Progress as frames are written.
+        Frames that aren't all from the loaded video are stored with each one's video and (unpadded) size.
+        """
+        other_videos = self.selected_frames_are_from_other_videos()
+        return export_labeled_frames_hdf5(
+            filename=filename,
+            frames=self.selected_frames,
+            frame_indices=self.selected_frame_indices,
+            labels=self.labels,
+            video_path=self.video_path if not other_videos else None,
+            frame_video_paths=self.selected_frame_videos if other_videos else None,
+            frame_sizes=self.get_selected_frame_sizes() if other_videos else None,
+            compression=compression,
+        )
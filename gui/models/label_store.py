@@ -0,0 +1,104 @@
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class LabelStore:
+    """
+    A table of point labels (FrameIndex, i, j, label) kept in preallocated NumPy columns that grow by doubling,
+    with each label's body part stored as a code into a list of names. 
+    Appending, moving and relabelling only touch the affected rows, so they cost the same however many labels there are;
+    deleting also copies every row after the first deleted one down over the gap, so it costs up to one pass over the table.
+    Points are kept as floats, as napari gives them; to_dataframe() truncates them to integer pixel coordinates.
+
+    Example
+    -------
+    >>> store = LabelStore()
+    >>> store.append(frame_indices=[0, 0], points=[[1., 2.], [3., 4.]], labels=['head', 'tail'])
+    array([0, 1])
+    >>> store.delete([0])
+    >>> store.to_dataframe()
+       FrameIndex  i  j label
+    0           0  3  4  tail
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.body_parts: List[str] = []
+        self._codes = {}
+        self._frame = np.empty(capacity, dtype=np.int32)
+        self._points = np.empty((capacity, 2), dtype=np.float64)
+        self._body_part = np.empty(capacity, dtype=np.int16)
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def frame_indices(self) -> np.ndarray:
+        return self._frame[:self._n]
+
+    @property
+    def points(self) -> np.ndarray:
+        return self._points[:self._n]
+
+    @property
+    def body_part_codes(self) -> np.ndarray:
+        return self._body_part[:self._n]
+
+    def encode(self, labels: Sequence[str]) -> np.ndarray:
+        """Returns the code of each body part name, adding names not seen before."""
+        for label in labels:
+            if label not in self._codes:
+                self._codes[label] = len(self.body_parts)
+                self.body_parts.append(label)
+        return np.array([self._codes[label] for label in labels], dtype=np.int16)
+
+    def _reserve(self, n: int) -> None:
+        capacity = len(self._frame)
+        if n <= capacity:
+            return
+        while capacity < n:
+            capacity *= 2
+        for name in ['_frame', '_points', '_body_part']:
+            old = getattr(self, name)
+            new = np.empty((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def append(self, frame_indices: Sequence[int], points: Sequence[Sequence[float]], labels: Sequence[str]) -> np.ndarray:
+        """Adds labels at the end of the table, returning their row numbers."""
+        n_new = len(frame_indices)
+        self._reserve(self._n + n_new)
+        rows = np.arange(self._n, self._n + n_new)
+        self._frame[rows] = frame_indices
+        self._points[rows] = points
+        self._body_part[rows] = self.encode(labels)
+        self._n += n_new
+        return rows
+
+    def move(self, rows: Sequence[int], points: Sequence[Sequence[float]]) -> None:
+        self._points[np.asarray(rows, dtype=int)] = points
+
+    def relabel(self, rows: Sequence[int], labels: Sequence[str]) -> None:
+        self._body_part[np.asarray(rows, dtype=int)] = self.encode(labels)
+
+    def delete(self, rows: Sequence[int]) -> None:
+        keep = np.ones(self._n, dtype=bool)
+        keep[np.asarray(rows, dtype=int)] = False
+        n_kept = int(keep.sum())
+        first_deleted = int(np.argmin(keep)) if n_kept < self._n else self._n
+        for column in [self._frame, self._points, self._body_part]:
+            column[first_deleted:n_kept] = column[first_deleted:self._n][keep[first_deleted:]]  # rows before the first deletion don't move
+        self._n = n_kept
+
+    def clear(self) -> None:
+        self._n = 0
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame().assign(
+            FrameIndex=self.frame_indices.astype(int),
+            i=self.points[:, 0].astype(int),
+            j=self.points[:, 1].astype(int),
+            label=np.array(self.body_parts, dtype=object)[self.body_part_codes] if self._n else np.array([], dtype=str),
+        )
@@ -1,3 +1,4 @@
 from .frame_extractor import MultiFrameExtractionControlsViewNapari
+from .label_exporter import ExporterViewNapari
 from .video_labeler import LabelingViewNapari
 from .video_loader import ViewNapari
\ No newline at end of file
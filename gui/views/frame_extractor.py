@@ -1,29 +1,70 @@
+import os
 import subprocess
 from pathlib import Path
 import sys
-from typing import Optional
+from typing import Iterable, Optional, Union
 import numpy as np
 import napari
 from napari import layers
+from napari.qt.threading import GeneratorWorker, thread_worker
 from magicgui import widgets
 
+from core.video_processing import FEATURE_METHODS, SELECTION_METHODS
 from gui.models import AppState
 from gui.views.base import BaseNapariView
 from gui.views.utils import match_items_atttributes_to_kwargs
 
 
+QUALITY_LABELS = {
+    'png': 'PNG Compression (0-9, Always Lossless)',
+    'jpeg': 'JPEG Quality (0-100)',
+    'webp': 'WebP Quality (1-100, 101 = Lossless)',
+}
+from workflows import CODECS, CODEC_QUALITY_RANGES, ExtractFramesResult, Progress, StageTiming
+
+
+@thread_worker
+def run_workflow(workflow: Iterable[Union[Progress, StageTiming, ExtractFramesResult]]):
+    """Runs a workflow on a background thread, passing each of its steps back to the main thread through the worker's 'yielded' signal."""
+    yield from workflow
+
+
 class MultiFrameExtractionControlsViewNapari(BaseNapariView):
     def __init__(self, model: AppState) -> None:
+        self.model = model
+        self.worker: Optional[GeneratorWorker] = None
 
         # Controls
         self.every_n_widget = widgets.SpinBox(name='Every N Frames', min=1, max=1000, value=30)
+        self.budget_widget = widgets.SpinBox(name='Adaptive Frame Budget (0 = Every N)', min=0, max=100000, step=100, value=0)
         self.n_clusters_widget = widgets.SpinBox(name='Make N Clusters', min=2, max=500, value=20)
         self.downsample_widget = widgets.SpinBox(name='Downsample Level (For Clustering)', min=1, max=50, value=3)
+        self.grayscale_widget = widgets.CheckBox(label='Grayscale (For Clustering)', value=False)  # the same default as extract_frames, so headless runs select the same frames
+        self.features_widget = widgets.ComboBox(label='Features (For Clustering)', choices=list(FEATURE_METHODS), value='pca')
+        self.keep_fraction_widget = widgets.FloatSlider(name='Keep Most-Moving Fraction', min=0.05, max=1., step=0.05, value=1.)
+        self.selection_widget = widgets.ComboBox(label='Frame From Each Cluster', choices=list(SELECTION_METHODS), value='centroid')
+        self.frames_per_cluster_widget = widgets.SpinBox(name='Frames Per Cluster', min=1, max=50, value=1)
+        self.n_workers_widget = widgets.SpinBox(name='Decoding Processes', min=1, max=os.cpu_count(), value=1)  # a process pool only pays off for long videos, so it's opt-in
+        self.kmeans_time_budget_widget = widgets.SpinBox(name='Clustering Time Limit (s, 0 = None)', min=0, max=3600, step=10, value=0)
         
+        self.across_project_widget = widgets.CheckBox(label='Select Across All Project Videos', value=False)
         self.run_button = widgets.PushButton(text="Extract Frames")
+        self.cancel_button = widgets.PushButton(text="Cancel")
+        self.cancel_button.visible = False  # Nothing to cancel until a job is running.
+        self.clear_cache_button = widgets.PushButton(text="Clear Cached Frames")
         
         self.progress_bar = widgets.ProgressBar(name='Progress')
+
+        self.n_similar_widget = widgets.SpinBox(name='Similar Frames to Add', min=1, max=100, value=5)
+        self.n_similar_widget.visible = False
+        self.add_similar_button = widgets.PushButton(text="Add Frames Like This One")
+        self.add_similar_button.visible = False  # Needs the features from a frame extraction.
         
+        self.export_codec_widget = widgets.ComboBox(label='Export Format', choices=list(CODECS), value='png')
+        self.export_codec_widget.visible = False
+        self.export_codec_widget.changed.connect(self.on_export_codec_change)
+        self.export_quality_widget = widgets.SpinBox(label=QUALITY_LABELS['png'], min=0, max=9, value=CODECS['png'][2])
+        self.export_quality_widget.visible = False
         self.export_frames_fileselector = widgets.FileEdit(label='Export Frames to Directory', mode='d')
         self.export_frames_fileselector.changed.connect(self.on_export_frames_button_change)
         self.export_frames_fileselector.visible = False  # Can't export frames if none are loaded.
@@ -35,10 +76,25 @@ class MultiFrameExtractionControlsViewNapari(BaseNapariView):
             layout='vertical',
             widgets=[
                 self.every_n_widget,
+                self.budget_widget,
                 self.n_clusters_widget,
                 self.downsample_widget,
+                self.grayscale_widget,
+                self.features_widget,
+                self.keep_fraction_widget,
+                self.selection_widget,
+                self.frames_per_cluster_widget,
+                self.n_workers_widget,
+                self.kmeans_time_budget_widget,
+                self.across_project_widget,
                 self.run_button,
+                self.cancel_button,
+                self.clear_cache_button,
                 self.progress_bar,
+                self.n_similar_widget,
+                self.add_similar_button,
+                self.export_codec_widget,
+                self.export_quality_widget,
                 self.export_frames_fileselector,
             ],
             labels=True,
@@ -51,20 +107,88 @@ class MultiFrameExtractionControlsViewNapari(BaseNapariView):
     def register_appmodel(self, model: AppState) -> None:
         model.observe(
             match_items_atttributes_to_kwargs(self.update, 'owner', frames='selected_frames'),
-            names=['selected_frames', 'x0', 'x1', 'x_max', 'y0', 'y1', 'y_max'],
+            names=['selected_frames'],  # the extracted frames are full frames, so the crop doesn't change what's shown
         )
     
         def on_run_button_click() -> None:
-            workflow = model.extract_frames(
-                n_clusters=self.n_clusters_widget.value, 
-                every_n=self.every_n_widget.value,
-                downsample_level=self.downsample_widget.value,
-            )
-            for step in workflow:
-                self.progress_bar.max = step.max
-                self.progress_bar.value = step.value
-                self.progress_bar.label = step.description
+            if self.across_project_widget.value:
+                workflow = model.make_extract_project_frames_workflow(
+                    n_clusters=self.n_clusters_widget.value,
+                    every_n=self.every_n_widget.value,
+                    downsample_level=self.downsample_widget.value,
+                    n_workers=self.n_workers_widget.value,
+                    grayscale=self.grayscale_widget.value,
+                    selection=self.selection_widget.value,
+                    frames_per_cluster=self.frames_per_cluster_widget.value,
+                    features=self.features_widget.value,
+                    kmeans_time_budget=self.kmeans_time_budget_widget.value or None,
+                )
+            else:
+                workflow = model.make_extract_frames_workflow(
+                    n_clusters=self.n_clusters_widget.value, 
+                    every_n=self.every_n_widget.value,
+                    downsample_level=self.downsample_widget.value,
+                    n_workers=self.n_workers_widget.value,
+                    grayscale=self.grayscale_widget.value,
+                    selection=self.selection_widget.value,
+                    frames_per_cluster=self.frames_per_cluster_widget.value,
+                    keep_fraction=self.keep_fraction_widget.value,
+                    budget=self.budget_widget.value or None,
+                    features=self.features_widget.value,
+                    kmeans_time_budget=self.kmeans_time_budget_widget.value or None,
+                )
+            self.worker = run_workflow(workflow)  # decoding and clustering happen off the Qt thread, so the viewer stays responsive
+            self.worker.yielded.connect(self.on_workflow_step)
+            self.worker.finished.connect(self.on_workflow_finished)
+            self.run_button.enabled = False
+            self.cancel_button.visible = True
+            self.worker.start()
         self.run_button.clicked.connect(on_run_button_click)
+        self.cancel_button.clicked.connect(self.on_cancel_button_click)
+        self.clear_cache_button.clicked.connect(model.clear_feature_cache)
+        self.add_similar_button.clicked.connect(self.on_add_similar_button_click)
+        model.observe(self.on_model_similarity_index_change, 'similarity_index')
+        model.observe(self.on_model_browse_video_change, 'browse_video')
+
+    # Background Worker (these callbacks run on the main thread)
+    def on_workflow_step(self, step: Union[Progress, StageTiming, ExtractFramesResult]) -> None:
+        if isinstance(step, Progress):
+            self.progress_bar.max = step.max
+            self.progress_bar.value = step.value
+            self.progress_bar.label = step.description
+        elif isinstance(step, StageTiming):
+            pass  # collected in the run report, if one was asked for
+        else:
+            self.model.apply_extract_frames_result(step)
+
+    def on_workflow_finished(self) -> None:
+        self.worker = None
+        self.run_button.enabled = True
+        self.cancel_button.visible = False
+
+    def on_cancel_button_click(self) -> None:
+        if self.worker is not None:
+            self.worker.quit()  # stops the workflow at its next step
+            self.progress_bar.label = 'Cancelled.'
+
+
+    # Find More Frames Like This One
+    def on_model_similarity_index_change(self, change) -> None:
+        self.n_similar_widget.visible = change['new'] is not None
+        self.add_similar_button.visible = change['new'] is not None
+
+    def on_model_browse_video_change(self, change) -> None:
+        # The Full Video layer shares the viewer's frame slider, which then counts video frames, not selected frames.
+        self.add_similar_button.enabled = not change['new']
+        self.add_similar_button.tooltip = 'Turn off Browse Full Video to pick a selected frame.' if change['new'] else ''
+
+    def on_add_similar_button_click(self) -> None:
+        frame_position = int(round(self.layer.world_to_data(self.viewer.dims.point)[0]))  # the selected frame this layer is showing
+        if not 0 <= frame_position < len(self.model.selected_frame_indices):
+            self.progress_bar.label = 'Show one of the selected frames first.'
+            return
+        added = self.model.add_similar_frames(frame_position=frame_position, k=self.n_similar_widget.value)
+        self.progress_bar.label = f'Added frames {added}.' if added else 'No more similar frames.'
 
 
     def register_napari(self, viewer: napari.Viewer) -> None:
@@ -79,13 +203,27 @@ class MultiFrameExtractionControlsViewNapari(BaseNapariView):
 
         if frames is None:
             self.export_frames_fileselector.visible = False
+            self.export_codec_widget.visible = False
+            self.export_quality_widget.visible = False
             return
 
         self.export_frames_fileselector.visible = True
+        self.export_codec_widget.visible = True
+        self.export_quality_widget.visible = True
         self.layer.data = frames
 
 
+    def on_export_codec_change(self, codec: str) -> None:
+        # Each codec has its own setting: PNG's compression level, or JPEG's and WebP's quality. Start from the codec's default.
+        low, high = CODEC_QUALITY_RANGES[codec]
+        self.export_quality_widget.min, self.export_quality_widget.max = low, high
+        self.export_quality_widget.value = CODECS[codec][2]
+        self.export_quality_widget.label = QUALITY_LABELS[codec]
+
     def on_export_frames_button_change(self, directory: Path):
-        self.model.export_frames_to_directory(directory=directory)
+        workflow = self.model.export_frames(directory=directory, codec=self.export_codec_widget.value, quality=self.export_quality_widget.value)
+        worker = run_workflow(workflow)  # encoding happens off the Qt thread
+        worker.yielded.connect(self.on_workflow_step)
         if 'win' in sys.platform:
-            subprocess.call(f'explorer {str(directory)}')
\ No newline at end of file
+            worker.finished.connect(lambda: subprocess.call(f'explorer {str(directory)}'))
+        worker.start()
\ No newline at end of file
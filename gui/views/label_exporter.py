@@ -1,12 +1,46 @@
-# from magicgui import widgets
+from pathlib import Path
 
-# from gui.views.base import BaseNapariView
+import napari
+from magicgui import widgets
 
+from gui.models import AppState
+from gui.views.base import BaseNapariView
+from gui.views.frame_extractor import run_workflow
 
-# class ExporterViewNapari(BaseNapariView):
 
-#     def __init__(self, model: AppState) -> None:
-        
-#         widgets.FileEdit(label='Export Labeled Data', mode='w')
+class ExporterViewNapari(BaseNapariView):
+
+    def __init__(self, model: AppState) -> None:
+        self.model = model
         
-        
\ No newline at end of file
+        self.compress_widget = widgets.CheckBox(label='Compress Frames (uncompressed can be memory-mapped)', value=True)
+        self.export_fileselector = widgets.FileEdit(label='Export Labeled Data', mode='w', filter='*.h5')
+        self.export_fileselector.changed.connect(self.on_export_file_change)
+        self.progress_bar = widgets.ProgressBar(name='Export Progress')
+
+        self.widget = widgets.Container(
+            layout='vertical',
+            widgets=[self.compress_widget, self.export_fileselector, self.progress_bar],
+            labels=True,
+        )
+        self.widget.visible = False  # Nothing to export until frames are selected.
+        self.model.observe(self.on_model_selected_frames_change, 'selected_frames')
+
+
+    def register_napari(self, viewer: napari.Viewer) -> None:
+        self.viewer = viewer
+        viewer.window.add_dock_widget(self.widget, name='Export Labeled Data')
+
+    def on_model_selected_frames_change(self, change) -> None:
+        self.widget.visible = change['new'] is not None
+
+    def on_export_file_change(self, filename: Path) -> None:
+        workflow = self.model.export_labeled_frames(filename=Path(filename).with_suffix('.h5'), compression='lzf' if self.compress_widget.value else None)
+        worker = run_workflow(workflow)
+        worker.yielded.connect(self.on_progress)
+        worker.start()
+
+    def on_progress(self, step) -> None:
+        self.progress_bar.max = step.max
+        self.progress_bar.value = step.value
+        self.progress_bar.label = step.description
@@ -4,7 +4,6 @@ import napari
 from napari import layers
 from napari.utils.events import Event
 from magicgui import widgets
-import pandas as pd
 from matplotlib.pyplot import colormaps
 
 from gui.models import AppState
@@ -45,13 +44,14 @@ class LabelingViewNapari(BaseNapariView):
             opacity=0.6,
             properties={'label': []},
             edge_width=0.2,
+            face_color='transparent',
         )
         cmap = colormaps['Set1'].colors
         cmap = append_ones_column(cmap)
         self.edge_cmap = cmap
         self.model.observe(self.on_model_selected_frames_change, 'selected_frames') 
         self.point_layer.events.data.connect(self.on_pointlayer_data_event)
-        self.model.observe(self.on_model_labels_change, 'labels')
+        self.model.observe(self.on_model_labels_change, 'label_event')
         keyboard_shortcuts = {
             'S': self.cycle_next_bodypart,
             'W': self.cycle_previous_bodypart,
@@ -89,40 +89,60 @@ class LabelingViewNapari(BaseNapariView):
     def on_model_bodyparts_change(self, change):
         self.current_bodypart_widget.choices = self.model.body_parts
         self.current_bodypart_widget.value = self.model.current_body_part
+        # New points take the current edge colour as napari adds them, so a click never recolours the existing points.
+        with self.point_layer.block_update_properties():  # only sets the colour for the next point, not for the selected ones
+            self.point_layer.current_edge_color = self.body_part_color(self.model.current_body_part)
+
+    def body_part_color(self, name: Optional[str]) -> np.ndarray:
+        if name not in self.model.body_parts:
+            return self.edge_cmap[0]
+        return self.edge_cmap[self.model.body_parts.index(name) % len(self.edge_cmap)]
 
     # Points Layer View
     def on_pointlayer_data_event(self, event: Event):
+        # Newer napari versions say which points an event is about, so only those rows are sent to the model;
+        # otherwise (or for pre-change 'adding'/'removing' events) fall back to syncing the whole layer.
+        action = str(getattr(event, 'action', '') or '')
+        if action in ('adding', 'removing', 'changing'):
+            return
         
-
-        if not len(self.point_layer.data):
+        if not self.model.body_parts:
+            data = self.point_layer.data
+            if len(data):
+                self.point_layer.data = np.empty(shape=(0, data.shape[1]), dtype=data.dtype)
             return
-        if self.model.body_parts:
-            coords = self.point_layer.data[:, 1:3]
-            frame_indices = self.point_layer.data[:, 0]
+        
+        rows = getattr(event, 'data_indices', None)
+        if action == 'added' and rows is not None:
+            rows = list(rows)
+            data = self.point_layer.data[rows]
+            self.model.add_labels(frame_indices=data[:, 0], points=data[:, 1:3], labels=self.point_layer.features['label'].iloc[rows])
+            self.cycle_next_bodypart()
+        elif action == 'changed' and rows is not None:
+            self.model.move_labels(rows=list(rows), points=self.point_layer.data[list(rows), 1:3])
+        elif action == 'removed' and rows is not None:
+            self.model.remove_labels(rows=list(rows))
+        elif len(self.point_layer.data):
             self.model.update_labels(
-                points=coords, 
-                frame_indices=frame_indices,
+                points=self.point_layer.data[:, 1:3], 
+                frame_indices=self.point_layer.data[:, 0],
                 labels=self.point_layer.properties['label'],
             )
             self.cycle_next_bodypart()
-        else:
-            data = self.point_layer.data
-            self.point_layer.data = np.empty(shape=(0, data.shape[1]), dtype=data.dtype)
 
     def on_model_labels_change(self, change):
         if not self.model.body_parts:
             return
-
-        data = self.model.labels[['FrameIndex', 'i', 'j']].to_numpy()
-        if not np.allclose(self.point_layer.data, data):
-            self.point_layer.data = data
-        self.point_layer.properties['label'] = self.model.labels['label']
-
-        edge_color_map = {name: self.edge_cmap[idx] for idx, name in enumerate(self.model.body_parts)}
-        edge_colors = np.array([edge_color_map[name] for name in self.model.labels['label']])
-        self.point_layer.edge_color = edge_colors
-        self.point_layer.face_color[:, -1] = 0  # make face transparent
-        print(self.point_layer.edge_color)
+        
+        _, action, rows = change['new']
+        store = self.model.label_store
+        if action == 'replaced' and len(self.point_layer.data) != len(store):
+            self.point_layer.data = np.column_stack([store.frame_indices, store.points])
+        if action == 'replaced' and len(self.point_layer.data) == len(store):
+            # Edge colours are looked up for all points at once from the store's body part codes; there's no per-point Python loop.
+            # Added points already have theirs (see on_model_bodyparts_change), so this is only needed when all the labels are replaced.
+            colors_by_code = np.array([self.body_part_color(name) for name in store.body_parts])
+            self.point_layer.edge_color = colors_by_code[store.body_part_codes]
 
 
     def on_model_selected_frames_change(self, change):
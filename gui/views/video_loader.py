@@ -7,12 +7,26 @@ from gui.models import AppState
 from gui.views.base import BaseNapariView
 
 
+def crop_rectangle(x0: int, x1: int, y0: int, y1: int) -> np.ndarray:
+    """
+    The corners of a crop as a napari rectangle, in (row, column) order.
+
+    Example
+    -------
+    >>> crop_rectangle(x0=10, x1=50, y0=5, y1=40).tolist()
+    [[5, 10], [5, 50], [40, 50], [40, 10]]
+    """
+    return np.array([[y0, x0], [y0, x1], [y1, x1], [y1, x0]])
+
+
 class ViewNapari(BaseNapariView):
 
     def __init__(self, model: AppState) -> None:
         self.model = model
 
         # Controls
+        self._backend = widgets.ComboBox(label='Video Reader', choices=('auto', 'opencv', 'pyav'), value='auto')
+        self._backend.changed.connect(self.on_backend_change)
         self._videp_picker = widgets.FileEdit(label='Select Video:', mode='r')
         self._videp_picker.changed.connect(self.on_videopath_change)
 
@@ -37,16 +51,40 @@ class ViewNapari(BaseNapariView):
         self.model.observe(self.on_model_crop_y1_change, 'y1')
         self._crop_y1.visible = False
 
+        self._reference_method = widgets.ComboBox(label='Reference Image', choices=('mean', 'median', 'max'), value='mean')
+        self._reference_method.changed.connect(self.on_reference_settings_change)
+        self._reference_nframes = widgets.SpinBox(label='Reference Frames Used', min=1, max=1000, value=10)
+        self._reference_nframes.changed.connect(self.on_reference_settings_change)
+
+        self._show_video = widgets.CheckBox(label='Browse Full Video', value=False)
+        self._show_video.changed.connect(self.on_show_video_change)
+        self._show_video.visible = False
+
+        self._add_to_project = widgets.PushButton(text='Add Video and Crop to Project')
+        self._add_to_project.clicked.connect(self.model.add_video_to_project)
+        self._add_to_project.visible = False
+        self._project_summary = widgets.Label(value='')
+        self.model.observe(self.on_model_project_change, 'project')
+
         self.widget = widgets.Container(
             layout='vertical',
-            widgets=[self._videp_picker, self._crop_x0, self._crop_x1, self._crop_y0, self._crop_y1],
+            widgets=[self._backend, self._videp_picker, self._reference_method, self._reference_nframes, self._crop_x0, self._crop_x1, self._crop_y0, self._crop_y1, self._show_video, self._add_to_project, self._project_summary],
             labels=True,
         )
 
-        # Image Viewer
+        # Image Viewer: the whole reference frame, with the crop drawn over it. Moving a crop slider only moves the rectangle,
+        # so it costs the same however big the frame is; the image itself is only re-sent when the reference frame changes.
         self.layer = layers.Image(data=np.zeros(shape=(3, 3, 3), dtype=np.uint8), name='Reference Image')
-        self.model.observe(self.on_model_cropped_refframe_change, ['reference_frame'])
-        self.model.observe(self.on_model_cropped_refframe_change)
+        self.crop_layer = layers.Shapes(
+            data=[crop_rectangle(x0=0, x1=3, y0=0, y1=3)], shape_type='rectangle', name='Crop',
+            edge_color='yellow', edge_width=2, face_color='transparent',
+        )
+        self.model.observe(self.on_model_refframe_change, 'reference_frame')
+        self.model.observe(self.on_model_crop_change, ['x0', 'x1', 'y0', 'y1'])
+
+        # Full Video Viewer (decoded lazily, chunk by chunk, as the user scrubs)
+        self.video_layer = layers.Image(data=np.zeros(shape=(1, 3, 3, 3), dtype=np.uint8), name='Full Video', rgb=True)
+        self.model.observe(self.on_model_video_frames_change, 'video_frames')
 
 
     def register_napari(self, viewer: napari.Viewer) -> None:
@@ -56,12 +94,25 @@ class ViewNapari(BaseNapariView):
     def show(self, run: bool = False):
         self.widget.show(run=run)
 
+    def on_model_project_change(self, change):
+        self._project_summary.value = f"{len(change['new'])} videos in project"
+
     def on_videopath_change(self):
-        self.model.load_video(filename=self._videp_picker.value)
+        self.model.load_video(filename=self._videp_picker.value, nframes_to_use=self._reference_nframes.value, method=self._reference_method.value)
         self._crop_x0.visible = True
         self._crop_x1.visible = True
         self._crop_y0.visible = True
         self._crop_y1.visible = True
+        self._show_video.visible = True
+        self._add_to_project.visible = True
+
+
+    def on_backend_change(self):
+        self.model.reader_backend = None if self._backend.value == 'auto' else self._backend.value  # 'pyav' seeks frame-accurately
+        self.on_reference_settings_change()  # re-reads the reference frame with the new reader, keeping the crop
+
+    def on_reference_settings_change(self):
+        self.model.update_reference_frame(nframes_to_use=self._reference_nframes.value, method=self._reference_method.value)
 
 
     ###### Callbacks #######
@@ -108,12 +159,31 @@ class ViewNapari(BaseNapariView):
         self._crop_y1.value = self.model.y1
 
     # Image Viewer    
-    def on_model_cropped_refframe_change(self, change) -> None:
+    def on_model_refframe_change(self, change) -> None:
+        if change['new'] is None:
+            return
         if self.layer not in self.viewer.layers:
             self.viewer.add_layer(self.layer)
-        frame = self.model.get_cropped_reference_frame()
-        if frame is not None:
-            self.layer.data = frame
-            self.viewer.reset_view()
-
-    
\ No newline at end of file
+        if self.crop_layer not in self.viewer.layers:
+            self.viewer.add_layer(self.crop_layer)
+        self.layer.data = change['new']
+        self.on_model_crop_change(change=None)
+        self.viewer.reset_view()
+
+    def on_model_crop_change(self, change) -> None:
+        self.crop_layer.data = [crop_rectangle(x0=self.model.x0, x1=self.model.x1, y0=self.model.y0, y1=self.model.y1)]
+
+    # Full Video Viewer
+    def on_show_video_change(self) -> None:
+        self.model.browse_video = self._show_video.value  # the model only opens the video for browsing while this is on
+
+    def on_model_video_frames_change(self, change) -> None:
+        # The layer is only added on request, since its frame axis takes over the viewer's slider.
+        if change['new'] is not None:
+            self.video_layer.data = change['new']
+            if self.video_layer not in self.viewer.layers:
+                self.viewer.add_layer(self.video_layer)
+        else:
+            if self.video_layer in self.viewer.layers:
+                self.viewer.layers.remove(self.video_layer)
+            self.video_layer.data = np.zeros(shape=(1, 3, 3, 3), dtype=np.uint8)  # lets go of the closed video
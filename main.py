@@ -2,11 +2,12 @@ from argparse import ArgumentParser
 import napari
 from yaml import parse
 from gui.models import AppState
-from gui.views import ViewNapari, MultiFrameExtractionControlsViewNapari, LabelingViewNapari
+from workflows import FeatureCache
+from gui.views import ViewNapari, MultiFrameExtractionControlsViewNapari, LabelingViewNapari, ExporterViewNapari
 
 
 def main(debug=False):
-    app = AppState()
+    app = AppState(feature_cache=FeatureCache())
     viewer = napari.Viewer()
 
     loader_view = ViewNapari(model=app)
@@ -19,6 +20,9 @@ def main(debug=False):
     labeler_view = LabelingViewNapari(model=app)
     labeler_view.register_napari(viewer=viewer)
 
+    exporter_view = ExporterViewNapari(model=app)
+    exporter_view.register_napari(viewer=viewer)
+
     if debug:
         app.load_video(filename=r"C:\Users\nickdg\Projects\WaspTracker\data\raw\jwasp0.avi")
         list(app.extract_frames(n_clusters=10, every_n=40, downsample_level=10))
@@ -1 +1,5 @@
-from .video_reader import VideoReader
\ No newline at end of file
+from .video_reader import VideoReader, OpenCVVideoReader, BACKENDS, choose_backend
+from .pyav_reader import PyAVVideoReader
+from .image_stack import ImageFolderReader, ArrayStackReader
+from .lazy_video import LazyVideoArray
+from .labeled_frames import LabeledFramesReader
@@ -0,0 +1,145 @@
+from abc import abstractmethod
+from pathlib import Path
+import re
+from typing import Iterable, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+from .video_reader import MAX_GRAB, VideoReader
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def to_rgb8(frame: np.ndarray, bgr: bool = False) -> np.ndarray:
+    """
+    Converts a grayscale, RGB(A) or BGR(A) image of any bit depth into a (height, width, 3) uint8 RGB frame,
+    scaling 16-bit images down from their full range.
+
+    Example
+    -------
+    >>> to_rgb8(np.array([[0, 65535]], dtype=np.uint16))
+    array([[[  0,   0,   0],
+            [255, 255, 255]]], dtype=uint8)
+    """
+    if frame.dtype == np.uint16:
+        frame = (frame >> 8).astype(np.uint8)
+    elif frame.dtype != np.uint8:
+        frame = np.clip(frame, 0, 255).astype(np.uint8)
+    if frame.ndim == 2:
+        frame = frame[..., np.newaxis]
+    if frame.shape[2] == 1:
+        return np.repeat(frame, 3, axis=2)
+    frame = frame[..., :3]
+    return np.ascontiguousarray(frame[..., ::-1]) if bgr else frame
+
+
+def natural_sort_key(path: Path) -> List:
+    """Sorts 'frame_2.png' before 'frame_10.png'."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', path.name)]
+
+
+class RandomAccessReader(VideoReader):
+    """Base for backends that can read any frame directly: sequential reading just walks a position, and read_frames_at indexes straight in."""
+
+    _position = 0
+
+    @abstractmethod
+    def read_frame_at(self, frame_idx: int) -> np.ndarray: ...
+
+    def seek_to(self, frame_idx: int) -> None:
+        self._position = frame_idx
+
+    def grab_frame(self) -> None:
+        if self._position >= len(self):
+            raise IOError("No Frame")
+        self._position += 1
+
+    def read_frame(self) -> np.ndarray:
+        if self._position >= len(self):
+            raise IOError("No Frame")
+        frame = self.read_frame_at(self._position)
+        self._position += 1
+        return frame
+
+    def read_frames_at(self, indices: Iterable[int], max_grab: int = MAX_GRAB) -> Iterator[np.ndarray]:
+        for idx in indices:
+            yield self.read_frame_at(idx)
+
+
+class ImageFolderReader(RandomAccessReader):
+    """Reads a folder of image files (in natural sort order) as the frames of a video."""
+
+    def __init__(self, filename: Path, backend: Optional[str] = None) -> None:
+        self.files = sorted((path for path in Path(filename).iterdir() if path.suffix.lower() in IMAGE_EXTENSIONS), key=natural_sort_key)
+        if not self.files:
+            raise IOError(f"No image files ({', '.join(IMAGE_EXTENSIONS)}) found in '{filename}'.")
+        self._frame_shape = self.read_frame_at(0).shape
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.files)
+
+    @property
+    def frame_height(self) -> int:
+        return self._frame_shape[0]
+
+    @property
+    def frame_width(self) -> int:
+        return self._frame_shape[1]
+
+    def read_frame_at(self, frame_idx: int) -> np.ndarray:
+        frame = cv2.imread(str(self.files[frame_idx]), cv2.IMREAD_UNCHANGED)
+        if frame is None:
+            raise IOError(f"Couldn't read '{self.files[frame_idx]}'.")
+        return to_rgb8(frame, bgr=True)
+
+
+class ArrayStackReader(RandomAccessReader):
+    """
+    Reads a stack of frames saved as a .npy file or a multi-page TIFF, shaped (n_frames, height, width[, channels]).
+    The stack is memory-mapped where possible (always for .npy; for TIFFs stored uncompressed and contiguously),
+    otherwise TIFF pages are read one at a time. TIFFs need the optional 'tifffile' package.
+    """
+
+    def __init__(self, filename: Path, backend: Optional[str] = None) -> None:
+        filename = Path(filename)
+        self.tiff = None
+        if filename.suffix.lower() == '.npy':
+            self.frames = np.load(filename, mmap_mode='r')
+        else:
+            try:
+                import tifffile
+            except ImportError:
+                raise ImportError("Reading TIFF stacks needs the 'tifffile' package: pip install tifffile")
+            try:
+                self.frames = tifffile.memmap(filename, mode='r')
+            except ValueError:  # compressed or not contiguous
+                self.tiff = tifffile.TiffFile(filename)
+                self.frames = None
+        shape = self.frames.shape if self.frames is not None else (len(self.tiff.pages), *self.tiff.pages[0].shape)
+        if self.frames is not None and self.frames.ndim == 2:  # a single image
+            self.frames = self.frames[np.newaxis]
+            shape = self.frames.shape
+        self._shape = shape
+
+    @property
+    def n_frames(self) -> int:
+        return self._shape[0]
+
+    @property
+    def frame_height(self) -> int:
+        return self._shape[1]
+
+    @property
+    def frame_width(self) -> int:
+        return self._shape[2]
+
+    def close(self) -> None:
+        if self.tiff is not None:
+            self.tiff.close()
+
+    def read_frame_at(self, frame_idx: int) -> np.ndarray:
+        frame = self.frames[frame_idx] if self.frames is not None else self.tiff.pages[frame_idx].asarray()
+        return to_rgb8(np.array(frame))  # a copy, so frames are writable like those from the other backends
@@ -0,0 +1,67 @@
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+
+class LabeledFramesReader:
+    """
+    Reads a labeled-frames HDF5 file written by workflows.export_labeled_frames_hdf5, for training loaders.
+    Frames are read one chunk at a time on indexing; if the file was written without compression, 
+    they are memory-mapped instead (set *memmap* to False to always go through h5py).
+    Needs the optional 'h5py' package.
+    """
+
+    def __init__(self, filename: Path, memmap: bool = True) -> None:
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("Reading HDF5 files needs the 'h5py' package: pip install h5py")
+        
+        self.file = h5py.File(filename, 'r')
+        dataset = self.file['frames']
+        offset = dataset.id.get_offset() if memmap and dataset.chunks is None else None  # None unless stored contiguously
+        self.frames = np.memmap(filename, mode='r', dtype=dataset.dtype, shape=dataset.shape, offset=offset) if offset is not None else dataset
+        self.frame_indices = self.file['frame_indices'][:]
+        self.frame_sizes = self.file['frame_sizes'][:] if 'frame_sizes' in self.file else None  # (height, width) of each frame's own video, if they differ
+        self.frame_videos = np.array([path.decode() if isinstance(path, bytes) else path for path in self.file['frame_videos'][:]], dtype=object) if 'frame_videos' in self.file else None
+        
+        labels = self.file['labels']
+        body_parts = np.array([name.decode() if isinstance(name, bytes) else name for name in labels['body_parts'][:]], dtype=object)
+        frame = labels['frame'][:]
+        self.labels = pd.DataFrame().assign(
+            FrameIndex=frame,
+            VideoFrameIndex=self.frame_indices[frame],
+            i=labels['i'][:],
+            j=labels['j'][:],
+            label=pd.Categorical.from_codes(labels['body_part'][:], categories=body_parts),
+        )
+        if self.frame_videos is not None:
+            self.labels.insert(1, 'Video', self.frame_videos[frame])
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __getitem__(self, idx: Union[int, slice]) -> np.ndarray:
+        return self.frames[idx]
+
+    def unpadded_frame(self, idx: int) -> np.ndarray:
+        """The frame at *idx* without the zero padding added to frames from videos smaller than the largest."""
+        frame = self.frames[idx]
+        if self.frame_sizes is None:
+            return frame
+        height, width = self.frame_sizes[idx]
+        return frame[:height, :width]
+
+    def labels_for_frame(self, idx: int) -> pd.DataFrame:
+        return self.labels[self.labels['FrameIndex'] == idx]
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> 'LabeledFramesReader':
+        return self
+
+    def __exit__(self, type, value, tb) -> None:
+        self.close()
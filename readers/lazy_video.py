@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from .video_reader import VideoReader
+
+
+class LazyVideoArray:
+    """
+    A read-only, array-like view of a whole video with shape (n_frames, height, width, 3), for napari to slice frame-by-frame.
+    Frames are decoded in chunks of *chunk_size* consecutive frames, which are kept in an LRU cache of *max_cached_chunks* chunks, 
+    and the chunk after the one being viewed is decoded in the background so that scrubbing forward doesn't wait on the decoder.
+    The whole video is never loaded into memory. The prefetching thread (and its own reader) is only started on the first read;
+    close() stops it and closes the video.
+    """
+
+    def __init__(self, filename: Path, chunk_size: int = 16, max_cached_chunks: int = 8, prefetch: bool = True, backend: Optional[str] = None) -> None:
+        self.filename = filename
+        self.backend = backend
+        self.reader = VideoReader(filename=filename, backend=backend)
+        self.chunk_size = chunk_size
+        self.max_cached_chunks = max_cached_chunks
+        self.prefetch = prefetch
+        self.shape = (len(self.reader), self.reader.frame_height, self.reader.frame_width, 3)
+        self.dtype = np.dtype(np.uint8)
+        self._chunks: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._cache_lock = Lock()
+        self._reader_lock = Lock()
+        self._prefetch_reader: Optional[VideoReader] = None  # its own VideoCapture, so prefetching never blocks the viewer's reads
+        self._prefetcher: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    def __len__(self) -> int:
+        return self.shape[0]
+    
+    def _decode_chunk(self, chunk_idx: int, reader: VideoReader) -> np.ndarray:
+        start = chunk_idx * self.chunk_size
+        stop = min(start + self.chunk_size, len(self))
+        chunk = np.zeros((stop - start, *self.shape[1:]), dtype=self.dtype)  # frames past a wrong CAP_PROP_FRAME_COUNT stay black
+        try:
+            for offset, frame in enumerate(reader.read_frames(start=start, stop=stop)):
+                chunk[offset] = frame
+        except IOError:
+            pass
+        return chunk
+
+    def get_chunk(self, chunk_idx: int, prefetching: bool = False) -> np.ndarray:
+        with self._cache_lock:
+            if chunk_idx in self._chunks:
+                self._chunks.move_to_end(chunk_idx)
+                return self._chunks[chunk_idx]
+        if prefetching:
+            chunk = self._decode_chunk(chunk_idx, reader=self._prefetch_reader)
+        else:
+            with self._reader_lock:
+                chunk = self._decode_chunk(chunk_idx, reader=self.reader)
+        with self._cache_lock:
+            self._chunks[chunk_idx] = chunk
+            self._chunks.move_to_end(chunk_idx)
+            while len(self._chunks) > self.max_cached_chunks:
+                self._chunks.popitem(last=False)
+        return chunk
+
+    def _prefetch_chunk(self, chunk_idx: int) -> None:
+        if chunk_idx * self.chunk_size >= len(self):
+            return
+        with self._cache_lock:
+            if chunk_idx in self._chunks:
+                return
+        if self._prefetcher is None:
+            self._prefetch_reader = VideoReader(filename=self.filename, backend=self.backend)
+            self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        self._prefetcher.submit(self.get_chunk, chunk_idx, prefetching=True)
+
+    def close(self) -> None:
+        """Stops prefetching and closes the video. Chunks that were already decoded can still be read."""
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown(wait=True, cancel_futures=True)
+            self._prefetch_reader.close()
+        self.reader.close()
+
+    def get_frame(self, frame_idx: int) -> np.ndarray:
+        if not -len(self) <= frame_idx < len(self):
+            raise IndexError(f"Frame {frame_idx} is out of range for a video of {len(self)} frames.")
+        frame_idx = frame_idx % len(self)
+        chunk_idx, offset = divmod(frame_idx, self.chunk_size)
+        frame = self.get_chunk(chunk_idx)[offset]
+        if self.prefetch:
+            self._prefetch_chunk(chunk_idx + 1)
+        return frame
+
+    def __getitem__(self, key: Union[int, slice, Tuple]) -> np.ndarray:
+        key = key if isinstance(key, tuple) else (key,)
+        frame_key, rest = key[0], key[1:]
+        if isinstance(frame_key, (int, np.integer)):
+            return self.get_frame(int(frame_key))[rest]
+        frame_indices = np.arange(len(self))[frame_key]
+        frames = np.stack([self.get_frame(int(idx)) for idx in frame_indices]) if len(frame_indices) else np.empty((0, *self.shape[1:]), dtype=self.dtype)
+        return frames[(slice(None), *rest)]
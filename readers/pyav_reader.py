@@ -0,0 +1,86 @@
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from .video_reader import VideoReader
+
+
+class PyAVVideoReader(VideoReader):
+    """
+    Reads videos with PyAV (FFmpeg), seeking frame-accurately: a seek jumps to the keyframe before the target
+    and decodes forward until the frame whose timestamp matches the target index (assuming a constant frame rate).
+    The frame count comes from the container, or from counting packets (without decoding them) if the container doesn't say.
+    Needs the optional 'av' package.
+    """
+
+    def __init__(self, filename: Path, backend: Optional[str] = None) -> None:
+        try:
+            import av
+        except ImportError:
+            raise ImportError("The 'pyav' reader backend needs the 'av' package: pip install av")
+
+        self._av = av
+        self.filename = Path(filename)
+        self.container = av.open(str(filename))
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = 'AUTO'
+        self._start_pts = self.stream.start_time or 0
+        self._pts_per_frame = float(1 / (self.stream.average_rate * self.stream.time_base))
+        self._n_frames: Optional[int] = self.stream.frames or None
+        self._decoder = self.container.decode(self.stream)
+        self._next_frame = None  # decoded while seeking, but not returned yet
+        self._position = 0
+
+    @property
+    def n_frames(self) -> int:
+        if self._n_frames is None:
+            with self._av.open(str(self.filename)) as container:
+                self._n_frames = sum(1 for packet in container.demux(video=0) if packet.size)
+        return self._n_frames
+
+    @property
+    def frame_height(self) -> int:
+        return self.stream.codec_context.height
+
+    @property
+    def frame_width(self) -> int:
+        return self.stream.codec_context.width
+
+    def _frame_index(self, frame) -> int:
+        if frame.pts is None:
+            return self._position
+        return int(round((frame.pts - self._start_pts) / self._pts_per_frame))
+
+    def _decode_next(self):
+        if self._next_frame is not None:
+            frame, self._next_frame = self._next_frame, None
+        else:
+            frame = next(self._decoder, None)
+            if frame is None:
+                raise IOError("No Frame")
+        self._position = self._frame_index(frame) + 1
+        return frame
+
+    def seek_to(self, frame_idx: int) -> None:
+        self.container.seek(int(self._start_pts + frame_idx * self._pts_per_frame), stream=self.stream, backward=True, any_frame=False)
+        self._decoder = self.container.decode(self.stream)
+        self._next_frame = None
+        while True:
+            frame = next(self._decoder, None)
+            if frame is None:
+                raise IOError("No Frame")
+            if self._frame_index(frame) >= frame_idx:
+                self._next_frame = frame
+                self._position = frame_idx
+                return
+
+    def grab_frame(self) -> None:
+        """Advances one frame without converting it into an array (it still has to be decoded)."""
+        self._decode_next()
+
+    def read_frame(self) -> np.ndarray:
+        return self._decode_next().to_ndarray(format='rgb24')
+
+    def close(self) -> None:
+        self.container.close()
@@ -1,27 +1,236 @@
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Iterator, Optional
+from typing import Iterable, Iterator, Optional, Tuple, Type
 
 import cv2
 import numpy as np
 from os import path
 
+from core.video_processing import ReferenceFrameAccumulator
 
-class VideoReader:
 
-    def __init__(self, filename: Path) -> None:
+# Largest forward gap (in frames) that is decoded through with grab() rather than seeked over.
+# Seeking makes the decoder restart from the previous keyframe, so it only pays off once the gap
+# is longer than a typical keyframe interval (x264's default keyint is 250).
+MAX_GRAB = 250
+
+
+BACKENDS = ('opencv', 'pyav', 'images', 'stack')
+COLOR_MODES = ('rgb', 'gray')
+
+Roi = Tuple[int, int, int, int]  # (x0, x1, y0, y1), in the same order as a workflows Crop
+
+
+def converted_shape(frame_shape: Tuple[int, int], roi: Optional[Roi] = None, scale: int = 1, color: str = 'rgb') -> Tuple[int, int, int]:
+    """
+    The (height, width, channels) of a frame of *frame_shape* (height, width) once cropped to *roi* (clipped to the frame, like slicing),
+    shrunk by the integer factor *scale*, and converted to *color*.
+
+    Example
+    -------
+    >>> converted_shape((48, 64), roi=(10, 50, 5, 100), scale=2, color='gray')
+    (21, 20, 1)
+    """
+    height, width = frame_shape
+    x0, x1, y0, y1 = roi if roi is not None else (0, width, 0, height)
+    roi_height, roi_width = len(range(height)[y0:y1]), len(range(width)[x0:x1])
+    return roi_height // scale, roi_width // scale, 1 if color == 'gray' else 3
+
+
+def convert_frame(frame: np.ndarray, out: np.ndarray, roi: Optional[Roi] = None, scale: int = 1, color: str = 'rgb', bgr: bool = False, scratch: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Writes the *roi* of a (height, width, 3) uint8 *frame*, shrunk by *scale* (averaging each scale x scale block, as downsample_batch's 'area' method)
+    and converted to *color*, into *out* (shaped as converted_shape() says). Only the pixels inside the ROI are read, and nothing frame-sized is allocated;
+    *scratch*, a (height, width, 3) buffer for the shrunk ROI, is only needed when both shrinking and converting, and is allocated if not given.
+    Set *bgr* if the frame is in OpenCV's BGR order.
+    """
+    if color not in COLOR_MODES:
+        raise ValueError(f"color must be one of {COLOR_MODES}, not {color!r}")
+    if roi is not None:
+        x0, x1, y0, y1 = roi
+        frame = frame[y0:y1, x0:x1]  # a view; OpenCV reads it row by row without copying
+    out_height, out_width = out.shape[:2]
+    if color == 'gray':
+        conversion = cv2.COLOR_BGR2GRAY if bgr else cv2.COLOR_RGB2GRAY
+        dst = out[..., 0] if out.ndim == 3 else out
+    else:
+        conversion = cv2.COLOR_BGR2RGB if bgr else None
+        dst = out
+    if scale > 1:
+        if conversion is None:
+            cv2.resize(frame, (out_width, out_height), dst=out, interpolation=cv2.INTER_AREA)
+            return out
+        if scratch is None:
+            scratch = np.empty((out_height, out_width, 3), dtype=np.uint8)
+        frame = cv2.resize(frame, (out_width, out_height), dst=scratch, interpolation=cv2.INTER_AREA)
+    if conversion is None:
+        out[...] = frame
+    else:
+        cv2.cvtColor(frame, conversion, dst=dst)
+    return out
+
+
+def choose_backend(filename: Path) -> str:
+    """Picks a backend by file type: a folder of images, a .npy or TIFF stack, or (anything else) a video file read with OpenCV."""
+    filename = Path(filename)
+    if filename.is_dir():
+        return 'images'
+    if filename.suffix.lower() in ('.npy', '.tif', '.tiff'):
+        return 'stack'
+    return 'opencv'
+
+
+def get_backend_class(backend: str) -> Type['VideoReader']:
+    if backend == 'opencv':
+        return OpenCVVideoReader
+    if backend == 'pyav':
+        from .pyav_reader import PyAVVideoReader
+        return PyAVVideoReader
+    if backend == 'images':
+        from .image_stack import ImageFolderReader
+        return ImageFolderReader
+    if backend == 'stack':
+        from .image_stack import ArrayStackReader
+        return ArrayStackReader
+    raise ValueError(f"backend must be one of {BACKENDS}, not {backend!r}")
+
+
+class VideoReader(ABC):
+    """
+    Reads the frames of a video (or image stack) as (height, width, 3) uint8 RGB arrays.
+    VideoReader(filename) opens the backend that suits the file type (see choose_backend); pass *backend* to pick one,
+    e.g. 'pyav' for frame-accurate seeking in videos whose keyframes OpenCV doesn't seek to reliably.
+
+    Backends implement the abstract n_frames, frame_height, frame_width, seek_to, grab_frame and read_frame
+    (a backend missing one can't be constructed); backends with cheap random access also override read_frames_at.
+    """
+
+    def __new__(cls, filename: Path, backend: Optional[str] = None):
+        if cls is VideoReader:
+            cls = get_backend_class(backend if backend is not None else choose_backend(filename))
+        return super().__new__(cls)
+
+    @property
+    @abstractmethod
+    def n_frames(self) -> int: ...
+
+    def __len__(self) -> int:
+        return self.n_frames
+
+    @property
+    @abstractmethod
+    def frame_height(self) -> int: ...
+
+    @property
+    @abstractmethod
+    def frame_width(self) -> int: ...
+
+    @abstractmethod
+    def seek_to(self, frame_idx: int) -> None:
+        """Moves to *frame_idx*, so that it's the next frame read."""
+
+    @abstractmethod
+    def grab_frame(self) -> None:
+        """Advances one frame without converting it into an array."""
+
+    @abstractmethod
+    def read_frame(self) -> np.ndarray:
+        """Reads the next frame as a (height, width, 3) uint8 RGB array."""
+
+    def close(self) -> None:
+        """Releases the video file (and decoder); the reader can't be used afterwards."""
+
+    def _read_frame_to_convert(self) -> Tuple[np.ndarray, bool]:
+        """Reads the next frame for convert_frame(), returning it and whether it's in BGR order. Backends that can skip work (e.g. decoding into a reused buffer) override this."""
+        return self.read_frame(), False
+
+    def converted_shape(self, roi: Optional[Roi] = None, scale: int = 1, color: str = 'rgb') -> Tuple[int, int, int]:
+        """The shape of this video's frames as read_frames_at_into() writes them; see converted_shape()."""
+        return converted_shape((self.frame_height, self.frame_width), roi=roi, scale=scale, color=color)
+
+    def read_frames(self, start: int = 0, stop: Optional[int] = None, step: int = 1, max_grab: int = MAX_GRAB) -> Iterator[np.ndarray]:
+        stop = len(self) if stop is None else stop
+        yield from self.read_frames_at(range(start, stop, step), max_grab=max_grab)
+
+    def read_frames_at(self, indices: Iterable[int], max_grab: int = MAX_GRAB) -> Iterator[np.ndarray]:
+        """
+        Yields the frames at *indices*, decoding forward and grab()-ing over the frames in between.
+        A real seek is only done when going backwards or when the gap is larger than *max_grab* frames.
+        Set *max_grab* to 0 to seek before every frame.
+        """
+        for _ in self._move_to_each(indices, max_grab=max_grab):
+            yield self.read_frame()
+
+    def _move_to_each(self, indices: Iterable[int], max_grab: int = MAX_GRAB) -> Iterator[int]:
+        """Seeks or grabs to each of the *indices* in turn, yielding once the next frame read will be that one."""
+        position = None
+        for idx in indices:
+            gap = None if position is None else idx - position
+            if gap is None or max_grab <= 0 or not 0 <= gap <= max_grab:
+                self.seek_to(idx)
+            else:
+                for _ in range(gap):
+                    self.grab_frame()
+            yield idx
+            position = idx + 1
+
+    def read_frames_at_into(self, indices: Iterable[int], out: np.ndarray, roi: Optional[Roi] = None, scale: int = 1, color: str = 'rgb', max_grab: int = MAX_GRAB) -> Iterator[np.ndarray]:
+        """
+        Reads the frames at *indices* like read_frames_at(), but only the *roi* (x0, x1, y0, y1) of each, shrunk by *scale* and converted to *color*
+        ('rgb' or 'gray'; see convert_frame), and writes them into the next slot of *out*, a (batch size, *self.converted_shape(...)) uint8 buffer.
+        Yields out[:n] each time it fills up, and once more at the end with the remaining frames; each batch is overwritten by the next one,
+        so copy it if it's needed for longer. No arrays are allocated per frame.
+        """
+        expected_shape = self.converted_shape(roi=roi, scale=scale, color=color)
+        if out.shape[1:] != expected_shape or out.dtype != np.uint8:
+            raise ValueError(f"out must be a uint8 array shaped (batch size, {', '.join(map(str, expected_shape))}), not {out.dtype} {out.shape}.")
+        scratch = np.empty((*expected_shape[:2], 3), dtype=np.uint8)
+        n_filled = 0
+        for _ in self._move_to_each(indices, max_grab=max_grab):
+            frame, bgr = self._read_frame_to_convert()
+            convert_frame(frame, out=out[n_filled], roi=roi, scale=scale, color=color, bgr=bgr, scratch=scratch)
+            n_filled += 1
+            if n_filled == len(out):
+                yield out
+                n_filled = 0
+        if n_filled:
+            yield out[:n_filled]
+
+    def read_average_frame(self, nframes_to_use: int = 10) -> np.ndarray:
+        """Returns a roughly-estimated average frame from the data, using a subsample of evenly-spaced frames."""
+        return self.read_reference_frame(nframes_to_use=nframes_to_use, method='mean')
+
+    def read_reference_frame(self, nframes_to_use: int = 10, method: str = 'mean') -> np.ndarray:
+        """
+        Returns the per-pixel mean, median or max (see ReferenceFrameAccumulator) of *nframes_to_use* evenly-spaced frames,
+        accumulated as they are read so that memory doesn't grow with the number of frames used.
+        Frames past the end of a video whose reported length is too long (as OpenCV's often is) are left out.
+        """
+        frame_indices = np.unique(np.arange(nframes_to_use) * len(self) // nframes_to_use)
+        accumulator = ReferenceFrameAccumulator(method=method)
+        try:
+            for frame in self.read_frames_at(frame_indices):
+                accumulator.add(frame)
+        except IOError:
+            if not accumulator.n_frames:
+                raise
+        return accumulator.result()
+
+
+class OpenCVVideoReader(VideoReader):
+
+    def __init__(self, filename: Path, backend: Optional[str] = None) -> None:
         cap = cv2.VideoCapture(str(filename))
         if not cap.isOpened():
             raise IOError(f"Video File '{path.basename(filename)}' isn't opening with OpenCV. Not sure why; is it a video file?")
         
         self.cap = cap
+        self._decoded: Optional[np.ndarray] = None  # reused by _read_frame_to_convert
     
     @property
     def n_frames(self) -> int:
         return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
-    def __len__(self) -> int:
-        return self.n_frames
-
     @property
     def frame_height(self) -> int:
         return int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -33,27 +242,23 @@ class VideoReader:
     def seek_to(self, frame_idx) -> None:
         self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
 
+    def grab_frame(self) -> None:
+        """Advances one frame without decoding it into an array."""
+        if not self.cap.grab():
+            raise IOError("No Frame")
+
     def read_frame(self) -> np.ndarray:
         success, frame = self.cap.read()
         if not success:
             raise IOError("No Frame")
-        frame = frame[..., ::-1]
-        # frame = img_as_ubyte(frame)
         assert isinstance(frame, np.ndarray), f"Frame should be an array, instead is {type(frame)}"
-        return frame
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)  # in place, so the frame stays contiguous (unlike frame[..., ::-1])
 
-    def read_frames(self, start: int = 0, stop: Optional[int] = None, step: int = 1) -> Iterator[np.ndarray]:
-        stop = len(self) if stop is None else stop
-        for idx in range(start, stop, step):
-            self.seek_to(idx)
-            frame = self.read_frame()
-            yield frame
+    def close(self) -> None:
+        self.cap.release()
 
-    def read_average_frame(self, nframes_to_use: int = 10) -> np.ndarray:
-        """Returns a roughly-estimated average frame from the data, using a subsample of evenly-spaced frames."""
-        step_size = int(len(self) / nframes_to_use)
-        frames = np.array(list(self.read_frames(step=step_size))).astype(int)
-        average_frame = np.mean(frames, axis=0).astype(np.uint8)
-        return average_frame
-        
-    
\ No newline at end of file
+    def _read_frame_to_convert(self) -> Tuple[np.ndarray, bool]:
+        success, self._decoded = self.cap.read(self._decoded)  # decodes into the same buffer every time
+        if not success:
+            raise IOError("No Frame")
+        return self._decoded, True
@@ -0,0 +1,23 @@
+import pytest
+
+from benchmarks.synthetic import write_synthetic_video
+from readers import OpenCVVideoReader
+
+
+class OvercountingVideoReader(OpenCVVideoReader):
+    """Reports more frames than it can decode, as OpenCV's CAP_PROP_FRAME_COUNT often does."""
+    n_extra_frames = 25
+
+    @property
+    def n_frames(self) -> int:
+        return super().n_frames + self.n_extra_frames
+
+
+@pytest.fixture(scope='session')
+def video_path(tmp_path_factory):
+    return write_synthetic_video(tmp_path_factory.mktemp('videos') / 'synthetic.mp4', n_frames=90, width=64, height=48, gop=12)
+
+
+@pytest.fixture
+def overcounting_video(video_path):
+    return OvercountingVideoReader(filename=video_path)
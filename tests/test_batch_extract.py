@@ -0,0 +1,29 @@
+import json
+
+from batch_extract import batch_extract
+
+
+def test_batch_extract_writes_frames_and_manifests_then_skips_finished_videos(video_path, tmp_path):
+    settings = {'crop': [0, 32, 0, 24], 'n_clusters': 3, 'every_n': 5, 'downsample_level': 2}
+    manifests = batch_extract(video_paths=[str(video_path)], output_dir=tmp_path, settings=settings, workers=1)
+    
+    assert [manifest['skipped'] for manifest in manifests] == [False]
+    video_dir = tmp_path / video_path.stem
+    assert len(list(video_dir.glob('*.png'))) == 3
+    assert json.loads((video_dir / 'manifest.json').read_text())['frame_indices'] == manifests[0]['frame_indices']
+    assert len(json.loads((tmp_path / 'manifest.json').read_text())['videos']) == 1
+
+    rerun = batch_extract(video_paths=[str(video_path)], output_dir=tmp_path, settings=settings, workers=1)
+    assert [manifest['skipped'] for manifest in rerun] == [True]
+
+
+def test_batch_extract_replaces_the_frames_of_a_rerun_with_other_settings(video_path, tmp_path):
+    settings = {'crop': [0, 32, 0, 24], 'n_clusters': 4, 'every_n': 5, 'downsample_level': 2}
+    batch_extract(video_paths=[str(video_path)], output_dir=tmp_path, settings=settings, workers=1)
+    assert list((tmp_path / '.feature_cache').glob('*.npy'))  # the cache lives in the output directory
+
+    manifests = batch_extract(video_paths=[str(video_path)], output_dir=tmp_path, settings={**settings, 'n_clusters': 2, 'codec': 'jpeg'}, workers=1)
+    video_dir = tmp_path / video_path.stem
+    assert sorted(manifests[0]['files']) == sorted(path.name for path in video_dir.iterdir() if path.name != 'manifest.json')
+    assert len(manifests[0]['files']) == 2
+    assert all(name.endswith('.jpg') for name in manifests[0]['files'])
@@ -1,13 +1,18 @@
 
+import cv2
 import numpy as np
 
+from benchmarks.synthetic import write_synthetic_video
 from gui.models import AppState
+from gui.models.label_store import LabelStore
+from readers import LabeledFramesReader
+from workflows import ExtractFramesResult, Progress
 
 
-def test_app_loads_reference_frame_when_video_path_updated():
+def test_app_loads_reference_frame_when_video_path_updated(video_path):
     app = AppState()
     assert app.reference_frame is None
-    app.load_video(filename=r"C:\Users\nickdg\Projects\WaspTracker\data\raw\jwasp0.avi")
+    app.load_video(filename=str(video_path))
     assert isinstance(app.reference_frame, np.ndarray)
 
 
@@ -27,3 +32,148 @@ def test_app_sets_crop_to_frame_dimensions_when_reference_frame_set():
     # observe(detector)
 
     # app.observe('reference_frame')
+
+
+def test_app_keeps_the_crop_for_a_recomputed_reference_frame_but_not_for_another_video(video_path, tmp_path):
+    app = AppState()
+    app.load_video(filename=str(video_path))
+    app.x0, app.x1 = 10, 30
+    app.update_reference_frame(nframes_to_use=5, method='median')
+    assert (app.x0, app.x1) == (10, 30)
+
+    app.load_video(filename=str(write_synthetic_video(tmp_path / 'same_size.mp4', n_frames=30, width=64, height=48)))
+    assert (app.x0, app.x1) == (0, 64)
+
+
+def test_app_only_opens_the_video_for_browsing_while_asked_to(video_path, tmp_path):
+    app = AppState()
+    app.load_video(filename=str(video_path))
+    assert app.video_frames is None
+
+    app.browse_video = True
+    frames = app.video_frames
+    assert len(frames) == 90
+    app.load_video(filename=str(write_synthetic_video(tmp_path / 'other.mp4', n_frames=30, width=64, height=48)))
+    assert len(app.video_frames) == 30
+    assert not frames.reader.cap.isOpened()  # the replaced video was closed
+
+    app.browse_video = False
+    assert app.video_frames is None
+
+
+def test_app_only_caches_features_on_disk_when_given_a_cache():
+    assert AppState().feature_cache is None
+
+
+def test_app_applies_extract_frames_result_from_a_separately_run_workflow(video_path):
+    app = AppState(feature_cache=None)
+    app.video_path = str(video_path)
+    app.x1, app.y1 = 64, 48
+    workflow = app.make_extract_frames_workflow(n_clusters=3, every_n=5, downsample_level=2)
+    *steps, result = list(workflow)
+    assert app.selected_frames is None  # running the workflow doesn't touch the model
+    
+    app.apply_extract_frames_result(result)
+    assert len(app.selected_frame_indices) == 3
+    assert app.selected_frames.shape[0] == 3
+
+
+def test_app_keeps_downsampled_frames_on_disk_while_extracting(video_path, tmp_path):
+    assert AppState().spill_directory is not None  # on by default, so memory doesn't grow with the video
+
+    app = AppState(feature_cache=None, spill_directory=str(tmp_path / 'spill'))
+    app.video_path = str(video_path)
+    app.x1, app.y1 = 64, 48
+    spilled = False
+    for _ in app.extract_frames(n_clusters=3, every_n=1, downsample_level=2):
+        spilled = spilled or any((tmp_path / 'spill').glob('frame_selector_*/*.npy'))
+    assert spilled and len(app.selected_frame_indices) == 3
+    assert not any((tmp_path / 'spill').iterdir())  # removed with the selector
+
+
+def test_app_adds_frames_similar_to_a_selected_frame_after_the_existing_ones(video_path):
+    app = AppState(feature_cache=None)
+    app.video_path = str(video_path)
+    app.x1, app.y1 = 64, 48
+    steps = list(app.extract_frames(n_clusters=3, every_n=5, downsample_level=2))
+    assert all(isinstance(step, Progress) for step in steps)
+    assert [timing.stage for timing in app.stage_timings][-3:] == ['kmeans', 'pick_frames', 'gather']
+    original_indices = list(app.selected_frame_indices)
+
+    added = app.add_similar_frames(frame_position=1, k=2)
+    assert len(added) == 2
+    assert not set(added) & set(original_indices)
+    assert all(idx % 5 == 0 for idx in added)  # only frames that were sampled during extraction
+    assert app.selected_frame_indices == original_indices + added
+    assert app.selected_frames.shape[0] == 5
+    assert app.add_similar_frames(frame_position=len(app.selected_frame_indices), k=2) == []  # e.g. a video frame index, not a selected frame
+
+    app.video_path = str(video_path.with_name('another.mp4'))
+    assert app.similarity_index is None
+    assert app.add_similar_frames(frame_position=1, k=2) == []  # the index was of the previous video's frames
+
+
+def test_app_exports_frames_selected_across_project_videos_at_their_own_sizes(video_path, tmp_path):
+    other_video_path = write_synthetic_video(tmp_path / 'other.mp4', n_frames=60, width=80, height=64, seed=1)
+    app = AppState(feature_cache=None)
+    for path in [video_path, other_video_path]:
+        app.load_video(filename=str(path))
+        app.add_video_to_project()
+    assert len(app.project) == 2
+
+    for step in app.make_extract_project_frames_workflow(n_clusters=6, every_n=5, downsample_level=4):
+        if isinstance(step, ExtractFramesResult):
+            app.apply_extract_frames_result(step)
+    assert len(app.selected_frame_videos) == 6
+    assert app.similarity_index is None  # only available for single-video extraction
+
+    app.export_frames_to_directory(directory=tmp_path / 'frames')
+    shapes = {path.name.split('__')[0]: cv2.imread(str(path)).shape for path in (tmp_path / 'frames').glob('*.png')}
+    assert shapes == {'synthetic': (48, 64, 3), 'other': (64, 80, 3)}
+
+    list(app.export_labeled_frames(filename=tmp_path / 'project.h5'))
+    with LabeledFramesReader(tmp_path / 'project.h5') as reader:
+        assert list(reader.frame_videos) == app.selected_frame_videos
+        assert {reader.unpadded_frame(idx).shape for idx in range(len(reader))} == {(48, 64, 3), (64, 80, 3)}
+
+
+def test_app_exports_frames_selected_from_a_project_video_that_isnt_loaded_under_its_name(video_path, tmp_path):
+    other_video_path = write_synthetic_video(tmp_path / 'other.mp4', n_frames=60, width=80, height=64, seed=1)
+    app = AppState()
+    app.load_video(filename=str(other_video_path))
+    app.add_video_to_project()
+    app.load_video(filename=str(video_path))
+    for step in app.make_extract_project_frames_workflow(n_clusters=3, every_n=5, downsample_level=4):
+        if isinstance(step, ExtractFramesResult):
+            app.apply_extract_frames_result(step)
+
+    app.export_frames_to_directory(directory=tmp_path / 'frames')
+    assert {path.name.split('__')[0] for path in (tmp_path / 'frames').glob('*.png')} == {'other'}
+    list(app.export_labeled_frames(filename=tmp_path / 'frames.h5'))
+    with LabeledFramesReader(tmp_path / 'frames.h5') as reader:
+        assert set(reader.frame_videos) == {str(other_video_path)}
+
+
+def test_app_edits_labels_incrementally():
+    app = AppState(feature_cache=None)
+    events = []
+    app.observe(lambda change: events.append(change['new'][1:]), 'label_event')
+
+    app.add_labels(frame_indices=[0, 1], points=np.array([[1., 2.], [3., 4.]]), labels=['head', 'tail'])
+    app.add_labels(frame_indices=[1], points=np.array([[5.6, 6.]]), labels=['head'])
+    app.move_labels(rows=[1], points=np.array([[7., 8.]]))
+    app.remove_labels(rows=[0])
+
+    assert events == [('added', (0, 1)), ('added', (2,)), ('moved', (1,)), ('removed', (0,))]
+    labels = app.labels
+    assert list(labels['FrameIndex']) == [1, 1]
+    assert list(labels['i']) == [7, 5] and labels['i'].dtype.kind == 'i'  # pixel coordinates, as before the label store
+    assert list(labels['label']) == ['tail', 'head']
+
+
+def test_label_store_grows_past_its_initial_capacity():
+    store = LabelStore(capacity=2)
+    for idx in range(5):
+        store.append(frame_indices=[idx], points=[[idx, idx]], labels=['head'])
+    assert len(store) == 5
+    assert list(store.frame_indices) == [0, 1, 2, 3, 4]
@@ -0,0 +1,136 @@
+import cv2
+import numpy as np
+import pandas as pd
+import pytest
+
+from readers import VideoReader, LazyVideoArray, LabeledFramesReader, ArrayStackReader, ImageFolderReader
+from readers.image_stack import RandomAccessReader
+from core.video_processing import downsample_batch
+from workflows import export_labeled_frames_hdf5
+
+
+def test_sequential_read_matches_seeking_to_every_frame(video_path):
+    video = VideoReader(filename=video_path)
+    seeked = list(video.read_frames(step=7, max_grab=0))
+    sequential = list(video.read_frames(step=7))
+    assert len(seeked) == len(sequential) == len(range(0, len(video), 7))
+    for frame_a, frame_b in zip(seeked, sequential):
+        assert np.array_equal(frame_a, frame_b)
+
+
+def test_read_frames_at_handles_backward_and_large_jumps(video_path):
+    video = VideoReader(filename=video_path)
+    indices = [50, 3, 4, 80, 10]
+    frames = list(video.read_frames_at(indices, max_grab=5))
+    expected = [next(video.read_frames_at([idx], max_grab=0)) for idx in indices]
+    for frame_a, frame_b in zip(frames, expected):
+        assert np.array_equal(frame_a, frame_b)
+
+
+def test_read_frames_into_a_buffer_matches_cropping_and_downsampling_full_frames(video_path, tmp_path):
+    npy_path = tmp_path / 'frames.npy'
+    np.save(npy_path, np.array(list(VideoReader(filename=video_path).read_frames())))
+    indices, roi = [3, 10, 11, 40, 80], (10, 50, 5, 40)
+    for filename in [video_path, npy_path]:  # OpenCV decodes BGR into a reused buffer; the stack reader goes through read_frame
+        video = VideoReader(filename=filename)
+        full_frames = np.array(list(video.read_frames_at(indices)))
+        for scale, color in [(1, 'rgb'), (2, 'rgb'), (3, 'gray')]:
+            out = np.empty((2, *video.converted_shape(roi=roi, scale=scale, color=color)), dtype=np.uint8)
+            batches = [batch.copy() for batch in video.read_frames_at_into(indices, out=out, roi=roi, scale=scale, color=color)]
+            assert [len(batch) for batch in batches] == [2, 2, 1]
+            expected = downsample_batch(np.ascontiguousarray(full_frames[:, 5:40, 10:50]), level=scale, grayscale=color == 'gray')
+            assert np.array_equal(np.concatenate(batches), expected)
+
+
+def test_lazy_video_array_matches_frames_read_directly(video_path):
+    video = VideoReader(filename=video_path)
+    lazy_video = LazyVideoArray(filename=video_path, chunk_size=8, max_cached_chunks=2)
+    assert lazy_video.shape == (len(video), video.frame_height, video.frame_width, 3)
+
+    for idx in [0, 9, 40, 10, -1]:
+        assert np.array_equal(lazy_video[idx], next(video.read_frames_at([idx % len(video)], max_grab=0)))
+    assert np.array_equal(lazy_video[3:6, 10:20, :, 0], np.array(list(video.read_frames(3, 6)))[:, 10:20, :, 0])
+    assert len(lazy_video._chunks) <= 2
+
+    lazy_video.close()
+    assert lazy_video._prefetcher._shutdown
+    assert not lazy_video.reader.cap.isOpened()
+
+
+def test_read_reference_frame_works_for_videos_shorter_than_the_frames_asked_for(video_path):
+    video = VideoReader(filename=video_path)
+    for method in ['mean', 'median', 'max']:
+        frame = video.read_reference_frame(nframes_to_use=len(video) * 2, method=method)
+        assert frame.shape == (video.frame_height, video.frame_width, 3)
+        assert frame.dtype == np.uint8
+
+
+def test_read_reference_frame_leaves_out_frames_past_the_real_end_of_the_video(video_path, overcounting_video):
+    assert len(overcounting_video) > len(VideoReader(filename=video_path))
+    for method in ['mean', 'median', 'max']:
+        frame = overcounting_video.read_reference_frame(nframes_to_use=10, method=method)
+        assert frame.shape == (overcounting_video.frame_height, overcounting_video.frame_width, 3)
+
+
+def test_image_folder_and_stack_backends_read_the_same_frames(video_path, tmp_path):
+    frames = np.stack(list(VideoReader(filename=video_path).read_frames()))
+    (tmp_path / 'frames').mkdir()
+    for idx, frame in enumerate(frames):
+        cv2.imwrite(str(tmp_path / 'frames' / f"frame_{idx}.png"), frame[..., ::-1])
+    np.save(tmp_path / 'frames.npy', frames)
+
+    indices = [40, 2, 3, 89, 10]
+    for filename, backend_class in [(tmp_path / 'frames', ImageFolderReader), (tmp_path / 'frames.npy', ArrayStackReader)]:
+        video = VideoReader(filename=filename)
+        assert isinstance(video, backend_class)
+        assert (len(video), video.frame_height, video.frame_width) == frames.shape[:3]
+        assert np.array_equal(np.stack(list(video.read_frames_at(indices))), frames[indices])
+        assert np.array_equal(np.stack(list(video.read_frames(start=85))), frames[85:])
+
+
+def test_backends_missing_a_method_fail_when_constructed():
+    class NoReadFrame(RandomAccessReader):
+        def __init__(self, filename, backend=None) -> None:
+            pass
+
+        n_frames = frame_height = frame_width = property(lambda self: 1)
+
+    with pytest.raises(TypeError, match='read_frame_at'):
+        NoReadFrame(filename='frames.npy')
+
+
+def test_pyav_backend_seeks_to_the_exact_frame(video_path):
+    pytest.importorskip('av')
+    video = VideoReader(filename=video_path, backend='pyav')
+    sequential = np.stack(list(video.read_frames()))
+    assert len(sequential) == len(video) == len(VideoReader(filename=video_path))
+
+    indices = [40, 5, 89, 41, 60]
+    assert np.array_equal(np.stack(list(video.read_frames_at(indices, max_grab=0))), sequential[indices])
+
+
+def test_labeled_frames_round_trip_through_hdf5(tmp_path):
+    frames = np.random.default_rng(0).integers(0, 256, size=(4, 6, 8, 3), dtype=np.uint8)
+    labels = pd.DataFrame({'FrameIndex': [0, 0, 3], 'i': [1, 2, 5], 'j': [3, 4, 7], 'label': ['head', 'tail', 'head']})
+    for compression in ['lzf', None]:
+        filename = tmp_path / f"{compression}.h5"
+        list(export_labeled_frames_hdf5(filename=filename, frames=frames, frame_indices=[10, 20, 30, 40], labels=labels, compression=compression))
+        
+        with LabeledFramesReader(filename) as reader:
+            assert isinstance(reader.frames, np.memmap) == (compression is None)
+            assert len(reader) == 4
+            assert np.array_equal(reader[3], frames[3])
+            assert list(reader.frame_indices) == [10, 20, 30, 40]
+            assert list(reader.labels['label']) == ['head', 'tail', 'head']
+            assert list(reader.labels_for_frame(3)['VideoFrameIndex']) == [40]
+
+
+def test_labeled_frames_from_several_videos_keep_their_video_paths(tmp_path):
+    frames = np.zeros((3, 6, 8, 3), dtype=np.uint8)
+    labels = pd.DataFrame({'FrameIndex': [0, 2], 'i': [1, 2], 'j': [3, 4], 'label': ['head', 'tail']})
+    filename = tmp_path / 'project.h5'
+    list(export_labeled_frames_hdf5(filename=filename, frames=frames, frame_indices=[5, 5, 9], labels=labels, frame_video_paths=['a.avi', 'b.avi', 'b.avi']))
+
+    with LabeledFramesReader(filename) as reader:
+        assert list(reader.frame_videos) == ['a.avi', 'b.avi', 'b.avi']
+        assert list(reader.labels['Video']) == ['a.avi', 'b.avi']
@@ -0,0 +1,158 @@
+import cv2
+import numpy as np
+import pytest
+
+from core.video_processing import FrameSimilarityIndex, ReferenceFrameAccumulator, StreamingFrameSelector, downsample, downsample_batch, downsampled_shape, pca, pick_cluster_medoids
+
+
+def make_clustered_frames(n_clusters: int = 4, n_per_cluster: int = 40, shape=(6, 8, 3), seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.integers(0, 255, size=(n_clusters, *shape))
+    frames = np.concatenate([np.clip(center + rng.normal(0, 3, size=(n_per_cluster, *shape)), 0, 255) for center in centers])
+    return frames.astype(np.uint8)
+
+
+def test_pca_returns_a_bounded_number_of_components():
+    frames = make_clustered_frames()
+    assert pca(frames, n_components=5).shape == (len(frames), 5)
+    assert pca(frames[:3], n_components=5).shape == (3, 3)
+
+
+def test_streaming_selector_picks_one_frame_from_each_true_cluster():
+    frames = make_clustered_frames(n_clusters=4, n_per_cluster=40)
+    selector = StreamingFrameSelector(n_clusters=4, n_components=10, chunk_size=32)
+    selector.add_frames(frames)
+    assert len(selector) == len(frames)
+    
+    assert selector.fit_features().shape == (len(frames), 10)
+    selected = selector.select()
+    assert sorted(idx // 40 for idx in selected) == [0, 1, 2, 3]
+
+
+def test_reference_frame_accumulator_matches_numpy_reductions():
+    frames = make_clustered_frames(n_clusters=2, n_per_cluster=30, seed=1)
+    for method, expected in [('mean', np.mean(frames, axis=0).astype(np.uint8)), ('max', frames.max(axis=0))]:
+        acc = ReferenceFrameAccumulator(method=method)
+        for frame in frames:
+            acc.add(frame)
+        assert np.array_equal(acc.result(), expected)
+    
+    rng = np.random.default_rng(2)
+    background = rng.integers(50, 200, size=(6, 8, 3))
+    frames = np.clip(background + rng.normal(0, 5, size=(100, 6, 8, 3)), 0, 255).astype(np.uint8)
+    frames[rng.random(100) < 0.2, 2:4, 2:4] = 255  # an animal passing through
+    acc = ReferenceFrameAccumulator(method='median')
+    for frame in frames:
+        acc.add(frame)
+    assert np.abs(acc.result().astype(float) - np.median(frames, axis=0)).mean() < 3
+
+
+def test_downsample_batch_matches_per_frame_downsampling_and_fills_the_given_buffer():
+    frames = np.random.default_rng(3).integers(0, 256, size=(5, 24, 32, 3), dtype=np.uint8)
+    for grayscale in [False, True]:
+        out = np.zeros((5, *downsampled_shape(frames.shape[1:], level=4, grayscale=grayscale)), dtype=np.uint8)
+        area = downsample_batch(frames, level=4, grayscale=grayscale, out=out)
+        assert area is out and out.any()
+        expected = np.stack([downsample(frame, level=4) for frame in frames])
+        if grayscale:
+            expected = np.stack([cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)[..., np.newaxis] for frame in expected])
+        assert np.array_equal(area, expected)
+
+
+def test_similarity_index_finds_frames_from_the_same_cluster():
+    frames = make_clustered_frames(n_clusters=4, n_per_cluster=40)
+    features = pca(frames.reshape(len(frames), -1), n_components=10)
+    frame_indices = np.arange(len(frames)) * 3
+    index = FrameSimilarityIndex(features=features, frame_indices=frame_indices)
+
+    neighbours = index.query(frame_index=frame_indices[45], k=10)
+    assert len(neighbours) == 10
+    assert frame_indices[45] not in neighbours
+    assert all(40 <= idx // 3 < 80 for idx in neighbours)
+    assert not set(index.query(frame_index=frame_indices[45], k=10, exclude=neighbours[:5])) & set(neighbours[:5])
+
+
+def test_selector_picks_the_same_representative_frames_on_every_run():
+    frames = make_clustered_frames(n_clusters=4, n_per_cluster=40)
+    selections = []
+    for _ in range(2):
+        selector = StreamingFrameSelector(n_clusters=4, n_components=8, chunk_size=32, random_state=0)
+        selector.add_frames(frames)
+        selections.append(selector.select(n_epochs=3, method='centroid'))
+    assert selections[0] == selections[1]
+    assert sorted(idx // 40 for idx in selections[0]) == [0, 1, 2, 3]
+
+    medoids = selector.select(n_epochs=3, method='medoid')
+    assert sorted(idx // 40 for idx in medoids) == [0, 1, 2, 3]
+
+
+def test_selector_spreads_several_frames_per_cluster():
+    frames = make_clustered_frames(n_clusters=4, n_per_cluster=40)
+    selector = StreamingFrameSelector(n_clusters=4, n_components=8, chunk_size=32)
+    selector.add_frames(frames)
+    selected = selector.select(n_epochs=3, k_per_cluster=3)
+    assert len(selected) == len(set(selected)) == 12
+    assert sorted(idx // 40 for idx in selected) == [0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3]
+
+
+def test_selector_clusters_random_projections_of_large_frames():
+    frames = make_clustered_frames(n_clusters=4, n_per_cluster=40, shape=(60, 80, 3))
+    selector = StreamingFrameSelector(n_clusters=4, chunk_size=32, features='random_projection')
+    selector.add_frames(frames)
+    assert selector.fit_features().shape == (len(frames), 256)
+    assert sorted(idx // 40 for idx in selector.select(n_epochs=3)) == [0, 1, 2, 3]
+
+
+def test_selector_kmeans_steps_stop_on_convergence_time_budget_or_cancellation():
+    frames = make_clustered_frames(n_clusters=4, n_per_cluster=40)
+    selector = StreamingFrameSelector(n_clusters=4, n_components=5, chunk_size=32)
+    selector.add_frames(frames)
+    feature_steps = list(selector.iter_fit_features())
+    assert feature_steps[-1] == (5, 5)  # one step per chunk, the PCA having been fitted as the frames came in
+
+    steps = list(selector.iter_fit_kmeans(n_epochs=10, batch_size=32))
+    assert [step.iteration for step in steps] == list(range(1, 51))  # no early stopping unless asked for
+    assert not any(step.converged for step in steps)
+    assert len(selector.labels) == len(frames)
+
+    steps = list(selector.iter_fit_kmeans(n_epochs=10, batch_size=32, max_no_improvement=10))
+    assert steps[-1].converged and len(steps) < 50  # well-separated clusters stop improving long before 10 epochs
+
+    steps = list(selector.iter_fit_kmeans(n_epochs=10, batch_size=32, time_budget=0))
+    assert len(steps) == 1 and steps[0].out_of_time
+    assert len(selector.pick_frames()) == 4  # the clusters so far are still usable
+
+    selector.labels = None
+    kmeans = selector.iter_fit_kmeans(n_epochs=10, batch_size=32)
+    next(kmeans)
+    kmeans.close()  # cancelled
+    assert selector.labels is None
+
+    steps = list(selector.iter_fit_kmeans(n_epochs=3, batch_size=256))  # every frame fits in one mini-batch
+    assert steps[1].smoothed_inertia == pytest.approx((steps[0].inertia + steps[1].inertia) / 2)  # still smoothed over mini-batches
+
+
+def test_selector_spilling_frames_to_disk_selects_the_same_frames(tmp_path):
+    frames = make_clustered_frames(n_clusters=4, n_per_cluster=40)
+    in_memory = StreamingFrameSelector(n_clusters=4, n_components=8, chunk_size=32)
+    spilled = StreamingFrameSelector(n_clusters=4, n_components=8, chunk_size=32, spill_directory=tmp_path)
+    for selector in [in_memory, spilled]:
+        selector.add_frames(frames)
+    assert all(isinstance(chunk, np.memmap) for chunk in spilled.chunks)
+    assert np.array_equal(spilled.frames_at([0, 31, 32, 159]), frames[[0, 31, 32, 159]])
+    assert spilled.select(method='medoid') == in_memory.select(method='medoid')
+
+    del spilled, selector
+    assert not list(tmp_path.iterdir())  # the spilled chunks are deleted with the selector
+
+
+def test_medoids_are_computed_in_blocks_and_on_a_subsample_of_large_clusters():
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(300, 4)).astype(np.float32)
+    features[17] = 0  # the centre of the cloud, so clearly its medoid
+    labels = np.zeros(len(features), dtype=int)
+    assert pick_cluster_medoids(features, labels) == pick_cluster_medoids(features, labels, block_size=7) == [17]
+
+    subsampled = pick_cluster_medoids(features, labels, max_cluster_size=50)
+    assert subsampled == pick_cluster_medoids(features, labels, max_cluster_size=50)  # reproducible
+    assert np.linalg.norm(features[subsampled[0]]) < 1  # still near the centre
@@ -0,0 +1,190 @@
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import write_synthetic_video
+from core.video_processing import allocate_samples
+from readers import VideoReader
+from workflows import extract_frames, export_frames, read_frames_parallel, ExtractFramesResult, Crop, Progress, StageTiming, FeatureCache, CODECS, CODEC_QUALITY_RANGES
+from workflows.extract_frames import sample_frames_adaptively
+from workflows.project import Project, extract_frames_from_project
+
+
+def run_extract_frames(video_path, **kwargs) -> ExtractFramesResult:
+    steps = list(extract_frames(video_path=video_path, **kwargs))
+    result = steps[-1]
+    assert isinstance(result, ExtractFramesResult)
+    return result
+
+
+def test_extract_frames_returns_full_resolution_frames_at_sampled_video_indices(video_path):
+    video = VideoReader(filename=video_path)
+    result = run_extract_frames(video_path, crop=Crop(x0=10, x1=50, y0=5, y1=40), n_clusters=4, every_n=5, downsample_level=2)
+    
+    assert len(result.extracted_frame_indices) == 4
+    assert result.extracted_frame_indices == sorted(result.extracted_frame_indices)
+    assert all(idx % 5 == 0 for idx in result.extracted_frame_indices)
+    assert result.extracted_frames.shape == (4, video.frame_height, video.frame_width, 3)
+    for idx, frame in zip(result.extracted_frame_indices, result.extracted_frames):
+        assert np.array_equal(frame, next(video.read_frames_at([idx])))
+
+
+def test_extract_frames_reads_through_the_chosen_backend(video_path):
+    pytest.importorskip('av')
+    video = VideoReader(filename=video_path, backend='pyav')
+    result = run_extract_frames(video_path, crop=Crop(x0=10, x1=50, y0=5, y1=40), n_clusters=4, every_n=5, downsample_level=2, n_workers=2, backend='pyav')
+
+    assert len(result.extracted_frame_indices) == 4
+    for idx, frame in zip(result.extracted_frame_indices, result.extracted_frames):
+        assert np.array_equal(frame, next(video.read_frames_at([idx], max_grab=0)))
+
+
+def test_extract_frames_only_clusters_the_frames_that_differ_most_from_the_reference(video_path):
+    video = VideoReader(filename=video_path)
+    reference_frame = video.read_reference_frame(nframes_to_use=10)
+    steps = list(extract_frames(video_path=video_path, crop=Crop(x0=0, x1=64, y0=0, y1=48), n_clusters=3, every_n=2, downsample_level=2, keep_fraction=0.5, reference_frame=reference_frame))
+    result = steps[-1]
+
+    assert any(isinstance(step, Progress) and step.description.startswith('Motion Filter Kept 22/45') for step in steps)
+    assert len(result.sampled_frame_indices) == 22
+    assert set(result.extracted_frame_indices) <= set(result.sampled_frame_indices.tolist())
+
+
+def test_extract_frames_reports_the_time_spent_in_each_stage(video_path, tmp_path):
+    report_path, profile_path = tmp_path / 'run.json', tmp_path / 'run.prof'
+    steps = list(extract_frames(video_path=video_path, crop=Crop(x0=0, x1=64, y0=0, y1=48), n_clusters=3, every_n=5, report_path=report_path, profile_path=profile_path))
+    assert isinstance(steps[-1], ExtractFramesResult)
+
+    timings = {step.stage: step for step in steps if isinstance(step, StageTiming)}
+    assert list(timings) == ['decode_and_downsample', 'pack', 'pca', 'kmeans', 'pick_frames', 'gather']
+    n_batches = -(-len(range(0, len(VideoReader(filename=video_path)), 5)) // 32)
+    assert timings['decode_and_downsample'].calls == n_batches + 1  # one per batch of sampled frames, plus the call that finds the end
+    assert all(timing.seconds >= 0 and timing.peak_traced_bytes is not None for timing in timings.values())  # profiling traces memory
+
+    report = json.loads(report_path.read_text())
+    assert report['workflow'] == 'extract_frames'
+    assert report['settings']['n_clusters'] == 3
+    assert [stage['stage'] for stage in report['stages']] == list(timings)
+    assert profile_path.stat().st_size > 0
+
+
+def test_extract_frames_reports_kmeans_progress_and_keeps_its_clusters_when_out_of_time(video_path):
+    steps = list(extract_frames(video_path=video_path, crop=Crop(x0=0, x1=64, y0=0, y1=48), n_clusters=3, every_n=2, kmeans_time_budget=0))
+    descriptions = [step.description for step in steps if isinstance(step, Progress)]
+    assert any(description.startswith('KMeans Time Limit Reached after 1/') for description in descriptions)
+    assert len(steps[-1].extracted_frame_indices) == 3
+
+
+def test_adaptive_sampling_spends_the_budget_where_the_video_moves(tmp_path):
+    filename = write_synthetic_video(tmp_path / 'bursts.mp4', n_frames=300, width=64, height=48, still_fraction=0.8)
+    video = VideoReader(filename=filename)
+    frames = np.stack(list(video.read_frames(0, len(video))))
+    moving = np.r_[False, np.abs(np.diff(frames.astype(np.int16), axis=0)).max(axis=(1, 2, 3)) > 100]  # noise alone changes pixels by < 30
+
+    indices = sample_frames_adaptively(video, budget=100, crop=Crop(x0=0, x1=64, y0=0, y1=48), downsample_level=2)
+    assert len(indices) <= 100
+    assert moving[indices].mean() > 2 * moving.mean()
+
+
+def test_adaptive_sampling_only_samples_frames_the_video_can_decode(video_path, overcounting_video):
+    n_decodable = len(VideoReader(filename=video_path))
+    indices = sample_frames_adaptively(overcounting_video, budget=40, crop=Crop(x0=0, x1=64, y0=0, y1=48), downsample_level=2)
+    assert 0 < len(indices) <= 40
+    assert indices.max() < n_decodable
+
+
+def test_adaptive_sampling_needs_a_budget_of_at_least_one_frame(video_path):
+    with pytest.raises(ValueError):
+        run_extract_frames(video_path, crop=Crop(x0=0, x1=64, y0=0, y1=48), budget=0)
+    with pytest.raises(ValueError):
+        allocate_samples(np.array([0, 50]), change=np.array([1.]), budget=0)
+    assert allocate_samples(np.array([0]), change=np.array([]), budget=5).tolist() == [0]
+
+
+def test_project_extraction_clusters_frames_from_every_video_together(video_path, tmp_path):
+    other_video_path = write_synthetic_video(tmp_path / 'other.mp4', n_frames=60, width=80, height=64, seed=1)
+    project = Project()
+    project.add_video(str(video_path), crop=Crop(x0=0, x1=64, y0=0, y1=48))
+    project.add_video(str(other_video_path))  # whole frame, a different size
+    project.save(tmp_path / 'project.json')
+    project = Project.load(tmp_path / 'project.json')
+
+    steps = list(extract_frames_from_project(project, n_clusters=6, every_n=5, downsample_level=4, n_workers=2))
+    result = steps[-1]
+    assert len(result.extracted_frame_indices) == len(result.extracted_video_paths) == 6
+    assert set(result.extracted_video_paths) == {str(video_path), str(other_video_path)}
+    assert result.extracted_frames.shape == (6, 64, 80, 3)
+    for path, idx, frame in zip(result.extracted_video_paths, result.extracted_frame_indices, result.extracted_frames):
+        video = VideoReader(filename=path)
+        assert np.array_equal(frame[:video.frame_height, :video.frame_width], next(video.read_frames_at([idx])))
+        assert not frame[video.frame_height:].any()
+
+
+def test_parallel_read_returns_frames_in_order(video_path):
+    video = VideoReader(filename=video_path)
+    frame_indices = range(0, len(video), 3)
+    steps = list(read_frames_parallel(video_path=video_path, frame_indices=frame_indices, n_workers=2))
+    
+    progress = [step for step in steps if isinstance(step, Progress)]
+    assert progress[-1].value == progress[-1].max == len(frame_indices)
+    frames = np.concatenate([step for step in steps if isinstance(step, np.ndarray)])
+    expected = np.array(list(video.read_frames_at(frame_indices)))
+    assert np.array_equal(frames, expected)
+
+
+def test_extract_frames_reuses_cached_features_when_only_n_clusters_changes(video_path, tmp_path):
+    cache = FeatureCache(directory=tmp_path)
+    crop = Crop(x0=0, x1=64, y0=0, y1=48)
+    first_run = list(extract_frames(video_path=video_path, crop=crop, n_clusters=4, every_n=5, cache=cache))
+    second_run = list(extract_frames(video_path=video_path, crop=crop, n_clusters=6, every_n=5, cache=cache))
+    
+    assert not any('Cached' in step.description for step in first_run if isinstance(step, Progress))
+    assert any('Cached' in step.description for step in second_run if isinstance(step, Progress))
+    assert len(second_run[-1].extracted_frame_indices) == 6
+    
+    key = cache.make_key(video_path, crop=crop, downsample_level=3, every_n=5, grayscale=False)
+    assert key in cache
+    assert cache.make_key(video_path, crop=crop, downsample_level=3, every_n=6, grayscale=False) not in cache
+    cache.invalidate()
+    assert key not in cache
+
+
+def test_feature_cache_evicts_least_recently_used_entries(tmp_path):
+    cache = FeatureCache(directory=tmp_path, max_bytes=2500)
+    features = np.zeros((10, 100), dtype=np.uint8)
+    cache.save('a', [features])
+    cache.save('b', [features])
+    os.utime(tmp_path / 'a.npy', (0, 0))  # 'a' was used longest ago
+    cache.load('b')
+    cache.save('c', [features])
+
+    assert 'a' not in cache
+    assert 'b' in cache and 'c' in cache
+    assert cache.size_bytes() <= 2500
+
+
+def test_parallel_read_can_be_stopped_early(video_path):
+    workflow = read_frames_parallel(video_path=video_path, frame_indices=range(0, 90), n_workers=2)
+    assert isinstance(next(workflow), Progress)
+    workflow.close()  # what a cancelled background job does; must release the shared memory without raising
+
+
+def test_export_frames_writes_rgb_frames_in_every_codec(tmp_path):
+    frames = np.zeros((3, 8, 10, 3), dtype=np.uint8)
+    frames[..., 0] = 200  # pure red, which a BGR/RGB mixup would turn blue
+    for codec, (extension, _, _) in CODECS.items():
+        steps = list(export_frames(frames=frames, frame_indices=[4, 8, 15], directory=tmp_path / codec, name='video', codec=codec))
+        assert steps[-1].value == steps[-1].max == 3
+
+        filenames = sorted((tmp_path / codec).iterdir())
+        assert [f.name for f in filenames] == sorted(f"video__{idx}{extension}" for idx in [4, 8, 15])
+        red, green, blue = cv2.imread(str(filenames[0]))[..., ::-1].mean(axis=(0, 1))
+        assert red > 150 and blue < 50
+
+        low, high = CODEC_QUALITY_RANGES[codec]
+        assert low <= CODECS[codec][2] <= high
+        for quality in [low, high]:  # the ends of the range the GUI offers
+            list(export_frames(frames=frames, frame_indices=[4, 8, 15], directory=tmp_path / f"{codec}_{quality}", name='video', codec=codec, quality=quality))
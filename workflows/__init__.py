@@ -1,2 +1,8 @@
-from .misc import Progress
-from .extract_frames import extract_frames, ExtractFramesResult, Crop
\ No newline at end of file
+from .misc import Progress, StageTiming
+from .instrumentation import StageTimer, instrumented
+from .feature_cache import FeatureCache
+from .extract_frames import extract_frames, ExtractFramesResult, Crop
+from .parallel_read import read_frames_parallel
+from .project import Project, ProjectVideo, extract_frames_from_project
+from .export_frames import export_frames, frame_filename, CODECS, CODEC_QUALITY_RANGES
+from .export_dataset import export_labeled_frames_hdf5
\ No newline at end of file
@@ -0,0 +1,65 @@
+from pathlib import Path
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from workflows.misc import Progress
+
+
+def export_labeled_frames_hdf5(
+    filename: Path,
+    frames: np.ndarray,
+    frame_indices: Sequence[int],
+    labels: pd.DataFrame,
+    video_path: Optional[str] = None,
+    frame_video_paths: Optional[Sequence[str]] = None,
+    frame_sizes: Optional[Sequence[Tuple[int, int]]] = None,
+    compression: Optional[str] = 'lzf',
+) -> Iterable[Progress]:
+    """
+    Writes the selected frames and their labels to a single HDF5 file, yielding Progress as the frames are written:
+
+      - frames:          (n_frames, height, width, 3) uint8, one chunk per frame, so random frames can be read without decompressing others
+      - frame_indices:   (n_frames,) the index in the video of each frame
+      - frame_videos:    (n_frames,) the video of each frame; only written if *frame_video_paths* is given (frames from several videos)
+      - frame_sizes:     (n_frames, 2) the (height, width) of each frame's own video, which 'frames' is zero-padded beyond;
+                         only written if *frame_sizes* is given
+      - labels/frame:    the row in 'frames' each label belongs to (the labels table's FrameIndex, i.e. the position in the selected frames)
+      - labels/i, labels/j: the label coordinates
+      - labels/body_part: codes into labels/body_parts, the body part names
+
+    With *compression* set to None the frames are stored contiguously, so that readers can memory-map them (see readers.LabeledFramesReader).
+    Needs the optional 'h5py' package.
+    """
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError("Exporting to HDF5 needs the 'h5py' package: pip install h5py")
+    
+    yield Progress(value=0, max=len(frames), description='Exporting Labeled Frames...')
+    with h5py.File(filename, 'w') as f:
+        f.attrs['format_version'] = 1
+        if video_path is not None:
+            f.attrs['video_path'] = str(video_path)
+        
+        layout = dict(chunks=(1, *frames.shape[1:]), compression=compression) if compression is not None else {}
+        frames_dataset = f.create_dataset('frames', shape=frames.shape, dtype=np.uint8, **layout)
+        for idx, frame in enumerate(frames):
+            frames_dataset[idx] = frame
+            yield Progress(value=idx + 1, max=len(frames), description='Exporting Labeled Frames...')
+        f.create_dataset('frame_indices', data=np.asarray(frame_indices, dtype=np.int64))
+        if frame_video_paths is not None:
+            f.create_dataset('frame_videos', data=np.array([str(path) for path in frame_video_paths], dtype=object), dtype=h5py.string_dtype())
+        if frame_sizes is not None:
+            f.create_dataset('frame_sizes', data=np.asarray(frame_sizes, dtype=np.int64).reshape(-1, 2))
+
+        group = f.create_group('labels')
+        if not len(labels):
+            labels = pd.DataFrame({'FrameIndex': [], 'i': [], 'j': [], 'label': []})
+        body_parts = pd.Categorical(labels['label'].astype(str))
+        group.create_dataset('frame', data=labels['FrameIndex'].to_numpy(dtype=np.int64))
+        group.create_dataset('i', data=labels['i'].to_numpy(dtype=np.float64))
+        group.create_dataset('j', data=labels['j'].to_numpy(dtype=np.float64))
+        group.create_dataset('body_part', data=np.asarray(body_parts.codes, dtype=np.int16))
+        group.create_dataset('body_parts', data=np.array(body_parts.categories, dtype=object), dtype=h5py.string_dtype())
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+
+from workflows.misc import Progress
+
+
+# codec name: (file extension, cv2 quality flag, default quality)
+CODECS = {
+    'png': ('.png', cv2.IMWRITE_PNG_COMPRESSION, 3),  # compression level 0 (fastest, biggest) - 9 (slowest, smallest); always lossless
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 95),  # quality 0 - 100
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 101),  # quality 1 - 100 is lossy, above 100 is lossless
+}
+CODEC_QUALITY_RANGES = {'png': (0, 9), 'jpeg': (0, 100), 'webp': (1, 101)}  # the *quality* values each codec accepts, inclusive
+
+
+def frame_filename(name: str, frame_index: int, codec: str = 'png') -> str:
+    """
+    The file name export_frames() gives a frame.
+
+    Example
+    -------
+    >>> frame_filename('mouse1', 120, codec='jpeg')
+    'mouse1__120.jpg'
+    """
+    return f"{name}__{frame_index}{CODECS[codec][0]}"
+
+
+def write_image(filename: Path, frame: np.ndarray, params: List[int]) -> int:
+    """Writes an RGB frame, returning the number of bytes written. cv2 releases the GIL while encoding, so this runs well on a thread pool."""
+    if not cv2.imwrite(str(filename), cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), params):
+        raise IOError(f"Couldn't write '{filename}'.")
+    return os.path.getsize(filename)
+
+
+def export_frames(
+    frames: Sequence[np.ndarray],
+    frame_indices: Sequence[int],
+    directory: Path,
+    name: Union[str, Sequence[str]],
+    codec: str = 'png',
+    quality: Optional[int] = None,
+    n_threads: Optional[int] = None,
+) -> Iterable[Progress]:
+    """
+    Writes each RGB frame to *directory* as '<name>__<frame index><extension>', encoding them on *n_threads* threads,
+    and yields a Progress event as each file is written. *name* can also be one name per frame, e.g. when the frames come from several videos.
+    *quality* is the codec's own setting (see CODECS): the compression level for PNG, the quality for JPEG and WebP.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"codec must be one of {list(CODECS)}, not '{codec}'")
+    _, flag, default_quality = CODECS[codec]
+    params = [flag, default_quality if quality is None else quality]
+
+    names = [name] * len(frames) if isinstance(name, str) else list(name)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    yield Progress(value=0, max=len(frames), description='Exporting Frames...')
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        futures = [
+            pool.submit(write_image, directory.joinpath(frame_filename(frame_name, idx, codec=codec)), frame, params)
+            for frame_name, idx, frame in zip(names, frame_indices, frames)
+        ]
+        for n_done, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            yield Progress(value=n_done, max=len(frames), description='Exporting Frames...')
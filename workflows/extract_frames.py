@@ -1,13 +1,17 @@
 
-from dataclasses import dataclass
+from dataclasses import astuple, dataclass
+from functools import partial
 from pathlib import Path
-from typing import List, Union, Iterable
+from typing import Generator, List, Optional, Union, Iterable
 
 import numpy as np
 
 from readers import VideoReader
-from core.video_processing import downsample, select_subset_frames_kmeans, pca
-from workflows.misc import Progress
+from core.video_processing import StreamingFrameSelector, allocate_samples, downsample_batch, motion_energy, select_moving_frames
+from workflows.feature_cache import FeatureCache
+from workflows.instrumentation import StageTimer, instrumented
+from workflows.misc import Progress, StageTiming
+from workflows.parallel_read import read_frames_parallel
 
 
 @dataclass
@@ -22,43 +26,197 @@ class Crop:
 class ExtractFramesResult:
     extracted_frame_indices: List[int]
     extracted_frames: np.ndarray
+    sampled_frame_indices: Optional[np.ndarray] = None  # every frame that was clustered...
+    sampled_features: Optional[np.ndarray] = None  # ...and its PCA components, e.g. for a FrameSimilarityIndex
+    extracted_video_paths: Optional[List[str]] = None  # the video of each extracted frame, when selecting across several videos
+
+
+def crop_and_downsample(frame: np.ndarray, crop: Crop, downsample_level: int, grayscale: bool = False) -> np.ndarray:
+    frame_cropped = frame[crop.y0:crop.y1, crop.x0:crop.x1]
+    return downsample_batch(frame_cropped[np.newaxis], level=downsample_level, grayscale=grayscale)[0]
+
+
+def sample_frames_adaptively(video: VideoReader, budget: int, crop: Crop, downsample_level: int, coarse_fraction: float = 0.25) -> np.ndarray:
+    """
+    Returns up to *budget* frame indices, concentrated where the video changes instead of a fixed stride.
+    A coarse pass reads *budget* x *coarse_fraction* evenly spaced frames at half the clustering resolution, in grayscale;
+    the budget is then spread over the gaps between them in proportion to how much the frames at either end of each gap differ.
+    Coarse frames past the end of a video whose reported length is too long (as OpenCV's often is) are left out, like the gaps after them.
+    """
+    n_coarse = int(np.clip(budget * coarse_fraction, 2, len(video)))
+    coarse_indices = np.unique(np.arange(n_coarse) * len(video) // n_coarse)
+    coarse_frames = np.empty((len(coarse_indices), *video.converted_shape(roi=astuple(crop), scale=2 * downsample_level, color='gray')), dtype=np.uint8)
+    n_read = 0
+    try:
+        for batch in video.read_frames_at_into(coarse_indices, out=coarse_frames[:1].copy(), roi=astuple(crop), scale=2 * downsample_level, color='gray'):
+            coarse_frames[n_read] = batch[0]
+            n_read += 1
+    except IOError:
+        if not n_read:
+            raise
+    coarse_indices, coarse_frames = coarse_indices[:n_read], coarse_frames[:n_read]
+    if n_read < 2:  # nothing to compare
+        return allocate_samples(coarse_indices, change=np.empty(0), budget=budget)
+    change = motion_energy(coarse_frames[1:], coarse_frames[:-1])
+    change = np.maximum(change - np.percentile(change, 10), 0)  # sensor noise makes even still stretches "change" a little
+    return allocate_samples(coarse_indices, change=change, budget=budget)
+
+
+def cluster_and_pick_frames(
+    selector: StreamingFrameSelector,
+    timer: StageTimer,
+    selection: str = 'centroid',
+    frames_per_cluster: int = 1,
+    kmeans_time_budget: Optional[float] = None,
+    kmeans_max_no_improvement: Optional[int] = None,
+) -> Generator[Union[Progress, StageTiming], None, List[int]]:
+    """
+    Fits the selector's features and clusters, yielding a Progress for every chunk of frames and every KMeans mini-batch
+    (with the inertia, so it's visible whether the clustering is still improving), and returns the selected frames' positions in the selector.
+    KMeans stops early after *kmeans_time_budget* seconds with the clusters found so far, or, if *kmeans_max_no_improvement* is given,
+    once its smoothed inertia hasn't improved for that many mini-batches.
+    The workflow can be cancelled between any two chunks or mini-batches by closing it.
+    """
+    description = "Selecting Frames (PCA)..." if selector.features == 'pca' else "Selecting Frames (Random Projection)..."
+    for n_done, n_total in timer.timed_iter(selector.features, selector.iter_fit_features()):
+        yield Progress(value=n_done, max=n_total, description=description)
+    yield from timer.timings(selector.features)
+
+    for step in timer.timed_iter('kmeans', selector.iter_fit_kmeans(time_budget=kmeans_time_budget, max_no_improvement=kmeans_max_no_improvement)):
+        if step.converged:
+            description = f"KMeans Converged after {step.iteration} Mini-Batches (Inertia {step.smoothed_inertia:.4g})..."
+        elif step.out_of_time:
+            description = f"KMeans Time Limit Reached after {step.iteration}/{step.n_iterations} Mini-Batches (Inertia {step.smoothed_inertia:.4g})..."
+        else:
+            description = f"Selecting Frames (KMeans, Inertia {step.smoothed_inertia:.4g})..."
+        yield Progress(value=step.n_iterations if step.converged else step.iteration, max=step.n_iterations, description=description)
+    yield from timer.timings('kmeans')
+    with timer.stage('pick_frames'):
+        selected = selector.pick_frames(method=selection, k_per_cluster=frames_per_cluster)
+    yield from timer.timings('pick_frames')
+    return selected
+
+
+@instrumented
+def extract_frames(video_path: Path, crop: Crop, n_clusters: int = 20, every_n: int = 30, downsample_level: int = 3, n_workers: int = 1, cache: Optional[FeatureCache] = None, grayscale: bool = False, batch_size: int = 32, selection: str = 'centroid', frames_per_cluster: int = 1, random_state: Optional[int] = 0, keep_fraction: float = 1.0, reference_frame: Optional[np.ndarray] = None, budget: Optional[int] = None, features: str = 'pca', kmeans_time_budget: Optional[float] = None, kmeans_max_no_improvement: Optional[int] = None, spill_directory: Optional[Path] = None, backend: Optional[str] = None) -> Iterable[Union[Progress, StageTiming, ExtractFramesResult]]:
+    """
+    Streams the video once, keeping only the cropped, downsampled version of every *every_n*-th frame for clustering
+    (PCA is fitted incrementally as the frames come in), then re-reads just the selected frames at full resolution.
+    Peak memory grows with the downsampled size, not the raw frame size, times the number of sampled frames;
+    pass a *spill_directory* to keep the downsampled frames there on disk instead (see StreamingFrameSelector), for flat memory.
+    Only the crop of each frame is downsampled (area-averaged, as cv2.INTER_AREA), optionally to *grayscale*, into a reused buffer of *batch_size* frames.
+    The extracted frame indices are positions in the video, in ascending order.
+    With *n_workers* > 1, decoding is split over that many processes.
+    If a *cache* is given, the downsampled frames are saved to it, and loaded from it instead of decoding the video on later runs
+    with the same video and crop/downsample/every_n settings.
+    From each cluster, *frames_per_cluster* frames are taken, the first chosen by *selection* ('centroid', 'medoid' or 'random');
+    with a fixed *random_state*, the same settings always give the same frames.
+    With *keep_fraction* < 1, only that fraction of the sampled frames, the ones that differ most from the background, are clustered,
+    so long static stretches don't crowd out the frames where something happens. The background is *reference_frame*
+    (uncropped, full resolution) if given, otherwise the median of the sampled frames.
+    With a frame *budget*, *every_n* is ignored: that many frames are sampled where the video changes most (see sample_frames_adaptively).
+    *features* is 'pca', or 'random_projection' for a much cheaper (if rougher) reduction when the downsampled frames are still large.
+    Clustering reports its progress mini-batch by mini-batch, and stops early after *kmeans_time_budget* seconds
+    or, with *kmeans_max_no_improvement*, once it converges (see cluster_and_pick_frames).
+    *backend* picks the VideoReader backend (e.g. 'pyav' for frame-accurate seeking); by default it's chosen by file type.
+
+    A StageTiming event is yielded as each stage finishes: 'adaptive_sampling', 'cache_load', 'decode_and_downsample'
+    (decoding each frame, then cropping, downsampling and converting only the crop),
+    'pack' (copying downsampled frames into chunks, including the incremental PCA fit of each full chunk), 'cache_save', 'motion_filter', 'pca' or 'random_projection'
+    (fitting the features), 'kmeans', 'pick_frames' (choosing frames from the clusters) and 'gather' (re-reading the selected frames). Pass *report_path* to also write them to a JSON run report,
+    and *profile_path* to run under cProfile (see workflows.instrumentation).
+    """
+
+    if budget is not None and budget < 1:
+        raise ValueError(f"budget must be at least 1 frame, not {budget}")
+    video = VideoReader(filename=video_path, backend=backend)
+    timer = StageTimer()
 
-
-
-
-def extract_frames(video_path: Path, crop: Crop, n_clusters: int = 20, every_n: int = 30, downsample_level: int = 3) -> Iterable[Union[Progress, ExtractFramesResult]]:
-
-    video = VideoReader(filename=video_path)
-
     
-    yield Progress(value=0, max=2, description='Reading Frames from File...')
-    frames = []
-    for idx, frame in enumerate(video.read_frames(step=every_n)):
-        frames.append(frame)
-        yield Progress(value=idx, max=int(len(video) // every_n), description='Reading Frames from File...')
-
-
-    yield Progress(value=0, max=len(frames), description='Downsampling Frames for Quicker Analysis...')
-    frames_to_cluster = []
-    for idx, frame in enumerate(frames):
-        frame_cropped = frame[crop.y0:crop.y1, crop.x0:crop.x1]
-        frame = downsample(frame_cropped, level=downsample_level)
-        frames_to_cluster.append(frame)
-        yield Progress(value=idx, max=len(frames), description='Downsampling Frames for Quicker Analysis...')
+    sampling = {'every_n': every_n} if budget is None else {'budget': budget}
+    if backend is not None:
+        sampling['backend'] = backend  # backends can disagree on which frame is at an index, so they don't share cache entries
+    cache_key = cache.make_key(video_path, crop=crop, downsample_level=downsample_level, grayscale=grayscale, **sampling) if cache is not None else None
+    index_key = cache.make_key(video_path, crop=crop, downsample_level=downsample_level, **sampling, contents='frame_indices') if cache is not None else None
+    cached_indices = cache.load(index_key) if cache is not None and budget is not None else None
+    if budget is None:
+        frame_indices = range(0, len(video), every_n)
+    elif cached_indices is not None:
+        frame_indices = np.asarray(cached_indices)
+    else:
+        yield Progress(value=0, max=2, description='Finding Where the Video Changes...')
+        with timer.stage('adaptive_sampling'):
+            frame_indices = sample_frames_adaptively(video, budget=budget, crop=crop, downsample_level=downsample_level)
+        yield from timer.timings('adaptive_sampling')
+
+    yield Progress(value=0, max=2, description='Reading and Downsampling Frames...')
+    filter_motion = keep_fraction < 1
+    selector = StreamingFrameSelector(n_clusters=n_clusters, random_state=random_state, fit_while_adding=not filter_motion, features=features, spill_directory=spill_directory)
+    transform = partial(crop_and_downsample, crop=crop, downsample_level=downsample_level, grayscale=grayscale)
+    cached_frames = cache.load(cache_key) if cache is not None and (budget is None or cached_indices is not None) else None
+    if cached_frames is not None:
+        yield Progress(value=1, max=2, description='Loading Cached Downsampled Frames...')
+        with timer.stage('cache_load'):
+            selector.add_frames(cached_frames)
+    elif n_workers > 1:
+        steps = read_frames_parallel(video_path=video_path, frame_indices=frame_indices, transform=transform, n_workers=n_workers, backend=backend)
+        for step in timer.timed_iter('decode_and_downsample', steps):
+            if isinstance(step, Progress):
+                yield step._replace(description='Reading and Downsampling Frames...')
+            else:
+                with timer.stage('pack'):
+                    selector.add_frames(step)
+    else:
+        # Only the crop of each frame is converted and downsampled, straight into one reused batch buffer
+        color = 'gray' if grayscale else 'rgb'
+        batch = np.empty((batch_size, *video.converted_shape(roi=astuple(crop), scale=downsample_level, color=color)), dtype=np.uint8)
+        batches = video.read_frames_at_into(frame_indices, out=batch, roi=astuple(crop), scale=downsample_level, color=color)
+        n_read = 0
+        for frames in timer.timed_iter('decode_and_downsample', batches):
+            with timer.stage('pack'):
+                selector.add_frames(frames)  # PCA is fitted incrementally as chunks fill up
+            n_read += len(frames)
+            yield Progress(value=n_read, max=len(frame_indices), description='Reading and Downsampling Frames...')
+    yield from timer.timings('cache_load', 'decode_and_downsample', 'pack')
+    
+    if cache is not None and cached_frames is None:
+        yield Progress(value=2, max=2, description='Saving Downsampled Frames to Cache...')
+        with timer.stage('cache_save'):
+            cache.save(cache_key, selector.chunks)
+            if budget is not None:
+                cache.save(index_key, [frame_indices])
+        yield from timer.timings('cache_save')
     
+    sampled_frame_indices = np.asarray(frame_indices)
+    if filter_motion:
+        with timer.stage('motion_filter'):
+            if reference_frame is not None:
+                background = crop_and_downsample(reference_frame, crop=crop, downsample_level=downsample_level, grayscale=grayscale)
+            else:
+                n_frames = len(selector)
+                background = np.median(selector.frames_at(np.linspace(0, n_frames - 1, min(n_frames, 200)).astype(int)), axis=0)
+            energies = np.concatenate([motion_energy(chunk, background) for chunk in selector.chunks])
+            keep = select_moving_frames(energies, keep_fraction=keep_fraction, min_frames=n_clusters * frames_per_cluster)
+            selector = selector.subset(keep)
+            sampled_frame_indices = sampled_frame_indices[keep]
+        yield Progress(value=len(keep), max=len(energies), description=f'Motion Filter Kept {len(keep)}/{len(energies)} Frames ({len(keep) / len(energies):.0%})...')
+        yield from timer.timings('motion_filter')
 
     # Extract only a Selection of Frames after clustering them using KMeans
-    n_steps = 4
-    yield Progress(value=1, max=n_steps, description="Packing Read frames into Array for Analysis....")
-    frames_to_cluster = np.array(frames_to_cluster)
-    yield Progress(value=2, max=n_steps, description="Selecting Frames (PCA)...")
-    frame_components = pca(frames_to_cluster)
-    yield Progress(value=3, max=n_steps, description="Selecting Frames (KMeans)...")
-    selected_frame_indices = select_subset_frames_kmeans(frames=frame_components, n_clusters=n_clusters)
-    yield Progress(value=4, max=n_steps, description="Done!")
+    selected_samples = yield from cluster_and_pick_frames(selector, timer, selection=selection, frames_per_cluster=frames_per_cluster, kmeans_time_budget=kmeans_time_budget, kmeans_max_no_improvement=kmeans_max_no_improvement)
+    selected_frame_indices = sorted(int(sampled_frame_indices[sample]) for sample in selected_samples)
+    n_steps = 2
+    yield Progress(value=1, max=n_steps, description="Re-reading Selected Frames at Full Resolution...")
+    frame_dtype = np.dtype((np.uint8, (video.frame_height, video.frame_width, 3)))
+    with timer.stage('gather'):
+        extracted_frames = np.fromiter(video.read_frames_at(selected_frame_indices), dtype=frame_dtype, count=len(selected_frame_indices))  # fills one array, no list copy
+    yield from timer.timings('gather')
+    yield Progress(value=2, max=n_steps, description="Done!")
 
     # Update model
     yield ExtractFramesResult(
         extracted_frame_indices = selected_frame_indices,
-        extracted_frames = np.array([frames[idx] for idx in selected_frame_indices]),
+        extracted_frames = extracted_frames,
+        sampled_frame_indices = sampled_frame_indices[:len(selector.components)],
+        sampled_features = selector.components,
     )
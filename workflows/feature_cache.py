@@ -0,0 +1,84 @@
+from hashlib import sha1
+import json
+import os
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'frame_label_exporter' / 'features'
+
+
+class FeatureCache:
+    """
+    A directory of downsampled feature matrices, saved as .npy files and loaded back memory-mapped.
+    Entries are keyed on the video's path, size and modification time plus the settings that produced them,
+    so changing the video or the crop/downsample/sampling settings misses the cache, while changing only the clustering hits it.
+    The total size is kept under *max_bytes* by deleting the least-recently-used entries.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR, max_bytes: int = 4 * 1024 ** 3) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(video_path: Path, **settings) -> str:
+        """Returns a hash of the video file's identity (path, size, mtime) and the given settings."""
+        stat = os.stat(video_path)
+        identity = {
+            'video': str(Path(video_path).resolve()), 
+            'size': stat.st_size, 
+            'mtime_ns': stat.st_mtime_ns, 
+            **{name: value if isinstance(value, (int, float, str)) else repr(value) for name, value in settings.items()},
+        }
+        return sha1(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npy"
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def load(self, key: str) -> Optional[np.ndarray]:
+        """Returns the cached features memory-mapped read-only, or None if they aren't cached."""
+        path = self._path(key)
+        if not path.exists():
+            return None
+        os.utime(path)  # marks the entry as recently used
+        return np.load(path, mmap_mode='r')
+
+    def save(self, key: str, chunks: Sequence[np.ndarray]) -> None:
+        """Writes the concatenation of *chunks* (arrays of frames, all with the same frame shape) without building it in memory."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        n_frames = sum(len(chunk) for chunk in chunks)
+        tmp_path = self._path(key).with_suffix('.tmp')
+        features = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=chunks[0].dtype, shape=(n_frames, *chunks[0].shape[1:]))
+        start = 0
+        for chunk in chunks:
+            features[start:start + len(chunk)] = chunk
+            start += len(chunk)
+        features.flush()
+        del features
+        os.replace(tmp_path, self._path(key))  # so an interrupted write never looks like a finished entry
+        self.evict()
+
+    def size_bytes(self) -> int:
+        return sum(path.stat().st_size for path in self.directory.glob('*.npy'))
+
+    def evict(self) -> None:
+        """Deletes least-recently-used entries until the cache fits in *max_bytes*."""
+        paths = sorted(self.directory.glob('*.npy'), key=lambda path: path.stat().st_mtime)
+        total = sum(path.stat().st_size for path in paths)
+        for path in paths:
+            if total <= self.max_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink()
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Deletes the entry for *key*, or every entry if no key is given."""
+        paths = [self._path(key)] if key is not None else self.directory.glob('*.npy')
+        for path in paths:
+            if path.exists():
+                path.unlink()
@@ -0,0 +1,174 @@
+"""
+Stage timing, memory tracking and profiling for the workflows.
+
+Workflows time their stages with a StageTimer and yield a StageTiming event (next to their Progress events) as each stage finishes.
+Wrapping a workflow function with @instrumented lets callers ask for a JSON run report (report_path=...) and a cProfile dump
+(profile_path=...); setting the FRAME_EXTRACTION_PROFILE_DIR environment variable turns on both, plus tracemalloc, for every run,
+so slow or memory-hungry runs can be investigated without editing code.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime
+from functools import wraps
+import json
+import os
+from pathlib import Path
+import sys
+from time import perf_counter
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+from workflows.misc import StageTiming
+
+
+PROFILE_DIR_ENV_VAR = 'FRAME_EXTRACTION_PROFILE_DIR'
+
+T = TypeVar('T')
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """The peak resident memory of this process so far, or None where the OS doesn't say."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # macOS reports bytes, Linux kilobytes
+
+
+class StageTimer:
+    """
+    Accumulates the wall time spent in named stages, which can be entered many times (e.g. once per frame).
+    If tracemalloc is running, also records the peak traced memory within each stage.
+
+    Example
+    -------
+    >>> timer = StageTimer()
+    >>> for _ in timer.timed_iter('decode', range(3)):
+    ...     with timer.stage('downsample'):
+    ...         pass
+    >>> [(timing.stage, timing.calls) for timing in timer.timings('decode', 'downsample', 'pca')]
+    [('decode', 4), ('downsample', 3)]
+    """
+
+    def __init__(self) -> None:
+        self._seconds: Dict[str, float] = OrderedDict()
+        self._calls: Dict[str, int] = {}
+        self._peak_traced: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self._seconds[name] = self._seconds.get(name, 0.) + perf_counter() - t0
+            self._calls[name] = self._calls.get(name, 0) + 1
+            if tracing:
+                self._peak_traced[name] = max(self._peak_traced.get(name, 0), tracemalloc.get_traced_memory()[1])
+
+    def timed_iter(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Yields from *iterable*, counting the time spent producing each item (e.g. decoding a frame) towards stage *name*."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def timings(self, *names: str) -> List[StageTiming]:
+        """Returns the StageTiming of each of the named stages that has run."""
+        rss = peak_rss_bytes()
+        return [
+            StageTiming(stage=name, seconds=self._seconds[name], calls=self._calls[name], peak_traced_bytes=self._peak_traced.get(name), peak_rss_bytes=rss)
+            for name in names if name in self._seconds
+        ]
+
+
+def to_jsonable(value: Any) -> Any:
+    return value if isinstance(value, (int, float, str, bool, type(None))) else repr(value)
+
+
+def write_run_report(filename: Path, workflow: str, settings: Dict[str, Any], timings: List[StageTiming], total_seconds: float) -> None:
+    report = {
+        'workflow': workflow,
+        'finished': datetime.now().isoformat(timespec='seconds'),
+        'settings': {name: to_jsonable(value) for name, value in settings.items()},
+        'total_seconds': total_seconds,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'stages': [timing._asdict() for timing in timings],
+    }
+    filename = Path(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    filename.write_text(json.dumps(report, indent=2))
+
+
+def reported(workflow: Iterable, filename: Path, name: str, settings: Dict[str, Any]) -> Iterator:
+    """Passes the workflow's steps through, collecting its StageTiming events, and writes them to a JSON run report when it finishes."""
+    timings = []
+    t0 = perf_counter()
+    for step in workflow:
+        if isinstance(step, StageTiming):
+            timings.append(step)
+        yield step
+    write_run_report(filename, workflow=name, settings=settings, timings=timings, total_seconds=perf_counter() - t0)
+
+
+def profiled(workflow: Iterable, filename: Path) -> Iterator:
+    """
+    Runs the workflow under cProfile (and tracemalloc, so stage timings include memory), dumping the stats to *filename* when it finishes.
+    Only the workflow's own steps are profiled, not the caller's work between them. View the dump with e.g. snakeviz or pstats.
+    """
+    profile = cProfile.Profile()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    iterator = iter(workflow)
+    try:
+        while True:
+            profile.enable()
+            try:
+                step = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                profile.disable()
+            yield step
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(str(filename))
+
+
+def instrumented(workflow_function: Callable[..., Iterable]) -> Callable[..., Iterable]:
+    """
+    Adds *report_path* and *profile_path* keyword arguments to a workflow function (a generator function yielding StageTiming events);
+    if the FRAME_EXTRACTION_PROFILE_DIR environment variable is set, both default to time-stamped files in that directory.
+    """
+    @wraps(workflow_function)
+    def wrapper(*args, report_path: Optional[Path] = None, profile_path: Optional[Path] = None, **kwargs) -> Iterable:
+        profile_dir = os.environ.get(PROFILE_DIR_ENV_VAR)
+        if profile_dir:
+            stem = Path(profile_dir) / f"{workflow_function.__name__}-{datetime.now():%Y%m%d-%H%M%S-%f}"
+            report_path = report_path or stem.with_suffix('.json')
+            profile_path = profile_path or stem.with_suffix('.prof')
+
+        workflow = workflow_function(*args, **kwargs)
+        if profile_path is not None:
+            workflow = profiled(workflow, filename=profile_path)
+        if report_path is not None:
+            settings = {f"arg{idx}": arg for idx, arg in enumerate(args)}
+            settings.update(kwargs)
+            workflow = reported(workflow, filename=report_path, name=workflow_function.__name__, settings=settings)
+        return workflow
+    return wrapper
@@ -1,7 +1,16 @@
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 
 
 class Progress(NamedTuple):
     value: int
     max: int
     description: str = ''
+
+
+class StageTiming(NamedTuple):
+    """How long one stage of a workflow took in total, over how many calls, and how much memory it used (None where not measured)."""
+    stage: str
+    seconds: float
+    calls: int = 1
+    peak_traced_bytes: Optional[int] = None  # only while tracemalloc is running
+    peak_rss_bytes: Optional[int] = None  # the process's peak so far, when the stage finished
@@ -0,0 +1,109 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import os
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from readers import VideoReader
+from workflows.misc import Progress
+
+
+def no_transform(frame: np.ndarray) -> np.ndarray:
+    return frame
+
+
+def split_into_segments(n_items: int, n_segments: int) -> Sequence[Tuple[int, int]]:
+    """
+    Returns (start, stop) bounds of up to *n_segments* contiguous, near-equal segments covering *n_items*.
+
+    Examples:
+
+    >>> split_into_segments(10, 3)
+    [(0, 3), (3, 7), (7, 10)]
+    >>> split_into_segments(2, 4)
+    [(0, 1), (1, 2)]
+    """
+    bounds = np.linspace(0, n_items, min(n_segments, n_items) + 1).round().astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _read_segment_into_shared_memory(
+    video_path: Path, 
+    frame_indices: Sequence[int], 
+    transform: Callable[[np.ndarray], np.ndarray], 
+    shm_name: str, 
+    shape: Tuple[int, ...], 
+    dtype: np.dtype, 
+    start: int,
+    backend: Optional[str] = None,
+) -> int:
+    """Worker: decodes one contiguous segment with its own VideoCapture and writes the transformed frames into the shared output array."""
+    shm = SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        video = VideoReader(filename=video_path, backend=backend)
+        for offset, frame in enumerate(video.read_frames_at(frame_indices)):
+            out[start + offset] = transform(frame)
+        video.close()
+        del out  # the buffer can't be closed while a view still exists
+    finally:
+        shm.close()
+    return len(frame_indices)
+
+
+def read_frames_parallel(
+    video_path: Path, 
+    frame_indices: Sequence[int], 
+    transform: Callable[[np.ndarray], np.ndarray] = no_transform, 
+    n_workers: Optional[int] = None,
+    segments_per_worker: int = 4,
+    backend: Optional[str] = None,
+) -> Iterable[Union[Progress, np.ndarray]]:
+    """
+    Decodes *frame_indices* in worker processes, each with its own VideoCapture on a contiguous segment of the indices.
+    *transform* (which must be picklable, e.g. a module-level function or a functools.partial of one) is applied in the workers,
+    and its outputs are written straight into a shared-memory array rather than being pickled back.
+    Every worker opens the video with the same reader *backend* (by default, chosen by file type).
+
+    Yields Progress events while the workers run, and arrays of consecutive transformed frames, in frame order, as soon as 
+    every segment before them has finished.
+    """
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    n_frames = len(frame_indices)
+    if n_frames == 0:
+        return
+    
+    video = VideoReader(filename=video_path, backend=backend)
+    first_frame = transform(next(video.read_frames_at(frame_indices[:1])))
+    video.close()
+    shape = (n_frames, *first_frame.shape)
+    shm = SharedMemory(create=True, size=max(int(np.prod(shape)) * first_frame.dtype.itemsize, 1))
+    out = np.ndarray(shape, dtype=first_frame.dtype, buffer=shm.buf)
+    pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context('spawn'))
+    try:
+        segments = split_into_segments(n_frames, n_segments=n_workers * segments_per_worker)
+        finished = [False] * len(segments)
+        n_yielded_segments = 0
+        n_done = 0
+        yield Progress(value=0, max=n_frames, description='Reading Frames from File...')
+        futures = {
+            pool.submit(_read_segment_into_shared_memory, video_path, frame_indices[start:stop], transform, shm.name, shape, first_frame.dtype, start, backend): segment_idx
+            for segment_idx, (start, stop) in enumerate(segments)
+        }
+        for future in as_completed(futures):
+            n_done += future.result()
+            finished[futures[future]] = True
+            yield Progress(value=n_done, max=n_frames, description='Reading Frames from File...')
+            while n_yielded_segments < len(segments) and finished[n_yielded_segments]:
+                start, stop = segments[n_yielded_segments]
+                yield out[start:stop].copy()  # copied, since the shared memory is released once reading is done
+                n_yielded_segments += 1
+    finally:
+        # Also runs when the consumer stops early (e.g. a cancelled job closes this generator): segments that haven't started are dropped.
+        pool.shutdown(wait=True, cancel_futures=True)
+        del out  # the buffer can't be closed while a view still exists
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,223 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import asdict, astuple, dataclass, field
+import json
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from readers import VideoReader
+from core.video_processing import StreamingFrameSelector, downsampled_shape
+from workflows.extract_frames import Crop, ExtractFramesResult, cluster_and_pick_frames
+from workflows.feature_cache import FeatureCache
+from workflows.instrumentation import StageTimer, instrumented
+from workflows.misc import Progress, StageTiming
+
+
+@dataclass
+class ProjectVideo:
+    path: str
+    crop: Optional[Crop] = None  # None means the whole frame
+
+
+@dataclass
+class Project:
+    """
+    The videos of a dataset and the crop to use for each, so frames can be selected jointly across all of them.
+
+    Example
+    -------
+    >>> project = Project()
+    >>> project.add_video('a.avi', crop=Crop(x0=0, x1=100, y0=0, y1=80))
+    >>> project.add_video('b.avi')
+    >>> project.add_video('a.avi', crop=Crop(x0=10, x1=100, y0=0, y1=80))  # replaces the first entry's crop
+    >>> [(video.path, video.crop.x0 if video.crop else None) for video in project.videos]
+    [('a.avi', 10), ('b.avi', None)]
+    """
+    videos: List[ProjectVideo] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+    def add_video(self, path: str, crop: Optional[Crop] = None) -> None:
+        """Adds a video, or updates its crop if it's already in the project."""
+        for video in self.videos:
+            if video.path == str(path):
+                video.crop = crop
+                return
+        self.videos.append(ProjectVideo(path=str(path), crop=crop))
+
+    def remove_video(self, path: str) -> None:
+        self.videos = [video for video in self.videos if video.path != str(path)]
+
+    def save(self, filename: Path) -> None:
+        Path(filename).write_text(json.dumps(asdict(self), indent=2))
+
+    @classmethod
+    def load(cls, filename: Path) -> 'Project':
+        data = json.loads(Path(filename).read_text())
+        return cls(videos=[
+            ProjectVideo(path=video['path'], crop=Crop(**video['crop']) if video['crop'] is not None else None)
+            for video in data['videos']
+        ])
+
+
+def read_frame_size(video_path: str, backend: Optional[str] = None) -> Tuple[int, int]:
+    """The (height, width) of a video's frames, closing the video again straight away."""
+    video = VideoReader(filename=video_path, backend=backend)
+    try:
+        return video.frame_height, video.frame_width
+    finally:
+        video.close()
+
+
+def read_downsampled_video(
+    video_path: str,
+    crop: Crop,
+    every_n: int,
+    downsample_level: int,
+    grayscale: bool,
+    feature_shape: Tuple[int, int],
+    cache: Optional[FeatureCache] = None,
+    backend: Optional[str] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the indices and the cropped, downsampled versions of every *every_n*-th frame of one video, resized to *feature_shape* (height, width)
+    so that frames from differently-sized videos or crops can be clustered together. Runs in a worker process.
+    Uses the same cache entries as extract_frames, so videos already processed on their own aren't decoded again.
+    """
+    video = VideoReader(filename=video_path, backend=backend)
+    frame_indices = np.arange(0, len(video), every_n)
+    reader_settings = {'backend': backend} if backend is not None else {}  # as extract_frames keys them
+    cache_key = cache.make_key(video_path, crop=crop, downsample_level=downsample_level, grayscale=grayscale, every_n=every_n, **reader_settings) if cache is not None else None
+    frames = cache.load(cache_key) if cache is not None else None
+    if frames is None:
+        color = 'gray' if grayscale else 'rgb'
+        frames = np.empty((len(frame_indices), *video.converted_shape(roi=astuple(crop), scale=downsample_level, color=color)), dtype=np.uint8)
+        for _ in video.read_frames_at_into(frame_indices, out=frames, roi=astuple(crop), scale=downsample_level, color=color):
+            pass  # a single batch, filled in place
+        if cache is not None:
+            cache.save(cache_key, [frames])
+    video.close()
+
+    height, width = feature_shape
+    if frames.shape[1:3] != (height, width):
+        frames = np.stack([cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA).reshape(height, width, -1) for frame in frames])
+    return frame_indices[:len(frames)], np.asarray(frames)
+
+
+@instrumented
+def extract_frames_from_project(
+    project: Project,
+    n_clusters: int = 20,
+    every_n: int = 30,
+    downsample_level: int = 3,
+    n_workers: int = 1,
+    cache: Optional[FeatureCache] = None,
+    grayscale: bool = False,
+    selection: str = 'centroid',
+    frames_per_cluster: int = 1,
+    random_state: Optional[int] = 0,
+    features: str = 'pca',
+    kmeans_time_budget: Optional[float] = None,
+    kmeans_max_no_improvement: Optional[int] = None,
+    spill_directory: Optional[Path] = None,
+    backend: Optional[str] = None,
+) -> Iterable[Union[Progress, StageTiming, ExtractFramesResult]]:
+    """
+    Selects frames jointly across every video in the *project*: each video's every *every_n*-th frame is cropped and downsampled
+    (by *n_workers* processes, one video each), they are all clustered together, and frames are picked from each cluster
+    as in extract_frames (stopping KMeans early after *kmeans_time_budget* seconds or *kmeans_max_no_improvement* mini-batches, if given).
+    So the selection is diverse across the whole dataset, rather than within each video.
+
+    Only *n_workers* videos are decoded at once, and each is opened only while it's being read, so open files don't grow with the project.
+    The downsampled frames of every video are kept for clustering, so memory grows with the total number of sampled frames;
+    pass a *spill_directory* to keep them there on disk instead (see StreamingFrameSelector), for memory that doesn't grow with the project.
+    All downsampled frames are resized to the first video's downsampled crop, so they can be compared.
+    The result's extracted_video_paths and extracted_frame_indices say which video and frame each extracted frame came from.
+    Frames are re-read at full resolution; frames from videos smaller than the largest are zero-padded at the bottom and right,
+    so that label coordinates are still pixel coordinates in their own video.
+    Every video is read with the same reader *backend* (by default, chosen by each file's type).
+    Like extract_frames, yields a StageTiming event after each stage ('read_videos', 'pack', then the feature fit, 'kmeans', 'pick_frames' and 'gather')
+    and accepts *report_path* and *profile_path*.
+    """
+    if not len(project):
+        raise ValueError("The project has no videos.")
+    frame_sizes = [read_frame_size(video.path, backend=backend) for video in project.videos]
+    crops = [video.crop or Crop(x0=0, x1=width, y0=0, y1=height) for video, (height, width) in zip(project.videos, frame_sizes)]
+    feature_shape = downsampled_shape((crops[0].y1 - crops[0].y0, crops[0].x1 - crops[0].x0, 3), level=downsample_level, grayscale=grayscale)[:2]
+
+    selector = StreamingFrameSelector(n_clusters=n_clusters, random_state=random_state, features=features, spill_directory=spill_directory)
+    timer = StageTimer()
+    sample_videos: List[np.ndarray] = []
+    sample_frame_indices: List[np.ndarray] = []
+    description = 'Reading and Downsampling Videos...'
+    yield Progress(value=0, max=len(project), description=description)
+
+    jobs = [
+        (video.path, crop, every_n, downsample_level, grayscale, feature_shape, cache, backend)
+        for video, crop in zip(project.videos, crops)
+    ]
+    if n_workers > 1:
+        pool = ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context('spawn'))
+        try:
+            pending: Dict[Future, int] = {}
+            next_job = 0
+            n_done = 0
+            while n_done < len(jobs):
+                while next_job < len(jobs) and len(pending) < n_workers:  # only n_workers videos' frames are ever in flight
+                    pending[pool.submit(read_downsampled_video, *jobs[next_job])] = next_job
+                    next_job += 1
+                with timer.stage('read_videos'):
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    video_idx = pending.pop(future)
+                    frame_indices, frames = future.result()
+                    with timer.stage('pack'):
+                        selector.add_frames(frames)
+                    sample_videos.append(np.full(len(frame_indices), video_idx))
+                    sample_frame_indices.append(frame_indices)
+                    n_done += 1
+                    yield Progress(value=n_done, max=len(jobs), description=description)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    else:
+        for video_idx, job in enumerate(jobs):
+            with timer.stage('read_videos'):
+                frame_indices, frames = read_downsampled_video(*job)
+            with timer.stage('pack'):
+                selector.add_frames(frames)
+            sample_videos.append(np.full(len(frame_indices), video_idx))
+            sample_frame_indices.append(frame_indices)
+            yield Progress(value=video_idx + 1, max=len(jobs), description=description)
+    yield from timer.timings('read_videos', 'pack')
+    sample_videos = np.concatenate(sample_videos)
+    sample_frame_indices = np.concatenate(sample_frame_indices)
+
+    selected_samples = yield from cluster_and_pick_frames(selector, timer, selection=selection, frames_per_cluster=frames_per_cluster, kmeans_time_budget=kmeans_time_budget, kmeans_max_no_improvement=kmeans_max_no_improvement)
+    selected = sorted((int(sample_videos[sample]), int(sample_frame_indices[sample])) for sample in selected_samples)
+
+    n_steps = 2
+    yield Progress(value=1, max=n_steps, description="Re-reading Selected Frames at Full Resolution...")
+    height = max(height for height, _ in frame_sizes)
+    width = max(width for _, width in frame_sizes)
+    extracted_frames = np.zeros((len(selected), height, width, 3), dtype=np.uint8)
+    with timer.stage('gather'):
+        for video_idx, video in enumerate(project.videos):
+            positions = [pos for pos, (idx, _) in enumerate(selected) if idx == video_idx]
+            if not positions:
+                continue
+            reader = VideoReader(filename=video.path, backend=backend)
+            for pos, frame in zip(positions, reader.read_frames_at([selected[pos][1] for pos in positions])):
+                extracted_frames[pos, :frame.shape[0], :frame.shape[1]] = frame
+            reader.close()
+    yield from timer.timings('gather')
+    yield Progress(value=2, max=n_steps, description="Done!")
+
+    yield ExtractFramesResult(
+        extracted_frame_indices = [frame_idx for _, frame_idx in selected],
+        extracted_frames = extracted_frames,
+        extracted_video_paths = [project.videos[video_idx].path for video_idx, _ in selected],
+    )